@@ -88,7 +88,7 @@ class SnapTestCase(integration_tests.TestCase):
         self.run_snapcraft('cleanbuild', project_dir)
         os.chdir(project_dir)
 
-        snap_source_path = 'assemble_1.0_source.tar.bz2'
+        snap_source_path = 'assemble_1.0_source.tar'
         self.assertThat(snap_source_path, FileExists())
 
         snap_file_path = 'assemble_1.0_{}.snap'.format(self.deb_arch)
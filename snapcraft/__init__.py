@@ -228,44 +228,40 @@ of the choice of plugin.
 """
 
 from collections import OrderedDict                 # noqa
-import pkg_resources                                # noqa
 import yaml                                         # noqa
 
-from snapcraft._baseplugin import BasePlugin        # noqa
-from snapcraft._options import ProjectOptions       # noqa
-from snapcraft._help import topic_help              # noqa
-from snapcraft._store import (                      # noqa
-    create_key,
-    close,
-    download,
-    history,
-    gated,
-    list_keys,
-    login,
-    logout,
-    push,
-    register,
-    register_key,
-    release,
-    sign_build,
-    status,
-    validate,
-)
-from snapcraft import common                        # noqa
-from snapcraft import plugins                       # noqa
-from snapcraft import sources                       # noqa
-from snapcraft import file_utils                    # noqa
-from snapcraft.internal import repo                 # noqa
-
-
-def _get_version():
-    try:
-        return pkg_resources.require('snapcraft')[0].version
-    except pkg_resources.DistributionNotFound:
-        return 'devel'
-
-
-__version__ = _get_version()
+from snapcraft import _lazy                         # noqa
+
+
+# Most of what snapcraft exports is only imported when first used so that
+# commands which do not need it, such as `snapcraft --version` or
+# `snapcraft help`, start quickly.
+_lazy.defer_attributes(__name__, {
+    '__version__': ('snapcraft._version', '__version__'),
+    'BasePlugin': ('snapcraft._baseplugin', 'BasePlugin'),
+    'ProjectOptions': ('snapcraft._options', 'ProjectOptions'),
+    'topic_help': ('snapcraft._help', 'topic_help'),
+    'create_key': ('snapcraft._store', 'create_key'),
+    'close': ('snapcraft._store', 'close'),
+    'download': ('snapcraft._store', 'download'),
+    'history': ('snapcraft._store', 'history'),
+    'gated': ('snapcraft._store', 'gated'),
+    'list_keys': ('snapcraft._store', 'list_keys'),
+    'login': ('snapcraft._store', 'login'),
+    'logout': ('snapcraft._store', 'logout'),
+    'push': ('snapcraft._store', 'push'),
+    'register': ('snapcraft._store', 'register'),
+    'register_key': ('snapcraft._store', 'register_key'),
+    'release': ('snapcraft._store', 'release'),
+    'sign_build': ('snapcraft._store', 'sign_build'),
+    'status': ('snapcraft._store', 'status'),
+    'validate': ('snapcraft._store', 'validate'),
+    'common': ('snapcraft.common', None),
+    'plugins': ('snapcraft.plugins', None),
+    'sources': ('snapcraft.sources', None),
+    'file_utils': ('snapcraft.file_utils', None),
+    'repo': ('snapcraft.internal.repo', None),
+})
 
 
 # Setup yaml module globally
@@ -0,0 +1,70 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Deferred attributes for packages that are costly to import in full.
+
+This does what a module level __getattr__ (PEP 562) would, which the
+python versions snapcraft supports do not have.
+"""
+
+import importlib
+import sys
+import types
+
+
+class _DeferredModule(types.ModuleType):
+
+    def __getattr__(self, name):
+        if name in self._deferred_attributes:
+            module_name, attribute = self._deferred_attributes[name]
+            value = importlib.import_module(module_name)
+            if attribute:
+                value = getattr(value, attribute)
+        else:
+            value = self._import_submodule(name)
+
+        # Only resolve once.
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self._deferred_attributes))
+
+    def _import_submodule(self, name):
+        # Submodules used to be available as soon as the package was
+        # imported, keep them reachable.
+        submodule_name = '{}.{}'.format(self.__name__, name)
+        if not name.startswith('__'):
+            try:
+                return importlib.import_module(submodule_name)
+            except ImportError as e:
+                if e.name != submodule_name:
+                    raise
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            self.__name__, name))
+
+
+def defer_attributes(module_name, attributes):
+    """Import attributes of module_name when they are first accessed.
+
+    :param str module_name: the name of the module, usually __name__.
+    :param dict attributes: maps attribute names to a (module, name) tuple
+                            telling where to get them from, name is None for
+                            the module itself.
+    """
+    module = sys.modules[module_name]
+    module._deferred_attributes = attributes
+    module.__class__ = _DeferredModule
@@ -82,6 +82,10 @@ class ProjectOptions:
     def parallel_builds(self):
         return self.__parallel_builds
 
+    @property
+    def use_ccache(self):
+        return self.__use_ccache
+
     @property
     def parallel_build_count(self):
         build_count = 1
@@ -104,8 +108,8 @@ class ProjectOptions:
             return self.__machine_info['cross-compiler-prefix']
         except KeyError:
             raise EnvironmentError(
-                'Cross compilation not support for target arch {!}'.format(
-                    self.__machine_target))
+                'Cross compilation not support for target arch {!r}'.format(
+                    self.__target_machine))
 
     @property
     def additional_build_packages(self):
@@ -113,6 +117,8 @@ class ProjectOptions:
         if self.is_cross_compiling:
             packages.extend(self.__machine_info.get(
                 'cross-build-packages', []))
+        if self.__use_ccache:
+            packages.append('ccache')
         return packages
 
     @property
@@ -148,12 +154,13 @@ class ProjectOptions:
         return self.__debug
 
     def __init__(self, use_geoip=False, parallel_builds=True,
-                 target_deb_arch=None, debug=False):
+                 target_deb_arch=None, debug=False, use_ccache=False):
         # TODO: allow setting a different project dir and check for
         #       snapcraft.yaml
         self.__project_dir = os.getcwd()
         self.__use_geoip = use_geoip
         self.__parallel_builds = parallel_builds
+        self.__use_ccache = use_ccache
         self._set_machine(target_deb_arch)
         self.__debug = debug
 
@@ -20,7 +20,15 @@ import os
 import jsonschema
 import yaml
 
-from snapcraft.internal import common
+from snapcraft.internal import (
+    cache,
+    common,
+)
+
+# Parsed schemas and their compiled validators, keyed by schema file and
+# modification time, are shared by every Validator in the process.
+_schemas = {}
+_validators = {}
 
 
 class SnapcraftSchemaError(Exception):
@@ -58,17 +66,27 @@ class Validator:
         schema_file = os.path.abspath(os.path.join(
             common.get_schemadir(), 'snapcraft.yaml'))
         try:
-            with open(schema_file) as fp:
-                self._schema = yaml.load(fp)
+            self._schema_key = (schema_file, os.stat(schema_file).st_mtime_ns)
+            if self._schema_key not in _schemas:
+                _schemas[self._schema_key] = _parse_schema(*self._schema_key)
         except FileNotFoundError:
             raise SnapcraftSchemaError(
                 'snapcraft validation file is missing from installation path')
+        self._schema = _schemas[self._schema_key]
+
+    def _get_validator(self):
+        # Formats are checked as registered when the validator is compiled,
+        # more may have been registered since.
+        key = self._schema_key + (
+            frozenset(jsonschema.FormatChecker.checkers),)
+        if key not in _validators:
+            _validators[key] = compile_validator(
+                self._schema, format_checker=jsonschema.FormatChecker())
+        return _validators[key]
 
     def validate(self):
-        format_check = jsonschema.FormatChecker()
         try:
-            jsonschema.validate(
-                self._snapcraft, self._schema, format_checker=format_check)
+            raise_for_errors(self._get_validator(), self._snapcraft)
         except jsonschema.ValidationError as e:
             messages = [e.message]
             path = []
@@ -81,3 +99,34 @@ class Validator:
                 messages.append('({})'.format(e.cause))
 
             raise SnapcraftSchemaError(' '.join(messages))
+
+
+def _parse_schema(schema_file, mtime):
+    schema_cache = cache.SchemaCache()
+    schema = schema_cache.get(schema_file=schema_file, mtime=mtime)
+    if schema is None:
+        with open(schema_file) as fp:
+            schema = yaml.load(fp)
+        schema_cache.cache(schema_file=schema_file, mtime=mtime, schema=schema)
+    return schema
+
+
+def compile_validator(schema, **kwargs):
+    """Return a validator for schema, which is checked to be valid.
+
+    Validators are worth keeping around when validating many instances
+    against the same schema, which jsonschema.validate does not do.
+    """
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema, **kwargs)
+
+
+def raise_for_errors(validator, instance):
+    """Validate instance as jsonschema.validate would.
+
+    :raises jsonschema.ValidationError: with the most relevant error.
+    """
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
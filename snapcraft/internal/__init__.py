@@ -14,7 +14,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from snapcraft.internal import cache             # noqa
-from snapcraft.internal import deltas            # noqa
-from snapcraft.internal import states            # noqa
-from snapcraft.internal.project_loader import load_config  # noqa
+from snapcraft import _lazy                      # noqa
+
+_lazy.defer_attributes(__name__, {
+    'cache': ('snapcraft.internal.cache', None),
+    'deltas': ('snapcraft.internal.deltas', None),
+    'states': ('snapcraft.internal.states', None),
+    'load_config': ('snapcraft.internal.project_loader', 'load_config'),
+})
@@ -15,3 +15,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from ._snap import SnapCache  # noqa
+from ._file import DEFAULT_ALGORITHM, FileCache  # noqa
+from ._git import GitCache  # noqa
+from ._rosdep import RosdepCache  # noqa
+from ._wheel import WheelCache  # noqa
+from ._toolchain import ToolchainCache  # noqa
+from ._go import GoCache  # noqa
+from ._compiler import CompilerCache  # noqa
+from ._initrd import InitrdCache  # noqa
+from ._java import JavaCache  # noqa
+from ._cargo import CargoCache  # noqa
+from ._schema import SchemaCache  # noqa
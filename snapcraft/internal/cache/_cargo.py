@@ -0,0 +1,31 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from ._cache import SnapcraftCache
+
+
+class CargoCache(SnapcraftCache):
+    """Cargo home shared across rust parts and projects.
+
+    It holds the crates registry index and downloads along with the git
+    database for git dependencies, so crates are only fetched once.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cargo_home = os.path.join(self.cache_root, 'cargo')
@@ -0,0 +1,95 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import re
+import subprocess
+
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+# ccache -s lines look like 'cache hit (direct)            42'.
+_STATS_REGEX = re.compile(r'^(?P<key>[a-z][a-z ()-]*?)\s{2,}(?P<value>\d+)$')
+
+
+class CompilerCache(SnapcraftCache):
+    """Cache of compiler output, as maintained by ccache.
+
+    Object files for different target architectures are kept apart, each
+    one in its own ccache directory.
+    """
+
+    def __init__(self, *, deb_arch):
+        super().__init__()
+        self.compiler_cache_dir = os.path.join(
+            self.cache_root, 'ccache', deb_arch)
+
+    @staticmethod
+    def get_compiler_prefix(project_options):
+        """Return the prefix for the compilers to wrap for project_options.
+
+        Targets without a cross compiler prefix are built with the host
+        compiler, which has none.
+        """
+        if not project_options.is_cross_compiling:
+            return ''
+        try:
+            return project_options.cross_compiler_prefix
+        except EnvironmentError:
+            return ''
+
+    def get_env(self, *, compiler_prefix='', base_dir=None):
+        """Return the environment to wrap the compilers with ccache.
+
+        :param str compiler_prefix: prefix for the compilers, as used when
+                                    cross compiling.
+        :param str base_dir: paths under base_dir are rewritten as relative
+                             ones so that hits survive moving a project.
+        """
+        env = [
+            'CCACHE_DIR={}'.format(self.compiler_cache_dir),
+            'CC="ccache {}gcc"'.format(compiler_prefix),
+            'CXX="ccache {}g++"'.format(compiler_prefix),
+        ]
+        if base_dir:
+            env.append('CCACHE_BASEDIR={}'.format(base_dir))
+        return env
+
+    def get_stats(self):
+        """Return the counters ccache keeps for this cache.
+
+        :returns: a dictionary of counter names to values, empty if the
+                  statistics could not be retrieved.
+        """
+        env = os.environ.copy()
+        env['CCACHE_DIR'] = self.compiler_cache_dir
+        try:
+            output = subprocess.check_output(
+                ['ccache', '--show-stats'], env=env,
+                stderr=subprocess.DEVNULL).decode()
+        except (OSError, subprocess.CalledProcessError):
+            logger.debug('Unable to retrieve ccache statistics.')
+            return {}
+
+        stats = {}
+        for line in output.splitlines():
+            match = _STATS_REGEX.match(line.strip())
+            if match:
+                stats[match.group('key')] = int(match.group('value'))
+        return stats
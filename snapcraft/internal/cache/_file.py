@@ -0,0 +1,153 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+
+from snapcraft.file_utils import link_or_copy
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+# The algorithm every cached file is addressed by, files can additionally
+# be looked up by any other digest recorded for them.
+DEFAULT_ALGORITHM = 'sha384'
+
+_DEFAULT_MAX_SIZE = 5 * 1024 ** 3
+
+
+class FileCache(SnapcraftCache):
+    """Content addressed cache for downloaded files.
+
+    Files are stored under <algorithm>/<digest>, the same file can be
+    reachable through more than one algorithm by means of hard links. A
+    separate index keeps track of the last digest seen for a url along
+    with the validators (ETag and Last-Modified) the server sent for it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.file_cache_dir = os.path.join(self.cache_root, 'download')
+        self._objects_dir = os.path.join(self.file_cache_dir, 'objects')
+        self._urls_dir = os.path.join(self.file_cache_dir, 'urls')
+
+    def _object_path(self, algorithm, hash):
+        return os.path.join(self._objects_dir, algorithm, hash)
+
+    def cache(self, *, filename, algorithm, hash):
+        """Cache filename under its algorithm and hash.
+
+        :returns: path to the cached file.
+        """
+        cached_file_path = self._object_path(algorithm, hash)
+        if os.path.exists(cached_file_path):
+            return cached_file_path
+
+        os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
+        try:
+            link_or_copy(filename, cached_file_path)
+        except OSError:
+            logger.warning('Unable to cache file {}.'.format(filename))
+            return filename
+        return cached_file_path
+
+    def get(self, *, algorithm, hash):
+        """Return the path to the cached file or None if not cached.
+
+        Looking up a file marks it as recently used.
+        """
+        cached_file_path = self._object_path(algorithm, hash)
+        if not os.path.isfile(cached_file_path):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(cached_file_path)
+        return cached_file_path
+
+    def _url_index_path(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self._urls_dir, key + '.json')
+
+    def get_url(self, url):
+        """Return the last recorded download information for url.
+
+        :returns: a dictionary with 'algorithm', 'hash' and optionally
+                  'etag' and 'last-modified' or None if url is unknown or
+                  its file is no longer cached.
+        """
+        try:
+            with open(self._url_index_path(url)) as f:
+                url_info = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if url_info.get('url') != url or not os.path.isfile(
+                self._object_path(url_info['algorithm'], url_info['hash'])):
+            return None
+        return url_info
+
+    def set_url(self, url, *, algorithm, hash, etag=None,
+                last_modified=None):
+        """Record that url was last seen with contents algorithm/hash."""
+        url_info = {'url': url, 'algorithm': algorithm, 'hash': hash}
+        if etag:
+            url_info['etag'] = etag
+        if last_modified:
+            url_info['last-modified'] = last_modified
+
+        index_path = self._url_index_path(url)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_index_path = '{}.{}.partial'.format(index_path, os.getpid())
+        with open(tmp_index_path, 'w') as f:
+            json.dump(url_info, f)
+        os.replace(tmp_index_path, index_path)
+
+    def prune(self, *, max_size=_DEFAULT_MAX_SIZE):
+        """Evict least recently used files until the cache fits max_size.
+
+        :returns: pruned files paths list.
+        """
+        # Group hard links to the same file together so they are only
+        # accounted for, and evicted, once.
+        inodes = {}
+        for root, directories, files in os.walk(self._objects_dir):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entry = inodes.setdefault(
+                    (st.st_dev, st.st_ino), [st.st_mtime, st.st_size, []])
+                entry[0] = max(entry[0], st.st_mtime)
+                entry[2].append(path)
+
+        total_size = sum(entry[1] for entry in inodes.values())
+        pruned_files_list = []
+        for mtime, size, paths in sorted(inodes.values()):
+            if total_size <= max_size:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                    pruned_files_list.append(path)
+                except OSError:
+                    logger.warning('Unable to purge file {}.'.format(path))
+            total_size -= size
+        return pruned_files_list
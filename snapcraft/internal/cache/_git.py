@@ -0,0 +1,33 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+
+from ._cache import SnapcraftCache
+
+
+class GitCache(SnapcraftCache):
+    """Cache of bare git mirrors shared across parts and projects."""
+
+    def __init__(self):
+        super().__init__()
+        self.git_cache_dir = os.path.join(self.cache_root, 'git')
+
+    def mirror_path(self, url):
+        """Return the path to the mirror for url, which may not exist yet."""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.git_cache_dir, key + '.git')
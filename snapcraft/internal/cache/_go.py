@@ -0,0 +1,129 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import logging
+import os
+import shutil
+import subprocess
+
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_KEEP = 3
+
+_VCS_REVISION_COMMANDS = {
+    '.bzr': ['bzr', 'version-info', '--custom', '--template={revision_id}'],
+    '.git': ['git', 'rev-parse', 'HEAD'],
+    '.hg': ['hg', 'identify', '--id'],
+    '.svn': ['svnversion'],
+}
+
+
+class GoCache(SnapcraftCache):
+    """GOPATH holding go sources shared across parts and projects.
+
+    Only sources live here, every part compiles them into its own GOPATH.
+    Repositories in the GOPATH are kept up to date, parts build against
+    snapshots of them taken per revision. Only the most recently used
+    snapshots of each repository are kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.gopath = os.path.join(self.cache_root, 'go')
+        self.gopath_src = os.path.join(self.gopath, 'src')
+        self.snapshots_dir = os.path.join(self.gopath, 'snapshots')
+
+    def get_repositories(self):
+        """Return the paths to the repositories, relative to gopath_src."""
+        repositories = []
+        for root, directories, files in os.walk(self.gopath_src):
+            if any(vcs_dir in directories or vcs_dir in files
+                   for vcs_dir in _VCS_REVISION_COMMANDS):
+                repositories.append(os.path.relpath(root, self.gopath_src))
+                directories[:] = []
+            else:
+                directories.sort()
+        return repositories
+
+    def get_revision(self, repository):
+        """Return the revision repository is checked out at."""
+        path = os.path.join(self.gopath_src, repository)
+        for vcs_dir, command in sorted(_VCS_REVISION_COMMANDS.items()):
+            if os.path.exists(os.path.join(path, vcs_dir)):
+                return subprocess.check_output(
+                    command, cwd=path).decode().strip()
+        raise ValueError('{!r} is not a repository'.format(repository))
+
+    def snapshot(self, repository):
+        """Return the path to a snapshot of repository at its revision.
+
+        Snapshots never change once taken, later updates to the repository
+        end up in a snapshot of their own. Taking a snapshot again marks it
+        as recently used.
+        """
+        snapshot = os.path.join(
+            self.snapshots_dir, repository, self.get_revision(repository))
+        if os.path.exists(snapshot):
+            with contextlib.suppress(OSError):
+                os.utime(snapshot)
+            return snapshot
+
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        partial_snapshot = '{}.{}.partial'.format(snapshot, os.getpid())
+        shutil.rmtree(partial_snapshot, ignore_errors=True)
+        shutil.copytree(
+            os.path.join(self.gopath_src, repository), partial_snapshot,
+            symlinks=True,
+            ignore=shutil.ignore_patterns(*_VCS_REVISION_COMMANDS))
+        try:
+            os.rename(partial_snapshot, snapshot)
+        except OSError:
+            # Another part took the same snapshot first.
+            shutil.rmtree(partial_snapshot)
+            if not os.path.isdir(snapshot):
+                raise
+        return snapshot
+
+    def prune(self, *, keep=_DEFAULT_KEEP):
+        """Remove all but the keep most recently used snapshots of each
+        repository.
+
+        :returns: pruned snapshot paths list.
+        """
+        pruned_snapshots_list = []
+        for repository in self.get_repositories():
+            repository_snapshots_dir = os.path.join(
+                self.snapshots_dir, repository)
+            snapshots = []
+            with contextlib.suppress(FileNotFoundError):
+                for entry in os.scandir(repository_snapshots_dir):
+                    if entry.name.endswith('.partial'):
+                        continue
+                    with contextlib.suppress(OSError):
+                        snapshots.append(
+                            (entry.stat(follow_symlinks=False).st_mtime,
+                             entry.path))
+            for mtime, path in sorted(snapshots, reverse=True)[keep:]:
+                try:
+                    shutil.rmtree(path)
+                    pruned_snapshots_list.append(path)
+                except OSError:
+                    logger.warning('Unable to purge snapshot {}.'.format(path))
+        return pruned_snapshots_list
@@ -0,0 +1,90 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import logging
+import os
+
+from snapcraft.file_utils import link_or_copy
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 1024 ** 3
+
+
+class InitrdCache(SnapcraftCache):
+    """Cache of generated initrds, keyed by the contents they are made of."""
+
+    def __init__(self):
+        super().__init__()
+        self.initrd_cache_dir = os.path.join(self.cache_root, 'initrd')
+
+    def get(self, key):
+        """Return the path to the initrd cached for key or None.
+
+        Looking up an initrd marks it as recently used.
+        """
+        cached_initrd_path = os.path.join(self.initrd_cache_dir, key)
+        if not os.path.isfile(cached_initrd_path):
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(cached_initrd_path)
+        return cached_initrd_path
+
+    def cache(self, *, key, filename):
+        """Cache the initrd at filename under key.
+
+        :returns: path to the cached initrd.
+        """
+        cached_initrd_path = os.path.join(self.initrd_cache_dir, key)
+        os.makedirs(self.initrd_cache_dir, exist_ok=True)
+        tmp_initrd_path = cached_initrd_path + '.partial'
+        try:
+            link_or_copy(filename, tmp_initrd_path)
+            os.replace(tmp_initrd_path, cached_initrd_path)
+        except OSError:
+            logger.warning('Unable to cache initrd {}.'.format(filename))
+            return filename
+        return cached_initrd_path
+
+    def prune(self, *, max_size=_DEFAULT_MAX_SIZE):
+        """Evict least recently used initrds until the cache fits max_size.
+
+        :returns: pruned files paths list.
+        """
+        entries = []
+        if os.path.isdir(self.initrd_cache_dir):
+            for entry in os.scandir(self.initrd_cache_dir):
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        pruned_files_list = []
+        for mtime, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+                pruned_files_list.append(path)
+            except OSError:
+                logger.warning('Unable to purge file {}.'.format(path))
+            total_size -= size
+        return pruned_files_list
@@ -0,0 +1,34 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from ._cache import SnapcraftCache
+
+
+class JavaCache(SnapcraftCache):
+    """Artifact repositories shared across java parts and projects.
+
+    These take the place of ~/.m2/repository and ~/.gradle so that
+    dependencies are fetched once, even when building in a clean
+    environment that shares the snapcraft cache.
+    """
+
+    def __init__(self):
+        super().__init__()
+        java_cache_dir = os.path.join(self.cache_root, 'java')
+        self.maven_repository = os.path.join(java_cache_dir, 'm2')
+        self.gradle_user_home = os.path.join(java_cache_dir, 'gradle')
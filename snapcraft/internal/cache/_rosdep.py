@@ -0,0 +1,87 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class RosdepCache(SnapcraftCache):
+    """Cache of rosdep key resolutions.
+
+    A resolution only depends on the rosdistro, the Ubuntu release it is
+    made for and the rosdep database it is looked up in, so resolutions
+    are stored in a file named after the three of them.
+    """
+
+    def __init__(self, *, rosdistro, release):
+        super().__init__()
+        self.rosdep_cache_dir = os.path.join(self.cache_root, 'rosdep')
+        self._prefix = '{}-{}-'.format(rosdistro, release)
+
+    def _resolutions_path(self, database_hash):
+        return os.path.join(
+            self.rosdep_cache_dir, self._prefix + database_hash + '.json')
+
+    def get(self, *, database_hash):
+        """Return the resolutions cached for database_hash.
+
+        :returns: a dictionary mapping rosdep keys to lists of packages,
+                  empty if nothing was cached.
+        """
+        try:
+            with open(self._resolutions_path(database_hash)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def cache(self, *, database_hash, resolutions):
+        """Cache resolutions made against database_hash."""
+        resolutions_path = self._resolutions_path(database_hash)
+        os.makedirs(self.rosdep_cache_dir, exist_ok=True)
+        tmp_resolutions_path = resolutions_path + '.partial'
+        try:
+            with open(tmp_resolutions_path, 'w') as f:
+                json.dump(resolutions, f)
+            os.replace(tmp_resolutions_path, resolutions_path)
+        except OSError:
+            logger.warning('Unable to cache rosdep resolutions.')
+
+    def prune(self, *, keep_hash):
+        """Remove resolutions made against any other database.
+
+        :returns: pruned files paths list.
+        """
+        keep = os.path.basename(self._resolutions_path(keep_hash))
+        pruned_files_list = []
+        if not os.path.isdir(self.rosdep_cache_dir):
+            return pruned_files_list
+
+        for file_name in os.listdir(self.rosdep_cache_dir):
+            if not file_name.startswith(self._prefix) or file_name == keep:
+                continue
+            path = os.path.join(self.rosdep_cache_dir, file_name)
+            try:
+                os.remove(path)
+                pruned_files_list.append(path)
+            except OSError:
+                logger.warning('Unable to purge file {}.'.format(path))
+        return pruned_files_list
@@ -0,0 +1,70 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import hashlib
+import logging
+import os
+import pickle
+
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache(SnapcraftCache):
+    """Cache of parsed schema files.
+
+    Parsing the yaml schema is slow compared to unpickling it, parsed
+    schemas are kept for as long as the schema file is not modified.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.schema_cache_dir = os.path.join(self.cache_root, 'schema')
+
+    def _get_cached_schema_path(self, schema_file, mtime):
+        key = hashlib.sha256('{}\0{}'.format(
+            os.path.abspath(schema_file), mtime).encode()).hexdigest()
+        return os.path.join(self.schema_cache_dir, key + '.pickle')
+
+    def get(self, *, schema_file, mtime):
+        """Return the schema parsed out of schema_file or None.
+
+        :param int mtime: modification time of schema_file, in nanoseconds.
+        """
+        try:
+            with open(self._get_cached_schema_path(schema_file, mtime),
+                      'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def cache(self, *, schema_file, mtime, schema):
+        """Cache schema as parsed out of schema_file at mtime."""
+        cached_schema_path = self._get_cached_schema_path(schema_file, mtime)
+        tmp_schema_path = '{}.{}.partial'.format(
+            cached_schema_path, os.getpid())
+        try:
+            os.makedirs(self.schema_cache_dir, exist_ok=True)
+            with open(tmp_schema_path, 'wb') as f:
+                pickle.dump(schema, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_schema_path, cached_schema_path)
+        except OSError:
+            logger.debug('Unable to cache schema {}.'.format(schema_file))
+            with contextlib.suppress(OSError):
+                os.remove(tmp_schema_path)
@@ -0,0 +1,94 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import shutil
+import tempfile
+
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class ToolchainCache(SnapcraftCache):
+    """Cache of unpacked toolchains shared across parts and projects.
+
+    Each toolchain lives in its own directory, named after the toolchain
+    and its version, and is never modified once it has been provisioned.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.toolchain_cache_dir = os.path.join(self.cache_root, 'toolchains')
+
+    def get(self, name):
+        """Return the path to toolchain name or None if not cached."""
+        toolchain_path = os.path.join(self.toolchain_cache_dir, name)
+        if not os.path.isdir(toolchain_path):
+            return None
+        return toolchain_path
+
+    def cache(self, name, provision):
+        """Cache toolchain name unless it is already cached.
+
+        :param str name: the toolchain name, including its version.
+        :param provision: callable taking the directory to provision the
+                          toolchain into.
+        :returns: path to the cached toolchain.
+        """
+        toolchain_path = self.get(name)
+        if toolchain_path:
+            return toolchain_path
+
+        # Provision out of place so that a partially provisioned toolchain
+        # is never picked up.
+        os.makedirs(self.toolchain_cache_dir, exist_ok=True)
+        tmp_toolchain_path = tempfile.mkdtemp(
+            prefix='.{}-'.format(name), dir=self.toolchain_cache_dir)
+        toolchain_path = os.path.join(self.toolchain_cache_dir, name)
+        try:
+            provision(tmp_toolchain_path)
+            os.rename(tmp_toolchain_path, toolchain_path)
+        except OSError:
+            # Someone else got to provision it first.
+            if not os.path.isdir(toolchain_path):
+                raise
+        finally:
+            if os.path.exists(tmp_toolchain_path):
+                shutil.rmtree(tmp_toolchain_path)
+        return toolchain_path
+
+    def prune(self, *, prefix, keep):
+        """Remove the toolchains whose name starts with prefix but keep.
+
+        :returns: pruned toolchain paths list.
+        """
+        pruned_toolchains_list = []
+        if not os.path.isdir(self.toolchain_cache_dir):
+            return pruned_toolchains_list
+
+        for name in os.listdir(self.toolchain_cache_dir):
+            if not name.startswith(prefix) or name == keep:
+                continue
+            path = os.path.join(self.toolchain_cache_dir, name)
+            try:
+                shutil.rmtree(path)
+                pruned_toolchains_list.append(path)
+            except OSError:
+                logger.warning('Unable to purge toolchain {}.'.format(path))
+        return pruned_toolchains_list
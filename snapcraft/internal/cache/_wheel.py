@@ -0,0 +1,137 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+
+from snapcraft.file_utils import link_or_copy
+from ._cache import SnapcraftCache
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 1024 ** 3
+# pip, setuptools and wheel are fetched again once they are this old, in
+# seconds, so that they get updates.
+_BOOTSTRAP_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class WheelCache(SnapcraftCache):
+    """Cache of python wheels shared across parts and projects.
+
+    Wheels built from source are kept in a directory per build
+    environment, the wheel file names themselves tell the name, version,
+    python ABI and platform they are for. The wheels pip is bootstrapped
+    from are kept separately as they only depend on the python version.
+    """
+
+    def __init__(self, *, python_version, arch):
+        super().__init__()
+        self.wheel_cache_dir = os.path.join(
+            self.cache_root, 'wheels', '{}-{}'.format(python_version, arch))
+        self.bootstrap_dir = os.path.join(self.wheel_cache_dir, 'bootstrap')
+        self._build_dirs = os.path.join(self.wheel_cache_dir, 'build')
+
+    def get_bootstrap_wheels(self, *, max_age=_BOOTSTRAP_MAX_AGE):
+        """Return the cached wheels pip is bootstrapped from.
+
+        Nothing is returned once they are older than max_age seconds.
+        """
+        wheels = []
+        with contextlib.suppress(FileNotFoundError):
+            for entry in os.scandir(self.bootstrap_dir):
+                if entry.name.endswith('.whl'):
+                    wheels.append(entry.path)
+                    if entry.stat().st_mtime < time.time() - max_age:
+                        return []
+        return sorted(wheels)
+
+    def set_bootstrap_wheels(self, wheels):
+        """Replace the cached wheels pip is bootstrapped from with wheels."""
+        cached_wheels = [self.cache(wheel=wheel, directory=self.bootstrap_dir)
+                         for wheel in wheels]
+        for wheel in glob.glob(os.path.join(self.bootstrap_dir, '*.whl')):
+            if wheel not in cached_wheels:
+                with contextlib.suppress(OSError):
+                    os.remove(wheel)
+
+    def get_build_dir(self, build_env):
+        """Return the directory for wheels built in build_env.
+
+        :param dict build_env: everything the build of a wheel depends on.
+        """
+        key = hashlib.sha256(
+            json.dumps(build_env, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self._build_dirs, key)
+
+    def mark_used(self, wheel):
+        """Mark the cached wheel as recently used, keeping it from prune."""
+        with contextlib.suppress(OSError):
+            os.utime(wheel)
+
+    def cache(self, *, wheel, directory):
+        """Cache wheel into directory.
+
+        :returns: path to the cached wheel.
+        """
+        cached_wheel_path = os.path.join(directory, os.path.basename(wheel))
+        if os.path.exists(cached_wheel_path):
+            return cached_wheel_path
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            link_or_copy(wheel, cached_wheel_path)
+        except OSError:
+            logger.warning('Unable to cache wheel {}.'.format(wheel))
+            return wheel
+        return cached_wheel_path
+
+    def prune(self, *, max_size=_DEFAULT_MAX_SIZE):
+        """Evict least recently used built wheels until they fit max_size.
+
+        Build directories left empty are removed along with them.
+
+        :returns: pruned files paths list.
+        """
+        entries = []
+        for wheel in glob.glob(os.path.join(self._build_dirs, '*', '*.whl')):
+            try:
+                st = os.stat(wheel)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, wheel))
+
+        total_size = sum(size for _, size, _ in entries)
+        pruned_files_list = []
+        for mtime, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+                pruned_files_list.append(path)
+            except OSError:
+                logger.warning('Unable to purge file {}.'.format(path))
+            total_size -= size
+
+        for directory in {os.path.dirname(p) for p in pruned_files_list}:
+            with contextlib.suppress(OSError):
+                os.rmdir(directory)
+        return pruned_files_list
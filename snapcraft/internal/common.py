@@ -21,6 +21,7 @@ import glob
 import logging
 import math
 import os
+import re
 import shutil
 import subprocess
 import sys
@@ -31,6 +32,9 @@ import urllib
 SNAPCRAFT_FILES = ['snapcraft.yaml', '.snapcraft.yaml', 'parts', 'stage',
                    'prime', 'snap']
 COMMAND_ORDER = ['pull', 'build', 'stage', 'prime']
+# FIXME: snapcraft targets the '16' series, hardcode it until more choices
+# become available server side -- vila 2016-04-22
+DEFAULT_SERIES = '16'
 _DEFAULT_PLUGINDIR = '/usr/share/snapcraft/plugins'
 _plugindir = _DEFAULT_PLUGINDIR
 _DEFAULT_SCHEMADIR = '/usr/share/snapcraft/schema'
@@ -46,37 +50,137 @@ env = []
 
 logger = logging.getLogger(__name__)
 
+# Entries in env are rendered without a shell when they are plain
+# assignments only made of the quoting and parameter expansions below.
+_ASSIGNMENT = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)=(.*)\Z', re.DOTALL)
+_PARAMETER = (r'\$(?P<name>[A-Za-z_][A-Za-z0-9_]*)|'
+              r'\$\{(?P<braced>[A-Za-z_][A-Za-z0-9_]*)\}')
+_WORD_TOKEN = re.compile(
+    r"'(?P<single>[^']*)'|"
+    r'"(?P<double>(?:[^"\\]|\\.)*)"|'
+    r'(?P<plain>[^\'"\\$`\s*?\[~;&|<>()#]+)|'
+    r'\\(?P<escaped>[^\n])|' + _PARAMETER, re.DOTALL)
+_DOUBLE_QUOTED_TOKEN = re.compile(
+    r'(?P<plain>[^\\$`]+)|'
+    r'\\(?P<escaped>[$`"\\])|'
+    r'(?P<backslash>\\)(?=[^\n])|' + _PARAMETER)
+
+# The last environment rendered, as (env, base, rendered env).
+_rendered_env = None
+
+
+class _ShellRequired(Exception):
+    pass
+
 
 def assemble_env():
     return '\n'.join(['export ' + e for e in env])
 
 
+def _expand(pattern, text, variables):
+    expanded = []
+    position = 0
+    while position < len(text):
+        match = pattern.match(text, position)
+        if not match:
+            raise _ShellRequired()
+        kind = match.lastgroup
+        if kind in ('name', 'braced'):
+            expanded.append(variables.get(match.group(kind), ''))
+        elif kind == 'double':
+            expanded.append(
+                _expand(_DOUBLE_QUOTED_TOKEN, match.group(kind), variables))
+        else:
+            expanded.append(match.group(kind))
+        position = match.end()
+    return ''.join(expanded)
+
+
+def render_env(base=None):
+    """Return env evaluated on top of base, the process environment if None.
+
+    The result is what the commands in the shell script assemble_env()
+    returns would see. It is cached for as long as env and base do not
+    change.
+
+    :returns: the environment as a dictionary, or None if some entry in
+              env needs a shell to be evaluated.
+    """
+    global _rendered_env
+    if base is None:
+        base = os.environ
+    if (_rendered_env and _rendered_env[0] == env and
+            _rendered_env[1] == base):
+        return _rendered_env[2]
+
+    variables = dict(base)
+    try:
+        for entry in env:
+            match = _ASSIGNMENT.match(entry)
+            if not match:
+                raise _ShellRequired()
+            variables[match.group(1)] = _expand(
+                _WORD_TOKEN, match.group(2), variables)
+    except _ShellRequired:
+        variables = None
+    _rendered_env = (list(env), dict(base), variables)
+    return variables
+
+
+def _get_command_env(kwargs):
+    command_env = render_env(kwargs.get('env'))
+    if command_env is not None and 'PWD' in command_env:
+        # The shell would have pointed it at the directory it ran in.
+        command_env = dict(command_env, PWD=os.path.abspath(
+            kwargs.get('cwd') or os.getcwd()))
+    return command_env
+
+
+def _wrap_in_shell(cmd, f):
+    f.write(assemble_env())
+    f.write('\n')
+    f.write('exec "$@"')
+    f.flush()
+    return ['/bin/sh', f.name] + cmd
+
+
+def _run_without_shell(function, cmd, **kwargs):
+    try:
+        return function(cmd, **kwargs)
+    except FileNotFoundError as e:
+        if e.filename != cmd[0]:
+            raise
+        # Fail the way the shell does when the command is not found.
+        raise subprocess.CalledProcessError(127, cmd) from e
+
+
 def run(cmd, **kwargs):
     assert isinstance(cmd, list), 'run command must be a list'
-    # FIXME: This is gross to keep writing this, even when env is the same
+    command_env = _get_command_env(kwargs)
+    if command_env is not None:
+        kwargs['env'] = command_env
+        _run_without_shell(subprocess.check_call, cmd, **kwargs)
+        return
+
     with tempfile.NamedTemporaryFile(mode='w+') as f:
-        f.write(assemble_env())
-        f.write('\n')
-        f.write('exec "$@"')
-        f.flush()
-        subprocess.check_call(['/bin/sh', f.name] + cmd, **kwargs)
+        subprocess.check_call(_wrap_in_shell(cmd, f), **kwargs)
 
 
 def run_output(cmd, **kwargs):
     assert isinstance(cmd, list), 'run command must be a list'
-    # FIXME: This is gross to keep writing this, even when env is the same
-    with tempfile.NamedTemporaryFile(mode='w+') as f:
-        f.write(assemble_env())
-        f.write('\n')
-        f.write('exec "$@"')
-        f.flush()
-        output = subprocess.check_output(['/bin/sh', f.name] + cmd, **kwargs)
-        try:
-            return output.decode(sys.getfilesystemencoding()).strip()
-        except UnicodeEncodeError:
-            logger.warning('Could not decode output for {!r} correctly'.format(
-                cmd))
-            return output.decode('latin-1', 'surrogateescape').strip()
+    command_env = _get_command_env(kwargs)
+    if command_env is not None:
+        kwargs['env'] = command_env
+        output = _run_without_shell(subprocess.check_output, cmd, **kwargs)
+    else:
+        with tempfile.NamedTemporaryFile(mode='w+') as f:
+            output = subprocess.check_output(_wrap_in_shell(cmd, f), **kwargs)
+    try:
+        return output.decode(sys.getfilesystemencoding()).strip()
+    except UnicodeEncodeError:
+        logger.warning('Could not decode output for {!r} correctly'.format(
+            cmd))
+        return output.decode('latin-1', 'surrogateescape').strip()
 
 
 def format_snap_name(snap):
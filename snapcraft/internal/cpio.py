@@ -0,0 +1,139 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Streaming reader and writer for cpio archives in the newc format.
+
+newc is the format the kernel expects an initramfs to be packed in.
+"""
+
+import collections
+import os
+import stat
+
+
+_MAGICS = (b'070701', b'070702')
+_HEADER_FIELDS = (
+    'ino', 'mode', 'uid', 'gid', 'nlink', 'mtime', 'filesize', 'devmajor',
+    'devminor', 'rdevmajor', 'rdevminor', 'namesize', 'check')
+_HEADER_SIZE = 6 + 8 * len(_HEADER_FIELDS)
+_TRAILER = 'TRAILER!!!'
+_BLOCK_SIZE = 512
+
+Entry = collections.namedtuple('Entry', [
+    'name', 'mode', 'data', 'ino', 'uid', 'gid', 'nlink', 'mtime',
+    'devmajor', 'devminor', 'rdevmajor', 'rdevminor'])
+Entry.__new__.__defaults__ = (b'', 0, 0, 0, 1, 0, 0, 0, 0, 0)
+
+
+def _padding(size):
+    return (4 - size % 4) % 4
+
+
+def _read_exactly(fileobj, size):
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated cpio archive')
+    return data
+
+
+def read(fileobj):
+    """Yield every entry in the archive read from fileobj, in order."""
+    while True:
+        header = _read_exactly(fileobj, _HEADER_SIZE)
+        if header[:6] not in _MAGICS:
+            raise ValueError('Not a newc cpio archive')
+        fields = {}
+        for index, field in enumerate(_HEADER_FIELDS):
+            offset = 6 + index * 8
+            fields[field] = int(header[offset:offset + 8], 16)
+
+        name = _read_exactly(fileobj, fields['namesize'])[:-1].decode(
+            'utf-8', 'surrogateescape')
+        _read_exactly(fileobj, _padding(_HEADER_SIZE + fields['namesize']))
+        if name == _TRAILER:
+            return
+
+        data = _read_exactly(fileobj, fields['filesize'])
+        _read_exactly(fileobj, _padding(fields['filesize']))
+
+        yield Entry(
+            name=name, mode=fields['mode'], data=data, ino=fields['ino'],
+            uid=fields['uid'], gid=fields['gid'], nlink=fields['nlink'],
+            mtime=fields['mtime'], devmajor=fields['devmajor'],
+            devminor=fields['devminor'], rdevmajor=fields['rdevmajor'],
+            rdevminor=fields['rdevminor'])
+
+
+class Writer:
+    """Write entries to fileobj as a newc cpio archive.
+
+    Inode numbers are assigned by the writer, entries read from another
+    archive keep sharing an inode with their hard links.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._size = 0
+        self._inos = {}
+
+    def _next_ino(self):
+        return len(self._inos) + 1
+
+    def _write(self, data):
+        self._fileobj.write(data)
+        self._size += len(data)
+
+    def _write_entry(self, entry, ino):
+        name = entry.name.encode('utf-8', 'surrogateescape') + b'\0'
+        values = dict(entry._asdict(), ino=ino, filesize=len(entry.data),
+                      namesize=len(name), check=0)
+        header = _MAGICS[0] + b''.join(
+            '{:08X}'.format(values[field]).encode()
+            for field in _HEADER_FIELDS)
+
+        self._write(header + name)
+        self._write(b'\0' * _padding(_HEADER_SIZE + len(name)))
+        self._write(entry.data)
+        self._write(b'\0' * _padding(len(entry.data)))
+
+    def add(self, entry):
+        """Add entry to the archive."""
+        if entry.nlink > 1:
+            key = ('link', entry.ino)
+        else:
+            key = ('entry', self._next_ino())
+        if key not in self._inos:
+            self._inos[key] = self._next_ino()
+        self._write_entry(entry, self._inos[key])
+
+    def add_path(self, name, path):
+        """Add the file, directory or symlink at path to the archive."""
+        st = os.lstat(path)
+        if stat.S_ISLNK(st.st_mode):
+            data = os.readlink(path).encode('utf-8', 'surrogateescape')
+        elif stat.S_ISREG(st.st_mode):
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            data = b''
+        self.add(Entry(name=name, mode=st.st_mode, data=data,
+                       mtime=int(st.st_mtime)))
+
+    def close(self):
+        """Terminate the archive, fileobj is left open."""
+        self._write_entry(Entry(name=_TRAILER, mode=0), 0)
+        self._write(b'\0' * ((_BLOCK_SIZE - self._size % _BLOCK_SIZE) %
+                             _BLOCK_SIZE))
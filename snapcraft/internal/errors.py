@@ -112,3 +112,19 @@ class RequiredCommandNotFound(SnapcraftError):
 class RequiredPathDoesNotExist(SnapcraftError):
 
     fmt = 'Required path does not exist: {path!r}'
+
+
+class InvalidSourceChecksumError(SnapcraftError):
+
+    fmt = (
+        'Invalid source-checksum {checksum!r} for part {part_name!r}, '
+        'expected <algorithm>/<digest> with algorithm one of {algorithms}'
+    )
+
+
+class DigestMismatchError(SnapcraftError):
+
+    fmt = (
+        'Expected the {algorithm} digest for {source!r} to be {expected}, '
+        'but it was {calculated}'
+    )
@@ -29,6 +29,7 @@ import snapcraft
 from snapcraft import formatting_utils
 import snapcraft.internal
 from snapcraft.internal import (
+    cache,
     common,
     lxd,
     meta,
@@ -100,14 +101,39 @@ def execute(step, project_options, part_names=None):
     config = snapcraft.internal.load_config(project_options)
     repo.install_build_packages(config.build_tools)
 
+    compiler_cache = None
+    if project_options.use_ccache and step != 'pull':
+        compiler_cache = cache.CompilerCache(deb_arch=project_options.deb_arch)
+        compiler_cache_stats = compiler_cache.get_stats()
+
     _Executor(config, project_options).run(step, part_names)
 
+    if compiler_cache:
+        _log_compiler_cache_stats(
+            compiler_cache_stats, compiler_cache.get_stats())
+
     return {'name': config.data['name'],
             'version': config.data['version'],
             'arch': config.data['architectures'],
             'type': config.data.get('type', '')}
 
 
+def _log_compiler_cache_stats(stats_before, stats_after):
+    def _count(stats, keys):
+        return sum(stats.get(key, 0) for key in keys)
+
+    hit_keys = ['cache hit (direct)', 'cache hit (preprocessed)']
+    hits = _count(stats_after, hit_keys) - _count(stats_before, hit_keys)
+    misses = (_count(stats_after, ['cache miss']) -
+              _count(stats_before, ['cache miss']))
+    if hits + misses <= 0:
+        return
+
+    logger.info(
+        'Compiler cache: {} hits, {} misses ({:.0%} hit rate)'.format(
+            hits, misses, hits / (hits + misses)))
+
+
 def _replace_in_part(part):
     for key, value in part.code.options.__dict__.items():
         value = replace_attr(value, [
@@ -249,7 +275,7 @@ def _create_tar_filter(tar_filename):
     return _tar_filter
 
 
-def cleanbuild(project_options):
+def cleanbuild(project_options, incremental=False):
     if not repo.is_package_installed('lxd'):
         raise EnvironmentError(
             'The lxd package is not installed, in order to use `cleanbuild` '
@@ -259,13 +285,22 @@ def cleanbuild(project_options):
             '#ubuntu-desktop-and-ubuntu-server to enable a proper setup.')
 
     config = snapcraft.internal.load_config(project_options)
-    tar_filename = '{}_{}_source.tar.bz2'.format(
+    # Left uncompressed, it is only ever used to get the project across to
+    # the container and compressing it takes longer than sending it.
+    tar_filename = '{}_{}_source.tar'.format(
         config.data['name'], config.data['version'])
+    snap_filename = common.format_snap_name(config.data)
+
+    if incremental:
+        lxd.IncrementalCleanbuilder(
+            snap_filename, tar_filename, project_options,
+            project_name=config.data['name'],
+            tar_filter=_create_tar_filter(tar_filename)).execute()
+        return
 
-    with tarfile.open(tar_filename, 'w:bz2') as t:
+    with tarfile.open(tar_filename, 'w') as t:
         t.add(os.path.curdir, filter=_create_tar_filter(tar_filename))
 
-    snap_filename = common.format_snap_name(config.data)
     lxd.Cleanbuilder(snap_filename, tar_filename, project_options).execute()
 
 
@@ -440,6 +475,7 @@ def _cleanup_common_directories(config, project_options):
 
 def clean(project_options, parts, step=None):
     config = snapcraft.internal.load_config()
+    clean_all = not parts and not step
 
     if parts:
         config.parts.validate(parts)
@@ -452,3 +488,7 @@ def clean(project_options, parts, step=None):
     _clean_parts(parts, step, config, staged_state, primed_state)
 
     _cleanup_common_directories(config, project_options)
+
+    # What incremental cleanbuilds built goes along with everything else.
+    if clean_all:
+        lxd.delete_project_volume(config.data['name'], project_options)
@@ -15,10 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import json
 import logging
 import os
+import shutil
+import tarfile
+import tempfile
 from contextlib import contextmanager
-from subprocess import check_call, CalledProcessError
+from subprocess import call, check_call, CalledProcessError, DEVNULL
 from time import sleep
 
 import petname
@@ -31,6 +36,42 @@ _NETWORK_PROBE_COMMAND = \
         'http://start.ubuntu.com/connectivity-check.html')
 _PROXY_KEYS = ['http_proxy', 'https_proxy', 'no_proxy', 'ftp_proxy']
 
+# Installed in the base container incremental cleanbuilds are cloned from,
+# along with snapcraft itself.
+_BASE_PACKAGES = ['build-essential', 'bzr', 'git', 'mercurial', 'subversion']
+_BASE_SNAPSHOT = 'ready'
+_STORAGE_POOL = 'default'
+_PROJECT_DIR = '/root/build'
+_SYNC_MANIFEST = '.snapcraft-cleanbuild.json'
+
+
+def _lxc_succeeds(args):
+    return call(['lxc'] + args, stdout=DEVNULL, stderr=DEVNULL) == 0
+
+
+def _get_volume_name(project_name, deb_arch):
+    project_key = hashlib.sha1('{}:{}'.format(
+        os.getcwd(), deb_arch).encode()).hexdigest()
+    return 'snapcraft-{}-{}'.format(project_name, project_key[:8])
+
+
+def delete_project_volume(project_name, project_options):
+    """Delete the storage volume of the project in the current directory.
+
+    Incremental cleanbuilds keep the project, and the parts they built, in
+    that volume. Nothing is done if lxd is not available or there is no
+    such volume.
+    """
+    if not shutil.which('lxc'):
+        return
+
+    volume_name = _get_volume_name(project_name, project_options.deb_arch)
+    if _lxc_succeeds(['storage', 'volume', 'show', _STORAGE_POOL,
+                      volume_name]):
+        logger.info('Deleting storage volume {}'.format(volume_name))
+        check_call(['lxc', 'storage', 'volume', 'delete', _STORAGE_POOL,
+                    volume_name])
+
 
 class Cleanbuilder:
 
@@ -49,8 +90,11 @@ class Cleanbuilder:
         check_call(['lxc', 'file', 'pull',
                     '{}/{}'.format(self._container_name, src), dst])
 
-    def _container_run(self, cmd):
-        check_call(['lxc', 'exec', self._container_name, '--'] + cmd)
+    def _container_run(self, cmd, *, container_name=None, cwd=None):
+        if cwd:
+            cmd = ['sh', '-c', 'cd "$0" && exec "$@"', cwd] + cmd
+        check_call(['lxc', 'exec', container_name or self._container_name,
+                    '--'] + cmd)
 
     @contextmanager
     def _create_container(self):
@@ -71,17 +115,21 @@ class Cleanbuilder:
             self._wait_for_network()
             self._container_run(['apt-get', 'update'])
             self._container_run(['apt-get', 'install', 'snapcraft', '-y'])
-            try:
-                self._container_run(
-                    ['snapcraft', 'snap', '--output', self._snap_output])
-            except CalledProcessError as e:
-                if self._project_options.debug:
-                    logger.info('Debug mode enabled, dropping into a shell')
-                    self._container_run(['bash', '-i'])
-                else:
-                    raise e
+            self._build()
+
+    def _build(self, project_dir=None):
+        try:
+            self._container_run(
+                ['snapcraft', 'snap', '--output', self._snap_output],
+                cwd=project_dir)
+        except CalledProcessError as e:
+            if self._project_options.debug:
+                logger.info('Debug mode enabled, dropping into a shell')
+                self._container_run(['bash', '-i'], cwd=project_dir)
             else:
-                self._pull_snap()
+                raise e
+        else:
+            self._pull_snap(project_dir)
 
     def _setup_project(self):
         logger.info('Setting up container with project assets')
@@ -89,22 +137,154 @@ class Cleanbuilder:
         self._push_file(self._tar_filename, dst)
         self._container_run(['tar', 'xvf', dst])
 
-    def _pull_snap(self):
-        src = os.path.join('/root', self._snap_output)
+    def _pull_snap(self, project_dir=None):
+        src = os.path.join(project_dir or '/root', self._snap_output)
         self._pull_file(src, self._snap_output)
         logger.info('Retrieved {}'.format(self._snap_output))
 
-    def _wait_for_network(self):
+    def _wait_for_network(self, *, container_name=None):
         logger.info('Waiting for a network connection...')
         not_connected = True
         retry_count = 5
         while not_connected:
-            sleep(5)
             try:
-                self._container_run(['python3', '-c', _NETWORK_PROBE_COMMAND])
+                self._container_run(['python3', '-c', _NETWORK_PROBE_COMMAND],
+                                    container_name=container_name)
                 not_connected = False
             except CalledProcessError as e:
                 retry_count -= 1
                 if retry_count == 0:
                     raise e
+                sleep(5)
         logger.info('Network connection established')
+
+
+class IncrementalCleanbuilder(Cleanbuilder):
+    """Cleanbuilder reusing a prepared base container across builds.
+
+    The base container has snapcraft and common build packages installed
+    and is cloned for every build. The project is kept in a storage volume
+    mounted in the clones, only the files changed since the last build are
+    sent over and parts/ is preserved from one build to the next. The
+    volume is deleted by delete_project_volume.
+    """
+
+    def __init__(self, snap_output, tar_filename, project_options, *,
+                 project_name, tar_filter):
+        super().__init__(snap_output, tar_filename, project_options)
+        self._tar_filter = tar_filter
+        self._base_name = 'snapcraft-base-xenial-{}'.format(
+            project_options.deb_arch)
+        self._volume_name = _get_volume_name(
+            project_name, project_options.deb_arch)
+
+    def execute(self):
+        self._ensure_base_container()
+        self._ensure_volume()
+        with self._create_container():
+            self._setup_project()
+            self._wait_for_network()
+            # The base container package lists get old, and so does the
+            # snapcraft it has installed.
+            self._container_run(['apt-get', 'update'])
+            self._container_run(['apt-get', 'install', '-y', 'snapcraft'])
+            self._build(_PROJECT_DIR)
+
+    @contextmanager
+    def _create_container(self):
+        try:
+            check_call(['lxc', 'copy', '-e',
+                        '{}/{}'.format(self._base_name, _BASE_SNAPSHOT),
+                        self._container_name])
+            check_call(['lxc', 'storage', 'volume', 'attach', _STORAGE_POOL,
+                        self._volume_name, self._container_name,
+                        _PROJECT_DIR])
+            check_call(['lxc', 'start', self._container_name])
+            yield
+        finally:
+            # Stopping takes a while and lxc doesn't print anything.
+            print('Stopping {}'.format(self._container_name))
+            check_call(['lxc', 'stop', '-f', self._container_name])
+
+    def _ensure_base_container(self):
+        if _lxc_succeeds(['info', self._base_name]):
+            return
+
+        logger.info('Preparing base container {}'.format(self._base_name))
+        check_call([
+            'lxc', 'launch',
+            'ubuntu:xenial/{}'.format(self._project_options.deb_arch),
+            self._base_name])
+        try:
+            self._wait_for_network(container_name=self._base_name)
+            self._container_run(['apt-get', 'update'],
+                                container_name=self._base_name)
+            self._container_run(
+                ['apt-get', 'install', '-y', 'snapcraft'] + _BASE_PACKAGES,
+                container_name=self._base_name)
+            check_call(['lxc', 'stop', self._base_name])
+            check_call(['lxc', 'snapshot', self._base_name, _BASE_SNAPSHOT])
+        except BaseException:
+            # Do not leave a half prepared base container behind.
+            check_call(['lxc', 'delete', '-f', self._base_name])
+            raise
+
+    def _ensure_volume(self):
+        if not _lxc_succeeds(['storage', 'volume', 'show', _STORAGE_POOL,
+                              self._volume_name]):
+            check_call(['lxc', 'storage', 'volume', 'create', _STORAGE_POOL,
+                        self._volume_name])
+
+    def _setup_project(self):
+        logger.info('Syncing project assets with the container')
+        manifest_path = os.path.join(_PROJECT_DIR, _SYNC_MANIFEST)
+        synced = self._pull_manifest(manifest_path)
+        manifest = {}
+
+        def _filter(tarinfo):
+            tarinfo = self._tar_filter(tarinfo)
+            if tarinfo is None:
+                return None
+            manifest[tarinfo.name] = [tarinfo.mtime, tarinfo.size]
+            if tarinfo.isfile() and synced.get(tarinfo.name) == \
+                    manifest[tarinfo.name]:
+                return None
+            return tarinfo
+
+        with tarfile.open(self._tar_filename, 'w') as t:
+            t.add(os.path.curdir, filter=_filter)
+
+        # The manifest goes first so it never describes a partial sync.
+        removed = sorted(set(synced) - set(manifest))
+        self._container_run(['rm', '-rf', '--', manifest_path] + [
+            os.path.normpath(os.path.join(_PROJECT_DIR, name))
+            for name in removed])
+
+        dst = os.path.join('/root', os.path.basename(self._tar_filename))
+        try:
+            self._push_file(self._tar_filename, dst)
+        finally:
+            os.remove(self._tar_filename)
+        self._container_run(['tar', 'xvf', dst, '-C', _PROJECT_DIR])
+        self._push_manifest(manifest_path, manifest)
+
+    def _pull_manifest(self, manifest_path):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, _SYNC_MANIFEST)
+            if not _lxc_succeeds([
+                    'file', 'pull',
+                    '{}/{}'.format(self._container_name, manifest_path),
+                    path]):
+                return {}
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except ValueError:
+                return {}
+
+    def _push_manifest(self, manifest_path, manifest):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, _SYNC_MANIFEST)
+            with open(path, 'w') as f:
+                json.dump(manifest, f)
+            self._push_file(path, manifest_path)
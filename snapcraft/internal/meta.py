@@ -20,7 +20,6 @@ import re
 import shlex
 import shutil
 import subprocess
-import tempfile
 
 import yaml
 
@@ -225,14 +224,18 @@ class _SnapPackaging:
 def _find_bin(binary, basedir):
     # If it doesn't exist it might be in the path
     logger.debug('Checking that {!r} is in the $PATH'.format(binary))
-    script = ('#!/bin/sh\n' +
-              '{}\n'.format(common.assemble_env()) +
-              'which "{}"\n'.format(binary))
-    with tempfile.NamedTemporaryFile('w+') as tempf:
-        tempf.write(script)
-        tempf.flush()
+    command_env = common.render_env()
+    if command_env is None:
         try:
-            common.run(['/bin/sh', tempf.name], cwd=basedir,
+            common.run(['which', binary], cwd=basedir,
                        stdout=subprocess.DEVNULL)
         except subprocess.CalledProcessError:
             raise CommandError(binary)
+        return
+
+    # Relative entries are looked up from basedir, as which would do.
+    path = os.pathsep.join(
+        os.path.join(basedir, entry) for entry in
+        command_env.get('PATH', os.defpath).split(os.pathsep))
+    if not shutil.which(binary, path=path):
+        raise CommandError(binary)
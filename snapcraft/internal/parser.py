@@ -30,16 +30,23 @@ Options:
   -o --output=<filename>                where to write the parsed parts list.
 """
 
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import io
 import logging
 import os
 import pkg_resources
 import re
+import time
 import urllib
 import yaml
 from yaml.scanner import ScannerError
 
 from docopt import docopt
 from collections import OrderedDict
+from xdg import BaseDirectory
 
 from snapcraft.internal import log, repo, sources
 from snapcraft.internal.errors import SnapcraftError, InvalidWikiEntryError
@@ -57,14 +64,20 @@ class MissingSnapcraftYAMLError(Exception):
 logger = logging.getLogger(__name__)
 
 
-# TODO: make this a temporary directory that get's removed when finished
-BASE_DIR = "/tmp"
 PARTS_FILE = "snap-parts.yaml"
+# Origins are fetched concurrently, but not so many at once that the hosts
+# serving them are hammered.
+_MAX_FETCH_WORKERS = 8
+# How far ahead of the entry being processed origins are fetched.
+_MAX_PENDING_ENTRIES = 4 * _MAX_FETCH_WORKERS
 
 
 def _get_base_dir():
-    """The location to which sources are downloaded"""
-    return BASE_DIR
+    """The location to which sources are downloaded.
+
+    Checkouts are kept between runs so origins only fetch their updates.
+    """
+    return os.path.join(BaseDirectory.xdg_cache_home, 'snapcraft', 'parser')
 
 
 def _get_version():
@@ -168,7 +181,91 @@ def _encode_origin(origin):
     return re.sub('[^A-Za-z0-9-_.]', '', origin)
 
 
-def _process_entry(data):
+def _get_origin_dir(origin, origin_type):
+    """Return the checkout directory for origin pulled as origin_type.
+
+    Encoding drops characters from origin, so different origins can encode
+    the same way, and the same origin can be pulled with different source
+    types. A short hash of both keeps every checkout in its own directory.
+    """
+    key = '{}\0{}'.format(origin, origin_type or '')
+    return os.path.join(_get_base_dir(), '{}-{}'.format(
+        _encode_origin(origin), hashlib.sha1(key.encode()).hexdigest()[:8]))
+
+
+def _fetch_origin(origin, origin_type):
+    """Pull origin into its checkout and return its snapcraft.yaml data."""
+    origin_dir = _get_origin_dir(origin, origin_type)
+    os.makedirs(origin_dir, exist_ok=True)
+
+    source_handler = sources.get_source_handler(origin,
+                                                source_type=origin_type)
+    if source_handler is sources.Git:
+        # Only snapcraft.yaml is needed, not the history.
+        handler = source_handler(origin, source_dir=origin_dir,
+                                 source_depth=1)
+    else:
+        handler = source_handler(origin, source_dir=origin_dir)
+    repo.check_for_command(handler.command)
+    handler.pull()
+
+    try:
+        return _get_origin_data(origin_dir)
+    except (BadSnapcraftYAMLError, MissingSnapcraftYAMLError) as e:
+        raise InvalidWikiEntryError('snapcraft.yaml error: {}'.format(e))
+
+
+def _get_origin_key(data):
+    if not isinstance(data, dict) or 'origin' not in data:
+        return None
+    return data['origin'], data.get('origin-type')
+
+
+class _OriginFetcher:
+    """Fetch origins in the background, once for all the entries using them.
+
+    Fetched origins are dropped once the last entry that requested them has
+    been released, so memory does not grow with the size of the wiki.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._futures = {}
+        self._users = collections.Counter()
+        self.timings = {}
+
+    def _timed_fetch_origin(self, origin, origin_type):
+        start = time.monotonic()
+        try:
+            return _fetch_origin(origin, origin_type)
+        finally:
+            self.timings[origin] = time.monotonic() - start
+
+    def request(self, data):
+        """Start fetching the origin of the wiki entry data, if any."""
+        key = _get_origin_key(data)
+        if key is None:
+            return
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(
+                self._timed_fetch_origin, *key)
+        self._users[key] += 1
+
+    def release(self, data):
+        key = _get_origin_key(data)
+        if key is None:
+            return
+        self._users[key] -= 1
+        if not self._users[key]:
+            del self._users[key]
+            del self._futures[key]
+
+    def get(self, origin, origin_type):
+        """Wait for and return the snapcraft.yaml data for origin."""
+        return self._futures[(origin, origin_type)].result()
+
+
+def _process_entry(data, origins):
     parts_list = OrderedDict()
     # Store all the parts listed in 'after' for each included part so that
     # we can check later that we aren't missing any parts.
@@ -188,19 +285,7 @@ def _process_entry(data):
     except KeyError as e:
         raise InvalidWikiEntryError('Missing key in wiki entry: {}'.format(e))
 
-    origin_dir = os.path.join(_get_base_dir(), _encode_origin(origin))
-    os.makedirs(origin_dir, exist_ok=True)
-
-    source_handler = sources.get_source_handler(origin,
-                                                source_type=origin_type)
-    handler = source_handler(origin, source_dir=origin_dir)
-    repo.check_for_command(handler.command)
-    handler.pull()
-
-    try:
-        origin_data = _get_origin_data(origin_dir)
-    except (BadSnapcraftYAMLError, MissingSnapcraftYAMLError) as e:
-        raise InvalidWikiEntryError('snapcraft.yaml error: {}'.format(e))
+    origin_data = origins.get(origin, origin_type)
 
     origin_parts = origin_data.get('parts', {})
     origin_name = origin_data.get('name')
@@ -216,94 +301,162 @@ def _process_entry(data):
     return parts_list, after_parts
 
 
-def _process_wiki_entry(entry, master_parts_list):
-    """Add valid wiki entries to the master parts list"""
-    # return the number of errors encountered
+def _load_wiki_entry(entry):
     try:
-        data = yaml.load(entry)
+        return yaml.load(entry)
     except ScannerError as e:
         raise InvalidWikiEntryError(
             'Bad wiki entry, possibly malformed YAML for entry: {}'.format(e))
 
+
+def _process_wiki_entry(entry, data, part_names, parts_file, origins):
+    """Write the parts of valid wiki entries to parts_file"""
     try:
         parts = data['parts']
     except KeyError as e:
         raise InvalidWikiEntryError(
             '"parts" missing from wiki entry: {}'.format(entry))
     for part_name in parts:
-        if part_name and part_name in master_parts_list:
+        if part_name and part_name in part_names:
             raise InvalidWikiEntryError(
                 'Duplicate part found in the wiki: {} in entry {}'.format(
                     part_name, entry))
 
-    parts_list, after_parts = _process_entry(data)
+    parts_list, after_parts = _process_entry(data, origins)
 
-    if is_valid_parts_list(parts_list, after_parts):
-        master_parts_list.update(parts_list)
+    if is_valid_parts_list(parts_list, after_parts) and parts_list:
+        # Mappings dumped one after the other make up a single mapping.
+        parts_file.write(yaml.dump(parts_list, default_flow_style=False))
+        part_names.update(parts_list)
 
 
-def _process_index(output):
-    # XXX: This can't remain in memory if the list gets very large, but it
-    # should be okay for now.
-    master_parts_list = OrderedDict()
-    wiki_errors = 0
+def _iter_wiki_lines(index_file):
+    leading = True
+    for line in index_file:
+        line = line.replace(b'{{{', b'').replace(b'}}}', b'')
+        if leading:
+            line = line.lstrip()
+            if not line:
+                continue
+            leading = False
+        # Decoded lines may still hold other kinds of line breaks.
+        yield from line.decode().splitlines()
 
-    output = output.replace(b'{{{', b'').replace(b'}}}', b'')
-    output = output.strip()
 
-    # split the wiki into an array of entries to allow the parser to
-    # proceed when invalid yaml is found.
-    entry = ''
-    for line in output.decode().splitlines():
-        if line == '---':
-            if entry:
-                try:
-                    _process_wiki_entry(entry, master_parts_list)
-                except SnapcraftError as e:
-                    logger.warning(e)
-                    wiki_errors += 1
-
-                entry = ''
-        else:
-            entry = '\n'.join([entry, line])
+def _join_entry_lines(entry_lines):
+    return ''.join('\n' + line for line in entry_lines)
 
-    if entry:
-        try:
-            _process_wiki_entry(entry, master_parts_list)
-        except SnapcraftError as e:
-            logger.warning(e)
-            wiki_errors += 1
 
-    return {'master_parts_list': master_parts_list,
-            'wiki_errors': wiki_errors}
+def _iter_wiki_entries(index_file):
+    """Yield the entries of the wiki read from index_file, one at a time.
 
+    Splitting the wiki into entries allows the parser to proceed when
+    invalid yaml is found.
+    """
+    entry_lines = []
+    for line in _iter_wiki_lines(index_file):
+        if line == '---':
+            if any(line.strip() for line in entry_lines):
+                yield _join_entry_lines(entry_lines)
+            entry_lines = []
+        else:
+            entry_lines.append(line)
 
-def run(args):
-    path = args.get('--output')
-    if path is None:
-        path = PARTS_FILE
+    if any(line.strip() for line in entry_lines):
+        yield _join_entry_lines(entry_lines)
 
-    index = args.get('--index')
+
+def _process_pending_entry(pending_entry, part_names, parts_file, origins):
+    """Process a wiki entry, returning the number of errors found in it."""
+    entry, data, error = pending_entry
+    try:
+        if error:
+            raise error
+        _process_wiki_entry(entry, data, part_names, parts_file, origins)
+    except SnapcraftError as e:
+        logger.warning(e)
+        return 1
+    finally:
+        origins.release(data)
+    return 0
+
+
+def _process_index(index_file, parts_file):
+    """Parse the wiki read from index_file and write its parts to parts_file.
+
+    Entries are read and written as they go, only the part names and the
+    entries waiting for their origin are kept in memory.
+    """
+    part_names = set()
+    wiki_errors = 0
+    pending_entries = collections.deque()
+
+    # Origins are slow to fetch and independent of each other, fetch them
+    # ahead and process the entries in order as their origins arrive.
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=_MAX_FETCH_WORKERS) as executor:
+        origins = _OriginFetcher(executor)
+        for entry in _iter_wiki_entries(index_file):
+            try:
+                data, error = _load_wiki_entry(entry), None
+            except SnapcraftError as e:
+                data, error = None, e
+            origins.request(data)
+            pending_entries.append((entry, data, error))
+
+            if len(pending_entries) > _MAX_PENDING_ENTRIES:
+                wiki_errors += _process_pending_entry(
+                    pending_entries.popleft(), part_names, parts_file,
+                    origins)
+
+        while pending_entries:
+            wiki_errors += _process_pending_entry(
+                pending_entries.popleft(), part_names, parts_file, origins)
+
+    if not part_names:
+        parts_file.write(yaml.dump({}, default_flow_style=False))
+
+    return {'wiki_errors': wiki_errors,
+            'elapsed': time.monotonic() - start,
+            'timings': origins.timings}
+
+
+def _log_timings(elapsed, timings):
+    logger.info('Processed {} origins in {:.1f}s'.format(
+        len(timings), elapsed))
+    for origin, elapsed in sorted(
+            timings.items(), key=lambda item: item[1], reverse=True):
+        logger.info('  {:.1f}s {}'.format(elapsed, origin))
+
+
+def _open_index(index):
     if index:
         if '://' not in index:
             index = '{}{}'.format(
                 'file://', os.path.join(os.getcwd(), index))
-        output = urllib.request.urlopen(index).read()
+        return urllib.request.urlopen(index)
     else:
         # XXX: fetch the index from the wiki
-        output = b'{}'
+        return io.BytesIO(b'{}')
+
 
-    data = _process_index(output)
-    master_parts_list = data['master_parts_list']
+def run(args):
+    path = args.get('--output')
+    if path is None:
+        path = PARTS_FILE
+
+    with contextlib.closing(_open_index(args.get('--index'))) as index_file:
+        data = _write_parts_list(path, index_file)
     wiki_errors = data['wiki_errors']
 
+    _log_timings(data['elapsed'], data['timings'])
     if wiki_errors:
         logger.warning("{} wiki errors found!".format(wiki_errors))
 
-    _write_parts_list(path, master_parts_list)
-
     if args['--debug']:
-        print(yaml.dump(master_parts_list, default_flow_style=False))
+        with open(path) as fp:
+            print(fp.read())
 
     return wiki_errors
 
@@ -318,8 +471,16 @@ def is_valid_parts_list(parts_list, parts):
     return True
 
 
-def _write_parts_list(path, master_parts_list):
+def _write_parts_list(path, index_file):
     logging.debug('Writing parts list to {!r}'.format(path))
-    with open(path, 'w') as fp:
-        fp.write(yaml.dump(master_parts_list,
-                 default_flow_style=False))
+    # Write next to path and move into place once complete, a failed run
+    # leaves the previous parts list untouched.
+    tmp_path = '{}.partial'.format(path)
+    try:
+        with open(tmp_path, 'w') as fp:
+            data = _process_index(index_file, fp)
+        os.replace(tmp_path, path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+    return data
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import difflib
 import logging
 import os
@@ -26,7 +27,7 @@ from xdg import BaseDirectory
 from snapcraft.internal.indicators import download_requests_stream
 from snapcraft.internal.common import get_terminal_width
 from snapcraft.internal.errors import SnapcraftPartMissingError
-from snapcraft.internal import pluginhandler, repo
+from snapcraft.internal import parts_index, pluginhandler, repo
 from snapcraft.internal import project_loader
 
 
@@ -42,9 +43,16 @@ logger = logging.getLogger(__name__)
 class _Base:
 
     def __init__(self):
-        self.parts_dir = os.path.join(BaseDirectory.xdg_data_home, 'snapcraft')
+        self.parts_yaml = get_remote_parts_path()
+        self.parts_dir = os.path.dirname(self.parts_yaml)
         os.makedirs(self.parts_dir, exist_ok=True)
-        self.parts_yaml = os.path.join(self.parts_dir, 'parts.yaml')
+        self.parts_index = parts_index.PartsIndex(
+            os.path.join(self.parts_dir, 'parts.db'))
+
+    def _compile_parts_index(self):
+        with open(self.parts_yaml) as parts_file:
+            remote_parts = yaml.load(parts_file) or {}
+        self.parts_index.compile(remote_parts, self.parts_yaml)
 
 
 class _Update(_Base):
@@ -64,23 +72,43 @@ class _Update(_Base):
             return
         self._request.raise_for_status()
 
-        download_requests_stream(self._request, self.parts_yaml,
-                                 'Downloading parts list')
+        # Download next to the current list and swap it in once complete,
+        # an interrupted update leaves the current list untouched.
+        tmp_parts_yaml = '{}.{}.partial'.format(self.parts_yaml, os.getpid())
+        try:
+            download_requests_stream(self._request, tmp_parts_yaml,
+                                     'Downloading parts list')
+            os.replace(tmp_parts_yaml, self.parts_yaml)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_parts_yaml)
+        self._compile_parts_index()
         self._save_headers()
 
     def _load_headers(self):
-        if not os.path.exists(self._headers_yaml):
-            return None
+        # The list is compressed in transit when the server supports it.
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        # There is nothing to validate without a list to keep.
+        if (not os.path.exists(self._headers_yaml) or
+                not os.path.exists(self.parts_yaml)):
+            return headers
 
         with open(self._headers_yaml) as headers_file:
-            return yaml.load(headers_file)
+            headers.update(yaml.load(headers_file) or {})
+        return headers
 
     def _save_headers(self):
         headers = {
             'If-Modified-Since': self._request.headers.get('Last-Modified')}
+        etag = self._request.headers.get('ETag')
+        if etag:
+            headers['If-None-Match'] = etag
 
-        with open(self._headers_yaml, 'w') as headers_file:
+        tmp_headers_yaml = '{}.{}.partial'.format(
+            self._headers_yaml, os.getpid())
+        with open(tmp_headers_yaml, 'w') as headers_file:
             headers_file.write(yaml.dump(headers))
+        os.replace(tmp_headers_yaml, self._headers_yaml)
 
 
 class _RemoteParts(_Base):
@@ -91,13 +119,14 @@ class _RemoteParts(_Base):
         if not os.path.exists(self.parts_yaml):
             update()
 
-        with open(self.parts_yaml) as parts_file:
-            self._parts = yaml.load(parts_file)
+        # Parts lists downloaded before the index existed, or modified
+        # since, are compiled on first use.
+        if not self.parts_index.is_current(self.parts_yaml):
+            self._compile_parts_index()
 
     def get_part(self, part_name, full=False):
-        try:
-            remote_part = self._parts[part_name].copy()
-        except KeyError:
+        remote_part = self.parts_index.get(part_name)
+        if remote_part is None:
             raise SnapcraftPartMissingError(part_name=part_name)
         if not full:
             for key in ['description', 'maintainer']:
@@ -109,12 +138,13 @@ class _RemoteParts(_Base):
         matcher.set_seq2(part_match)
 
         matching_parts = {}
-        for part_name in self._parts.keys():
+        for part_name in self.parts_index.candidates_for(
+                part_match, _MATCH_RATIO):
             matcher.set_seq1(part_name)
             add_part_name = matcher.ratio() >= _MATCH_RATIO
 
             if add_part_name or (part_match in part_name):
-                matching_parts[part_name] = self._parts[part_name]
+                matching_parts[part_name] = self.parts_index.get(part_name)
                 if len(part_name) > max_len:
                     max_len = len(part_name)
 
@@ -271,33 +301,62 @@ class PartsConfig:
         return part
 
     def build_env_for_part(self, part, root_part=True):
-        """Return a build env of all the part's dependencies."""
+        """Return a build env of all the part's dependencies.
 
+        Every dependency contributes once, in the order they are first
+        found walking the dependencies depth first. The environment for a
+        root is only worked out once per call, as the same root is shared
+        by most of the dependencies.
+        """
         env = []
         stagedir = self._project_options.stage_dir
+        root_envs = {}
+
+        def _get_root_env(get_env, root):
+            key = (get_env, root)
+            if key not in root_envs:
+                root_envs[key] = get_env(
+                    root, self._project_options.arch_triplet)
+            return root_envs[key]
 
         if root_part:
             # this has to come before any {}/usr/bin
             env += part.env(part.installdir)
-            env += project_loader._runtime_env(
-                part.installdir, self._project_options.arch_triplet)
-            env += project_loader._runtime_env(
-                stagedir, self._project_options.arch_triplet)
-            env += project_loader._build_env(
-                part.installdir, self._project_options.arch_triplet)
-            env += project_loader._build_env_for_stage(
-                stagedir, self._project_options.arch_triplet)
+            env += _get_root_env(
+                project_loader._runtime_env, part.installdir)
+            env += _get_root_env(project_loader._runtime_env, stagedir)
+            env += _get_root_env(project_loader._build_env, part.installdir)
+            env += _get_root_env(
+                project_loader._build_env_for_stage, stagedir)
+            if self._project_options.use_ccache:
+                env += project_loader._compiler_cache_env(
+                    self._project_options)
             env.append('SNAPCRAFT_PART_INSTALL={}'.format(part.installdir))
         else:
             env += part.env(stagedir)
-            env += project_loader._runtime_env(
-                stagedir, self._project_options.arch_triplet)
+            env += _get_root_env(project_loader._runtime_env, stagedir)
 
-        for dep_part in part.deps:
+        for dep_part in _get_all_deps(part):
             env += dep_part.env(stagedir)
-            env += self.build_env_for_part(dep_part, root_part=False)
+            env += _get_root_env(project_loader._runtime_env, stagedir)
 
-        return env
+        return project_loader._dedup_env(env)
+
+
+def _get_all_deps(part):
+    """Return the dependencies of part and theirs, depth first, once."""
+    all_deps = []
+    seen = {part.name}
+
+    def _visit(part):
+        for dep_part in part.deps:
+            if dep_part.name not in seen:
+                seen.add(dep_part.name)
+                all_deps.append(dep_part)
+                _visit(dep_part)
+
+    _visit(part)
+    return all_deps
 
 
 def update():
@@ -346,3 +405,9 @@ def search(part_match):
 
 def get_remote_parts():
     return _RemoteParts()
+
+
+def get_remote_parts_path():
+    """Return the path to the local copy of the remote parts list."""
+    return os.path.join(
+        BaseDirectory.xdg_data_home, 'snapcraft', 'parts.yaml')
@@ -0,0 +1,170 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Indexed on-disk store for the remote parts list.
+
+The parts list is compiled into an sqlite database with a table of parts
+keyed by name, a trigram index over the part names and the count of each
+character in them. Looking up a part does not require loading the whole
+list and searching only looks at names sharing part of their spelling or
+enough of their characters with the query.
+"""
+
+import collections
+import contextlib
+import os
+import pickle
+import sqlite3
+
+
+# Bump whenever the layout of the database changes.
+_FORMAT_VERSION = '2'
+_TRIGRAM_SIZE = 3
+
+
+def _trigrams(name):
+    padded = '  {} '.format(name)
+    return {padded[i:i + _TRIGRAM_SIZE]
+            for i in range(len(padded) - _TRIGRAM_SIZE + 1)}
+
+
+def _get_source_stamp(source_path):
+    st = os.stat(source_path)
+    return '{}:{}'.format(st.st_mtime_ns, st.st_size)
+
+
+class PartsIndex:
+    """Remote parts list compiled into the database at path."""
+
+    def __init__(self, path):
+        self._path = path
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def is_current(self, source_path):
+        """Return True if the index was compiled from source_path as is."""
+        if not os.path.exists(self._path):
+            return False
+        try:
+            meta = dict(self._connect().execute(
+                'SELECT key, value FROM meta'))
+            source_stamp = _get_source_stamp(source_path)
+        except (OSError, sqlite3.DatabaseError):
+            self.close()
+            return False
+        return (meta.get('version') == _FORMAT_VERSION and
+                meta.get('source') == source_stamp)
+
+    def compile(self, parts, source_path):
+        """Replace the index with one for parts, read from source_path.
+
+        :param dict parts: the parts list, as loaded from source_path.
+        """
+        self.close()
+        tmp_path = '{}.{}.partial'.format(self._path, os.getpid())
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+
+        try:
+            with contextlib.closing(sqlite3.connect(tmp_path)) as connection:
+                _populate(connection, parts, _get_source_stamp(source_path))
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, name):
+        """Return the properties for part name or None if it is unknown."""
+        row = self._connect().execute(
+            'SELECT data FROM parts WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def names(self):
+        """Return all the part names in the index."""
+        return [row[0] for row in self._connect().execute(
+            'SELECT name FROM parts')]
+
+    def candidates_for(self, query, min_ratio):
+        """Return the part names that could be a match for query.
+
+        Names containing query share at least one trigram with it. Names
+        similar to it, with a difflib.SequenceMatcher ratio of at least
+        min_ratio, share enough characters with it for their quick_ratio to
+        reach min_ratio too. Queries too short to have trigrams of their
+        own match every name.
+        """
+        if len(query) < _TRIGRAM_SIZE:
+            return self.names()
+
+        connection = self._connect()
+        trigrams = sorted(_trigrams(query))
+        candidates = {row[0] for row in connection.execute(
+            'SELECT DISTINCT name FROM trigrams WHERE trigram IN ({})'.format(
+                ', '.join('?' * len(trigrams))), trigrams)}
+
+        # The same bound as SequenceMatcher.quick_ratio, computed the same
+        # way so names right at min_ratio are not lost to rounding.
+        counts = sorted(collections.Counter(query).items())
+        candidates.update(row[0] for row in connection.execute(
+            'WITH query (character, count) AS (VALUES {}) '
+            'SELECT name FROM characters JOIN query USING (character) '
+            'GROUP BY name HAVING 2.0 * SUM(MIN(characters.count, '
+            'query.count)) / (? + LENGTH(name)) >= ?'.format(
+                ', '.join(['(?, ?)'] * len(counts))),
+            [value for item in counts for value in item] +
+            [len(query), min_ratio]))
+        return list(candidates)
+
+
+def _populate(connection, parts, source_stamp):
+    connection.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE parts (name TEXT PRIMARY KEY, data BLOB);
+        CREATE TABLE trigrams (
+            trigram TEXT, name TEXT, PRIMARY KEY (trigram, name)
+        ) WITHOUT ROWID;
+        CREATE TABLE characters (
+            character TEXT, name TEXT, count INTEGER,
+            PRIMARY KEY (character, name)
+        ) WITHOUT ROWID;
+    """)
+    connection.executemany(
+        'INSERT INTO parts VALUES (?, ?)',
+        ((name, pickle.dumps(properties, protocol=pickle.HIGHEST_PROTOCOL))
+         for name, properties in parts.items()))
+    connection.executemany(
+        'INSERT INTO trigrams VALUES (?, ?)',
+        ((trigram, name) for name in parts for trigram in _trigrams(name)))
+    connection.executemany(
+        'INSERT INTO characters VALUES (?, ?, ?)',
+        ((character, name, count) for name in parts
+         for character, count in collections.Counter(name).items()))
+    connection.executemany(
+        'INSERT INTO meta VALUES (?, ?)',
+        (('version', _FORMAT_VERSION), ('source', source_stamp)))
+    connection.commit()
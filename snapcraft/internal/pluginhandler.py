@@ -29,7 +29,9 @@ import yaml
 
 import snapcraft
 from snapcraft import file_utils
+from snapcraft._schema import compile_validator, raise_for_errors
 from snapcraft.internal.errors import (
+    InvalidSourceChecksumError,
     PluginError,
     MissingState,
     SnapcraftPartConflictError,
@@ -44,6 +46,10 @@ from snapcraft.internal import (
 
 logger = logging.getLogger(__name__)
 
+# The schemas for plugin options and their validators, built once per
+# plugin class for all the parts using it.
+_plugin_schemas = {}
+
 
 class PluginHandler:
 
@@ -121,8 +127,9 @@ class PluginHandler:
                 raise PluginError('unknown plugin: {}'.format(plugin_name))
 
         plugin = _get_plugin(module)
-        _validate_pull_and_build_properties(plugin_name, plugin, part_schema)
-        options = _make_options(part_schema, properties, plugin.schema())
+        plugin_schema, plugin_validator = _get_plugin_schema(
+            plugin_name, plugin, part_schema)
+        options = _make_options(properties, plugin_schema, plugin_validator)
         # For backwards compatibility we add the project to the plugin
         try:
             self.code = plugin(self.name, options, self._project_options)
@@ -161,6 +168,14 @@ class PluginHandler:
         # TODO: we cannot pop source as it is used by plugins. We also make
         # the default '.'
         source_handler = None
+        if properties['source-checksum']:
+            try:
+                sources.split_checksum(properties['source-checksum'])
+            except ValueError:
+                raise InvalidSourceChecksumError(
+                    part_name=self.name,
+                    checksum=properties['source-checksum'],
+                    algorithms=sources.CHECKSUM_ALGORITHMS)
         if properties['source']:
             handler_class = sources.get_source_handler(
                 properties['source'], source_type=properties['source-type'])
@@ -171,6 +186,7 @@ class PluginHandler:
                 source_tag=properties['source-tag'],
                 source_depth=properties['source-depth'],
                 source_commit=properties['source-commit'],
+                source_checksum=properties['source-checksum'],
             )
 
         return source_handler
@@ -628,9 +644,27 @@ def _merged_part_and_plugin_schemas(part_schema, plugin_schema):
     return plugin_schema
 
 
-def _validate_pull_and_build_properties(plugin_name, plugin, part_schema):
-    merged_schema = _merged_part_and_plugin_schemas(
+def _get_plugin_schema(plugin_name, plugin, part_schema):
+    """Return the schema for the options of plugin and its validator."""
+    cached = _plugin_schemas.get(plugin)
+    if cached and cached[0] is part_schema:
+        return cached[1:]
+
+    plugin_schema = _merged_part_and_plugin_schemas(
         part_schema, plugin.schema())
+    _validate_pull_and_build_properties(plugin_name, plugin, plugin_schema)
+
+    # This is for backwards compatibility for when most of the
+    # schema was overridable by the plugins.
+    if 'required' in plugin_schema and not plugin_schema['required']:
+        del plugin_schema['required']
+
+    plugin_validator = compile_validator(plugin_schema)
+    _plugin_schemas[plugin] = (part_schema, plugin_schema, plugin_validator)
+    return plugin_schema, plugin_validator
+
+
+def _validate_pull_and_build_properties(plugin_name, plugin, merged_schema):
     merged_properties = merged_schema['properties']
 
     # First, validate pull properties
@@ -661,17 +695,10 @@ def _validate_step_properties(step_properties, schema_properties):
     return invalid_properties
 
 
-def _make_options(part_schema, properties, plugin_schema):
+def _make_options(properties, plugin_schema, plugin_validator):
     # Make copies as these dictionaries are tampered with
-    part_schema = part_schema.copy()
     properties = properties.copy()
 
-    plugin_schema = _merged_part_and_plugin_schemas(part_schema, plugin_schema)
-
-    # This is for backwards compatibility for when most of the
-    # schema was overridable by the plugins.
-    if 'required' in plugin_schema and not plugin_schema['required']:
-            del plugin_schema['required']
     # With the same backwards compatibility in mind we need to remove
     # the source entry before validation. To those concerned, it has
     # already been validated.
@@ -681,7 +708,7 @@ def _make_options(part_schema, properties, plugin_schema):
     for key in remove_set:
         del validated_properties[key]
 
-    jsonschema.validate(validated_properties, plugin_schema)
+    raise_for_errors(plugin_validator, validated_properties)
 
     options = _populate_options(properties, plugin_schema)
 
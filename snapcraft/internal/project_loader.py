@@ -15,9 +15,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import codecs
+import contextlib
+import hashlib
 import logging
 import os
 import os.path
+import pickle
 import re
 import sys
 
@@ -27,17 +30,20 @@ import yaml
 import snapcraft
 from snapcraft import formatting_utils
 from snapcraft.internal import (
+    cache,
     common,
     libraries,
     parts,
     pluginhandler,
 )
 from snapcraft._schema import Validator, SnapcraftSchemaError
-from snapcraft.internal.parts import SnapcraftLogicError, get_remote_parts
 
 
 logger = logging.getLogger(__name__)
 
+_ENV_ASSIGNMENT = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)=(.*)\Z', re.DOTALL)
+_ENV_REFERENCE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
+
 
 @jsonschema.FormatChecker.cls_checks('file-path')
 def _validate_file_exists(instance):
@@ -111,7 +117,7 @@ class Config:
     @property
     def _remote_parts(self):
         if getattr(self, '_remote_parts_attr', None) is None:
-            self._remote_parts_attr = get_remote_parts()
+            self._remote_parts_attr = parts.get_remote_parts()
         return self._remote_parts_attr
 
     def __init__(self, project_options=None):
@@ -122,14 +128,22 @@ class Config:
         self._project_options = project_options
 
         self._snapcraft_yaml = _get_snapcraft_yaml()
-        snapcraft_yaml = _snapcraft_yaml_load(self._snapcraft_yaml)
-
-        self._validator = Validator(snapcraft_yaml)
-        self._validator.validate()
-
-        snapcraft_yaml = self._process_remote_parts(snapcraft_yaml)
-        snapcraft_yaml = self._expand_filesets(snapcraft_yaml)
-        self.data = self._expand_env(snapcraft_yaml)
+        self.data = _load_project_snapshot(
+            self._snapcraft_yaml, project_options)
+        if self.data is None:
+            snapcraft_yaml = _snapcraft_yaml_load(self._snapcraft_yaml)
+
+            self._validator = Validator(snapcraft_yaml)
+            self._validator.validate()
+
+            snapcraft_yaml = self._process_remote_parts(snapcraft_yaml)
+            snapcraft_yaml = self._expand_filesets(snapcraft_yaml)
+            self.data = self._expand_env(snapcraft_yaml)
+            _save_project_snapshot(
+                self._snapcraft_yaml, project_options, self.data)
+        else:
+            # The snapshot was validated when it was taken.
+            self._validator = Validator(self.data)
 
         # both confinement type and build quality are optionals
         _ensure_confinement_default(self.data, self._validator.schema)
@@ -311,6 +325,41 @@ def _build_env(root, arch_triplet):
     return env
 
 
+def _compiler_cache_env(project_options):
+    """Set the environment variables required for caching compiler output."""
+    compiler_cache = cache.CompilerCache(deb_arch=project_options.deb_arch)
+    return compiler_cache.get_env(
+        compiler_prefix=cache.CompilerCache.get_compiler_prefix(
+            project_options),
+        base_dir=os.path.dirname(project_options.parts_dir))
+
+
+def _dedup_env(env):
+    """Drop the entries in env repeating the last one for their variable.
+
+    Assigning a variable the same value again, or prepending or appending
+    the same paths to it again, does not change what it resolves to as
+    long as the value only refers to the variable itself.
+    """
+    deduped_env = []
+    last_entries = {}
+    for entry in env:
+        match = _ENV_ASSIGNMENT.match(entry)
+        if not match:
+            # Anything could have changed.
+            last_entries.clear()
+            deduped_env.append(entry)
+            continue
+
+        name, value = match.groups()
+        if (last_entries.get(name) == entry and
+                set(_ENV_REFERENCE.findall(value)) <= {name}):
+            continue
+        last_entries[name] = entry
+        deduped_env.append(entry)
+    return deduped_env
+
+
 def _build_env_for_stage(stagedir, arch_triplet):
     env = _build_env(stagedir, arch_triplet)
     env.append('PERL5LIB={0}/usr/share/perl5/'.format(stagedir))
@@ -352,6 +401,88 @@ def _snapcraft_yaml_load(yaml_file):
                 e.problem, e.problem_mark.line + 1, yaml_file))
 
 
+def _get_project_snapshot_path(project_options):
+    return os.path.join(project_options.parts_dir, '.cache', 'project.pickle')
+
+
+def _update_hash_from_file(file_hash, path):
+    file_hash.update(path.encode('utf-8', 'surrogateescape') + b'\0')
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                file_hash.update(chunk)
+    except FileNotFoundError:
+        file_hash.update(b'\0missing')
+
+
+def _get_project_snapshot_key(snapcraft_yaml_file, project_options):
+    """Return a key for everything the resolved project data depends on."""
+    key = hashlib.sha256()
+    key.update('{}\0{}\0'.format(
+        snapcraft.__version__, project_options.stage_dir).encode())
+    _update_hash_from_file(key, os.path.abspath(snapcraft_yaml_file))
+    _update_hash_from_file(key, os.path.abspath(
+        os.path.join(common.get_schemadir(), 'snapcraft.yaml')))
+    _update_hash_from_file(key, parts.get_remote_parts_path())
+    for root, directories, files in os.walk(
+            project_options.local_plugins_dir):
+        directories.sort()
+        for file_name in sorted(files):
+            _update_hash_from_file(key, os.path.join(root, file_name))
+    return key.hexdigest()
+
+
+def _load_project_snapshot(snapcraft_yaml_file, project_options):
+    """Return the project data saved when nothing it depends on changed.
+
+    The data is returned as it was before defaults were filled in, or None
+    if there is no usable snapshot.
+    """
+    snapshot_path = _get_project_snapshot_path(project_options)
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+        snapshot_key, data = snapshot['key'], snapshot['data']
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Unpickling a truncated snapshot, or one written by another version
+        # of snapcraft, can fail in just about any way.
+        logger.debug('Discarding the unusable resolved project data.')
+        with contextlib.suppress(OSError):
+            os.remove(snapshot_path)
+        return None
+
+    key = _get_project_snapshot_key(snapcraft_yaml_file, project_options)
+    if snapshot_key != key:
+        return None
+    logger.debug('Using the resolved project data from the last run')
+    return data
+
+
+def _save_project_snapshot(snapcraft_yaml_file, project_options, data):
+    # Do not create the parts directory only to hold the snapshot, a
+    # project that has not been worked on yet gains nothing from it.
+    if not os.path.isdir(project_options.parts_dir):
+        return
+
+    snapshot = {
+        'key': _get_project_snapshot_key(snapcraft_yaml_file, project_options),
+        'data': data,
+    }
+    snapshot_path = _get_project_snapshot_path(project_options)
+    tmp_snapshot_path = '{}.{}.partial'.format(snapshot_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        with open(tmp_snapshot_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_snapshot_path, snapshot_path)
+    except (OSError, pickle.PicklingError):
+        logger.debug('Unable to save the resolved project data.')
+        with contextlib.suppress(OSError):
+            os.remove(tmp_snapshot_path)
+
+
 def load_config(project_options=None):
     try:
         return Config(project_options)
@@ -407,7 +538,7 @@ def _expand_filesets_for(step, properties):
             try:
                 new_step_set.extend(filesets[item[1:]])
             except KeyError:
-                raise SnapcraftLogicError(
+                raise parts.SnapcraftLogicError(
                     '\'{}\' referred to in the \'{}\' fileset but it is not '
                     'in filesets'.format(item, step))
         else:
@@ -53,6 +53,13 @@ code for that part, and how to unpack it if necessary.
     Snapcraft will checkout the specific tag from the source tree revision
     control system.
 
+  - source-checksum: <algorithm>/<digest>
+
+    Snapcraft will verify the source file (tar, zip, deb or rpm) matches
+    the given digest, e.g. sha256/<digest>. Downloaded files are kept in a
+    cache shared across projects, and a source with a known checksum is
+    not downloaded again.
+
   - source-subdir: path
 
     Snapcraft will checkout the repository or unpack the archive referred to
@@ -68,8 +75,10 @@ cases you want to refer to the help text for the specific plugin.
 
 """
 
-import copy
-import glob
+import contextlib
+import fnmatch
+import hashlib
+import json
 import logging
 import os
 import os.path
@@ -77,15 +86,14 @@ import stat
 import re
 import requests
 import shutil
+import signal
 import subprocess
 import tempfile
-import tarfile
 import zipfile
 
 import apt_inst
-import libarchive
 
-from snapcraft.internal import common
+from snapcraft.internal import cache, common, errors
 from snapcraft import file_utils
 from snapcraft.internal.indicators import download_requests_stream
 
@@ -101,6 +109,7 @@ __SOURCE_DEFAULTS = {
     'source-type': None,
     'source-branch': None,
     'source-subdir': None,
+    'source-checksum': None,
 }
 
 
@@ -108,6 +117,33 @@ def get_source_defaults():
     return __SOURCE_DEFAULTS.copy()
 
 
+# The algorithms a source-checksum can use, the variable length shake ones
+# need to be told how long a digest to make.
+CHECKSUM_ALGORITHMS = sorted(
+    algorithm for algorithm in hashlib.algorithms_guaranteed
+    if not algorithm.startswith('shake_'))
+
+
+def split_checksum(checksum):
+    """Split a source-checksum of the form <algorithm>/<digest>."""
+    algorithm, _, digest = checksum.partition('/')
+    if not digest or algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError(
+            'invalid source-checksum {!r}, expected <algorithm>/<digest> '
+            'with algorithm one of {}'.format(checksum, CHECKSUM_ALGORITHMS))
+    return algorithm, digest
+
+
+def calculate_digests(filename, algorithms):
+    """Calculate the digests for filename in a single read."""
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            for h in hashes.values():
+                h.update(chunk)
+    return {algorithm: h.hexdigest() for algorithm, h in hashes.items()}
+
+
 class IncompatibleOptionsError(Exception):
 
     def __init__(self, message):
@@ -118,55 +154,156 @@ class Base:
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
                  source_branch=None, source_depth=None,
-                 command=None):
+                 command=None, source_checksum=None):
         self.source = source
         self.source_dir = source_dir
         self.source_tag = source_tag
         self.source_commit = source_commit
         self.source_branch = source_branch
         self.source_depth = source_depth
+        self.source_checksum = source_checksum
 
         self.command = command
 
 
 class FileBase(Base):
 
+    def _clean_target(self, dst, archive):
+        """Empty dst, leaving archive in place if it lives inside of it."""
+        if os.path.dirname(os.path.abspath(archive)) != os.path.abspath(dst):
+            shutil.rmtree(dst)
+            os.makedirs(dst)
+            return
+
+        archive_name = os.path.basename(archive)
+        for entry in os.scandir(dst):
+            if entry.name == archive_name:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
     def pull(self):
         if common.isurl(self.source):
             self.download()
         else:
             shutil.copy2(self.source, self.source_dir)
+            if self.source_checksum:
+                self._verify_checksum(os.path.join(
+                    self.source_dir, os.path.basename(self.source)))
 
         self.provision(self.source_dir)
 
     def download(self):
-        request = requests.get(self.source, stream=True, allow_redirects=True)
-        request.raise_for_status()
-
         self.file = os.path.join(
             self.source_dir, os.path.basename(self.source))
+        file_cache = cache.FileCache()
+
+        cached_file = None
+        if self.source_checksum:
+            algorithm, digest = split_checksum(self.source_checksum)
+            cached_file = file_cache.get(algorithm=algorithm, hash=digest)
+        if not cached_file:
+            cached_file = self._fetch(file_cache)
+
+        if os.path.abspath(cached_file) != os.path.abspath(self.file):
+            if os.path.lexists(self.file):
+                os.remove(self.file)
+            file_utils.link_or_copy(cached_file, self.file)
+        file_cache.prune()
+
+    def _fetch(self, file_cache):
+        """Download source into the file cache, revalidating if known.
+
+        :returns: the path to the downloaded file.
+        """
+        headers = {}
+        url_info = file_cache.get_url(self.source)
+        if url_info:
+            if 'etag' in url_info:
+                headers['If-None-Match'] = url_info['etag']
+            if 'last-modified' in url_info:
+                headers['If-Modified-Since'] = url_info['last-modified']
+
+        request = requests.get(self.source, stream=True, allow_redirects=True,
+                               headers=headers)
+        request.raise_for_status()
+
+        if request.status_code == requests.codes.not_modified:
+            cached_file = file_cache.get(
+                algorithm=url_info['algorithm'], hash=url_info['hash'])
+            if self.source_checksum:
+                self._verify_checksum(cached_file)
+            return cached_file
+
+        # self.file may be a hard link into the cache from a previous pull.
+        if os.path.lexists(self.file):
+            os.remove(self.file)
         download_requests_stream(request, self.file)
+        digests = self._verify_checksum(self.file)
+        for algorithm, digest in digests.items():
+            file_cache.cache(
+                filename=self.file, algorithm=algorithm, hash=digest)
+        file_cache.set_url(
+            self.source, algorithm=cache.DEFAULT_ALGORITHM,
+            hash=digests[cache.DEFAULT_ALGORITHM],
+            etag=request.headers.get('ETag'),
+            last_modified=request.headers.get('Last-Modified'))
+        return self.file
+
+    def _verify_checksum(self, filename):
+        """Verify filename against source-checksum, if set.
+
+        :returns: a dictionary of algorithm to digest for filename.
+        """
+        algorithms = [cache.DEFAULT_ALGORITHM]
+        expected = None
+        if self.source_checksum:
+            algorithm, expected = split_checksum(self.source_checksum)
+            if algorithm not in algorithms:
+                algorithms.append(algorithm)
+
+        digests = calculate_digests(filename, algorithms)
+        if expected and digests[algorithms[-1]] != expected:
+            raise errors.DigestMismatchError(
+                source=self.source, algorithm=algorithms[-1],
+                expected=expected, calculated=digests[algorithms[-1]])
+        return digests
 
 
 class Script(FileBase):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth)
+                         source_branch, source_depth,
+                         source_checksum=source_checksum)
 
     def download(self):
         super().download()
         st = os.stat(self.file)
+        if st.st_nlink > 1:
+            # self.file is a hard link into the file cache, break it so the
+            # mode change does not leak into the cached file.
+            partial_file = '{}.{}.partial'.format(self.file, os.getpid())
+            shutil.copy2(self.file, partial_file)
+            os.replace(partial_file, self.file)
         os.chmod(self.file, st.st_mode | stat.S_IEXEC)
 
 
 class Bazaar(Base):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth, 'bzr')
+                         source_branch, source_depth, 'bzr',
+                         source_checksum=source_checksum)
+        if source_checksum:
+            raise IncompatibleOptionsError(
+                'can\'t specify a source-checksum for a bzr source')
         if source_branch:
             raise IncompatibleOptionsError(
                 'can\'t specify a source-branch for a bzr source')
@@ -198,9 +335,14 @@ class Bazaar(Base):
 class Git(Base):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth, 'git')
+                         source_branch, source_depth, 'git',
+                         source_checksum=source_checksum)
+        if source_checksum:
+            raise IncompatibleOptionsError(
+                'can\'t specify a source-checksum for a git source')
         if source_tag and source_branch:
             raise IncompatibleOptionsError(
                 'can\'t specify both source-tag and source-branch for '
@@ -233,25 +375,117 @@ class Git(Base):
             subprocess.check_call([self.command, '-C', self.source_dir,
                                    'submodule', 'update'])
         else:
-            command = [self.command, 'clone', '--recursive']
-            if self.source_tag or self.source_branch:
-                command.extend([
-                    '--branch', self.source_tag or self.source_branch])
-            if self.source_depth:
-                command.extend(['--depth', str(self.source_depth)])
-            subprocess.check_call(command + [self.source, self.source_dir])
+            self._clone()
 
-            if self.source_commit:
-                subprocess.check_call([self.command, '-C', self.source_dir,
-                                       'checkout', self.source_commit])
+    def _clone(self):
+        # Local repositories are as cheap to clone from as a mirror.
+        if os.path.isdir(self.source):
+            mirror = None
+        else:
+            mirror = self._update_mirror()
+
+        command = [self.command, 'clone']
+        if not mirror:
+            command.append('--recursive')
+        if self.source_tag or self.source_branch:
+            command.extend([
+                '--branch', self.source_tag or self.source_branch])
+        if self.source_depth:
+            command.extend(['--depth', str(self.source_depth)])
+        if not mirror:
+            origin = self.source
+        elif self.source_depth:
+            # --depth is ignored for local paths, only file:// urls honour it.
+            origin = 'file://' + mirror
+        else:
+            # Cloning from a local path hard links the mirror's objects.
+            origin = mirror
+        subprocess.check_call(command + [origin, self.source_dir])
+
+        git_dir = [self.command, '-C', self.source_dir]
+        if mirror:
+            subprocess.check_call(
+                git_dir + ['remote', 'set-url', 'origin', self.source])
+        if self.source_commit:
+            subprocess.check_call(git_dir + ['checkout', self.source_commit])
+        if mirror:
+            # Submodules are resolved against the real origin now, and
+            # fetched in parallel (a value of 0 lets git pick the number of
+            # jobs; older versions of git ignore it).
+            subprocess.check_call(
+                git_dir + ['-c', 'submodule.fetchJobs=0', 'submodule',
+                           'update', '--init', '--recursive'])
+
+    def _update_mirror(self):
+        """Create or incrementally fetch the shared mirror for source.
+
+        :returns: the path to the mirror.
+        """
+        mirror = cache.GitCache().mirror_path(self.source)
+        git_mirror = [self.command, '-C', mirror]
+
+        if not os.path.exists(mirror):
+            self._create_mirror(mirror)
+            return mirror
+        elif self._mirror_contains_pinned_ref(mirror):
+            # A tag or commit already in the mirror does not need a fetch.
+            return mirror
+
+        subprocess.check_call(git_mirror + ['fetch', '--prune', 'origin'])
+        # Follow the remote if its default branch changed since the mirror
+        # was created.
+        remote_head = subprocess.check_output(
+            git_mirror + ['ls-remote', '--symref', 'origin', 'HEAD']).decode()
+        for line in remote_head.splitlines():
+            if line.startswith('ref: '):
+                ref = line[len('ref: '):].split('\t')[0]
+                subprocess.check_call(
+                    git_mirror + ['symbolic-ref', 'HEAD', ref])
+                break
+        return mirror
+
+    def _create_mirror(self, mirror):
+        # Clone next to the final location and move it into place, so an
+        # interrupted clone never leaves a mirror behind.
+        mirror_dir = os.path.dirname(mirror)
+        os.makedirs(mirror_dir, exist_ok=True)
+        partial_mirror = tempfile.mkdtemp(prefix='.partial-', dir=mirror_dir)
+        try:
+            subprocess.check_call([self.command, 'clone', '--mirror',
+                                   '--quiet', self.source, partial_mirror])
+            os.rename(partial_mirror, mirror)
+        except OSError:
+            # Another pull created the mirror first.
+            if not os.path.isdir(mirror):
+                raise
+        finally:
+            shutil.rmtree(partial_mirror, ignore_errors=True)
+
+    def _mirror_contains_pinned_ref(self, mirror):
+        if self.source_tag:
+            ref = 'refs/tags/' + self.source_tag
+        elif self.source_commit:
+            ref = self.source_commit
+        else:
+            return False
+
+        return subprocess.call(
+            [self.command, '-C', mirror, 'cat-file', '-e',
+             ref + '^{commit}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
 
 
 class Mercurial(Base):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth, 'hg')
+                         source_branch, source_depth, 'hg',
+                         source_checksum=source_checksum)
+        if source_checksum:
+            raise IncompatibleOptionsError(
+                'can\'t specify a source-checksum for a mercurial source')
         if source_tag and source_branch:
             raise IncompatibleOptionsError(
                 'can\'t specify both source-tag and source-branch for a '
@@ -292,9 +526,14 @@ class Mercurial(Base):
 class Subversion(Base):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth, 'svn')
+                         source_branch, source_depth, 'svn',
+                         source_checksum=source_checksum)
+        if source_checksum:
+            raise IncompatibleOptionsError(
+                'can\'t specify a source-checksum for a Subversion source')
         if source_tag:
             if source_branch:
                 raise IncompatibleOptionsError(
@@ -334,9 +573,11 @@ class Subversion(Base):
 class Tar(FileBase):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth)
+                         source_branch, source_depth,
+                         source_checksum=source_checksum)
         if source_tag:
             raise IncompatibleOptionsError(
                 'can\'t specify a source-tag for a tar source')
@@ -355,11 +596,7 @@ class Tar(FileBase):
         tarball = os.path.join(self.source_dir, os.path.basename(self.source))
 
         if clean_target:
-            tmp_tarball = tempfile.NamedTemporaryFile().name
-            shutil.move(tarball, tmp_tarball)
-            shutil.rmtree(dst)
-            os.makedirs(dst)
-            shutil.move(tmp_tarball, tarball)
+            self._clean_target(dst, tarball)
 
         self._extract(tarball, dst)
 
@@ -367,54 +604,192 @@ class Tar(FileBase):
             os.remove(tarball)
 
     def _extract(self, tarball, dst):
-        with tarfile.open(tarball) as tar:
-            def filter_members(tar):
-                """Filters members and member names:
-                    - strips common prefix
-                    - bans dangerous names"""
-                members = tar.getmembers()
-                common = os.path.commonprefix([m.name for m in members])
-
-                # commonprefix() works a character at a time and will
-                # consider "d/ab" and "d/abc" to have common prefix "d/ab";
-                # check all members either start with common dir
-                for m in members:
-                    if not (m.name.startswith(common + '/') or
-                            m.isdir() and m.name == common):
-                        # commonprefix() didn't return a dir name; go up one
-                        # level
-                        common = os.path.dirname(common)
-                        break
-
-                for m in members:
-                    if m.name == common:
-                        continue
-                    self._strip_prefix(common, m)
-                    # We mask all files to be writable to be able to easily
-                    # extract on top.
-                    m.mode = m.mode | 0o200
-                    yield m
-
-            tar.extractall(members=filter_members(tar), path=dst)
-
-    def _strip_prefix(self, common, member):
-        if member.name.startswith(common + '/'):
-            member.name = member.name[len(common + '/'):]
+        """Extract tarball into dst in a single streaming pass.
+
+        The leading directory to strip is guessed from the first member and
+        narrowed down whenever a member does not share it, moving what was
+        already extracted down to match. Members are extracted to a staging
+        directory in dst, moved into place once the whole archive is read.
+        """
+        os.makedirs(dst, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.snapcraft-extract-', dir=dst)
+        try:
+            prefix, hardlinks, readonly = self._extract_to_staging(
+                tarball, staging)
+            # We mask all files to be writable to be able to easily
+            # extract on top.
+            for pathname in readonly:
+                path = os.path.join(
+                    staging, self._strip_prefix(prefix, pathname))
+                os.chmod(path, os.stat(path).st_mode | 0o200)
+            _merge_tree(staging, dst)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        # libarchive resolves hardlink targets relative to the current
+        # working directory, they are linked here once all the regular
+        # files are in place.
+        for linkpath, pathname in hardlinks:
+            path = os.path.join(dst, self._strip_prefix(prefix, pathname))
+            if os.path.lexists(path):
+                os.remove(path)
+            os.link(os.path.join(dst, self._strip_prefix(prefix, linkpath)),
+                    path)
+
+    def _extract_to_staging(self, tarball, staging):
+        prefix = None
+        hardlinks = []
+        readonly = []
+
+        def filter_entries(tar):
+            """Filters entries and entry names:
+                - strips common prefix
+                - bans dangerous names"""
+            nonlocal prefix
+            for entry in tar:
+                new_prefix = _narrow_prefix(prefix, entry)
+                if prefix is not None and new_prefix != prefix:
+                    _push_down(staging, prefix[len(new_prefix):])
+                prefix = new_prefix
+
+                name = self._strip_prefix('/'.join(prefix), entry.pathname)
+                if not name:
+                    continue
+                if entry.islnk:
+                    hardlinks.append((entry.linkpath, entry.pathname))
+                    continue
+                if not entry.issym and not entry.mode & 0o200:
+                    readonly.append(entry.pathname)
+                entry.pathname = os.path.join(staging, name)
+                yield entry
+
+        import libarchive.extract
+
+        with _open_tarball(tarball) as tar:
+            libarchive.extract.extract_entries(
+                filter_entries(tar),
+                flags=(libarchive.extract.EXTRACT_TIME |
+                       libarchive.extract.EXTRACT_PERM))
+
+        return '/'.join(prefix or []), hardlinks, readonly
+
+    def _strip_prefix(self, common, name):
+        name = name.rstrip('/')
+        if name == common:
+            return ''
+        if common and name.startswith(common + '/'):
+            name = name[len(common + '/'):]
         # strip leading '/', './' or '../' as many times as needed
-        member.name = re.sub(r'^(\.{0,2}/)*', r'', member.name)
-        # do the same for linkname if this is a hardlink
-        if member.islnk() and not member.issym():
-            if member.linkname.startswith(common + '/'):
-                member.linkname = member.linkname[len(common + '/'):]
-            member.linkname = re.sub(r'^(\.{0,2}/)*', r'', member.linkname)
+        return re.sub(r'^(\.{0,2}/)*', r'', name)
+
+
+def _narrow_prefix(prefix, entry):
+    """Return the leading directories of prefix entry is found in."""
+    components = entry.pathname.rstrip('/').split('/')
+    if not entry.isdir:
+        components = components[:-1]
+    if prefix is None:
+        return components
+    for index, (a, b) in enumerate(zip(prefix, components)):
+        if a != b:
+            return prefix[:index]
+    return prefix[:len(components)]
+
+
+def _push_down(directory, components):
+    """Move everything in directory down into directory/components."""
+    tmp_dir = tempfile.mkdtemp(dir=directory)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if path != tmp_dir:
+            os.rename(path, os.path.join(tmp_dir, name))
+    target = os.path.join(directory, *components)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.rename(tmp_dir, target)
+
+
+def _merge_tree(src, dst):
+    """Move the contents of src into dst, merging directories."""
+    for name in os.listdir(src):
+        src_path = os.path.join(src, name)
+        dst_path = os.path.join(dst, name)
+        if (os.path.isdir(dst_path) and not os.path.islink(dst_path) and
+                os.path.isdir(src_path) and not os.path.islink(src_path)):
+            _merge_tree(src_path, dst_path)
+            continue
+        if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+            shutil.rmtree(dst_path)
+        os.replace(src_path, dst_path)
+
+
+# Archives larger than this many bytes are worth handing to a parallel
+# decompressor, when one is installed.
+_PARALLEL_DECOMPRESS_THRESHOLD = 64 * 1024 * 1024
+
+# Read tarballs in large blocks, the default libarchive block size of a
+# page results in a syscall per 4 KiB of (compressed) data.
+_TAR_BLOCK_SIZE = 1024 * 1024
+
+_parallel_decompressors = {
+    '.gz': 'pigz',
+    '.tgz': 'pigz',
+    '.xz': 'pixz',
+}
+
+
+def _get_parallel_decompressor(tarball):
+    if os.path.getsize(tarball) < _PARALLEL_DECOMPRESS_THRESHOLD:
+        return None
+    ext = os.path.splitext(tarball)[1]
+    decompressor = _parallel_decompressors.get(ext)
+    if decompressor and shutil.which(decompressor):
+        return [decompressor, '-d']
+    return None
+
+
+@contextlib.contextmanager
+def _open_tarball(tarball):
+    """Open tarball for streaming with libarchive.
+
+    If the tarball is compressed with a format for which a parallel
+    decompressor (pigz or pixz) is available, decompression is delegated
+    to it and libarchive reads the decompressed stream from a pipe.
+    """
+    # libarchive logs warnings about the library it finds when it is first
+    # imported, it is only loaded once an archive is actually read.
+    import libarchive
+
+    decompressor = _get_parallel_decompressor(tarball)
+    if not decompressor:
+        with libarchive.file_reader(
+                tarball, block_size=_TAR_BLOCK_SIZE) as tar:
+            yield tar
+        return
+
+    with open(tarball, 'rb') as compressed:
+        proc = subprocess.Popen(
+            decompressor, stdin=compressed, stdout=subprocess.PIPE)
+        try:
+            with libarchive.fd_reader(
+                    proc.stdout.fileno(), block_size=_TAR_BLOCK_SIZE) as tar:
+                yield tar
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+    # A non zero exit code after we closed the pipe early is expected,
+    # only raise when the whole stream was meant to be consumed.
+    if returncode not in (0, -signal.SIGPIPE):
+        raise subprocess.CalledProcessError(returncode, decompressor)
 
 
 class Zip(FileBase):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth)
+                         source_branch, source_depth,
+                         source_checksum=source_checksum)
         if source_tag:
             raise IncompatibleOptionsError(
                 'can\'t specify a source-tag for a zip source')
@@ -429,11 +804,7 @@ class Zip(FileBase):
         zip = os.path.join(self.source_dir, os.path.basename(self.source))
 
         if clean_target:
-            tmp_zip = tempfile.NamedTemporaryFile().name
-            shutil.move(zip, tmp_zip)
-            shutil.rmtree(dst)
-            os.makedirs(dst)
-            shutil.move(tmp_zip, zip)
+            self._clean_target(dst, zip)
 
         zipfile.ZipFile(zip).extractall(path=dst)
 
@@ -444,9 +815,11 @@ class Zip(FileBase):
 class Deb(FileBase):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth)
+                         source_branch, source_depth,
+                         source_checksum=source_checksum)
         if source_tag:
             raise IncompatibleOptionsError(
                 'can\'t specify a source-tag for a deb source')
@@ -461,11 +834,7 @@ class Deb(FileBase):
         deb_file = os.path.join(self.source_dir, os.path.basename(self.source))
 
         if clean_target:
-            tmp_deb = tempfile.NamedTemporaryFile().name
-            shutil.move(deb_file, tmp_deb)
-            shutil.rmtree(dst)
-            os.makedirs(dst)
-            shutil.move(tmp_deb, deb_file)
+            self._clean_target(dst, deb_file)
 
         deb = apt_inst.DebFile(deb_file)
         deb.data.extractall(dst)
@@ -477,9 +846,11 @@ class Deb(FileBase):
 class Rpm(FileBase):
 
     def __init__(self, source, source_dir, source_tag=None, source_commit=None,
-                 source_branch=None, source_depth=None):
+                 source_branch=None, source_depth=None,
+                 source_checksum=None):
         super().__init__(source, source_dir, source_tag, source_commit,
-                         source_branch, source_depth)
+                         source_branch, source_depth,
+                         source_checksum=source_checksum)
         if source_tag:
             raise IncompatibleOptionsError(
                 'can\'t specify a source-tag for a rpm source')
@@ -494,14 +865,13 @@ class Rpm(FileBase):
         rpm_file = os.path.join(self.source_dir, os.path.basename(self.source))
 
         if clean_target:
-            tmp_rpm = tempfile.NamedTemporaryFile().name
-            shutil.move(rpm_file, tmp_rpm)
-            shutil.rmtree(dst)
-            os.makedirs(dst)
-            shutil.move(tmp_rpm, rpm_file)
+            self._clean_target(dst, rpm_file)
 
         # Ensure dst does not have trailing slash
         dst = dst.rstrip('/')
+        import libarchive
+        import libarchive.extract
+
         # Open the RPM file and extract it to destination
         with libarchive.file_reader(rpm_file) as rpm:
             for rpm_file_entry in rpm:
@@ -519,33 +889,148 @@ class Rpm(FileBase):
 
 
 class Local(Base):
+    """Mirror a local directory into source_dir.
 
-    def pull(self):
-        if os.path.islink(self.source_dir) or os.path.isfile(self.source_dir):
-            os.remove(self.source_dir)
-        elif os.path.isdir(self.source_dir):
-            shutil.rmtree(self.source_dir)
+    Files are hard linked (or copied if that is not possible) and a
+    manifest of what was linked is kept next to source_dir, so that
+    subsequent pulls only relink the entries that changed and remove the
+    ones that went away. Patterns listed in a .snapcraftignore file at the
+    root of the source, one per line, are neither walked nor linked.
+    """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        source_dir = os.path.normpath(self.source_dir)
+        self._manifest_path = os.path.join(
+            os.path.dirname(source_dir),
+            '.{}.manifest.json'.format(os.path.basename(source_dir)))
+
+    def pull(self):
         source_abspath = os.path.abspath(self.source)
 
-        def ignore(directory, files):
-            if directory is source_abspath:
-                ignored = copy.copy(common.SNAPCRAFT_FILES)
-                relative_cwd = os.path.basename(os.getcwd())
-                if os.path.join(directory, relative_cwd) == os.getcwd():
-                    # Source is a parent of the working directory.
-                    # Do not recursively copy it into itself.
-                    ignored.append(relative_cwd)
-                snaps = glob.glob(os.path.join(directory, '*.snap'))
-                if snaps:
-                    snaps = [os.path.basename(s) for s in snaps]
-                    ignored += snaps
-                return ignored
-            else:
-                return []
+        if os.path.islink(self.source_dir) or os.path.isfile(self.source_dir):
+            os.remove(self.source_dir)
 
-        shutil.copytree(source_abspath, self.source_dir,
-                        copy_function=file_utils.link_or_copy, ignore=ignore)
+        manifest = self._load_manifest(source_abspath)
+        if manifest is None and os.path.isdir(self.source_dir):
+            # Without a manifest we cannot tell what is stale.
+            shutil.rmtree(self.source_dir)
+        os.makedirs(self.source_dir, exist_ok=True)
+
+        entries = {}
+        self._sync_dir(source_abspath, '', self._get_ignore(source_abspath),
+                       manifest or {}, entries)
+
+        # Remove what is no longer in the source, deepest entries first.
+        for path in sorted(set(manifest or {}) - set(entries), reverse=True):
+            destination = os.path.join(self.source_dir, path)
+            if os.path.isdir(destination) and \
+                    not os.path.islink(destination):
+                shutil.rmtree(destination)
+            elif os.path.lexists(destination):
+                os.remove(destination)
+
+        self._save_manifest(source_abspath, entries)
+
+    def _get_ignore(self, source_abspath):
+        """Return a function telling if a relative path is to be ignored."""
+        excluded = set(common.SNAPCRAFT_FILES)
+        relative_cwd = os.path.basename(os.getcwd())
+        if os.path.join(source_abspath, relative_cwd) == os.getcwd():
+            # Source is a parent of the working directory.
+            # Do not recursively copy it into itself.
+            excluded.add(relative_cwd)
+        # Neither source_dir nor its manifest should be mirrored into
+        # source_dir if they live inside of the source.
+        for path in (self.source_dir, self._manifest_path):
+            path = os.path.relpath(os.path.abspath(path), source_abspath)
+            if not path.startswith('..'):
+                excluded.add(path)
+
+        patterns = _read_ignore_patterns(source_abspath)
+
+        def ignore(path, is_dir):
+            if path in excluded:
+                return True
+            if '/' not in path and fnmatch.fnmatch(path, '*.snap'):
+                return True
+            return any(_matches_ignore_pattern(path, is_dir, pattern)
+                       for pattern in patterns)
+
+        return ignore
+
+    def _sync_dir(self, source_abspath, path, ignore, manifest, entries):
+        for entry in os.scandir(os.path.join(source_abspath, path)):
+            entry_path = os.path.join(path, entry.name)
+            # Like copytree, symlinks to directories are followed.
+            is_dir = entry.is_dir()
+            if ignore(entry_path, is_dir):
+                continue
+
+            destination = os.path.join(self.source_dir, entry_path)
+            if is_dir:
+                if os.path.islink(destination) or \
+                        os.path.isfile(destination):
+                    os.remove(destination)
+                os.makedirs(destination, exist_ok=True)
+                entries[entry_path] = None
+                self._sync_dir(
+                    source_abspath, entry_path, ignore, manifest, entries)
+                continue
+
+            st = entry.stat(follow_symlinks=False)
+            key = [st.st_size, st.st_mtime_ns, st.st_ino]
+            entries[entry_path] = key
+            if manifest.get(entry_path) == key and \
+                    os.path.lexists(destination):
+                continue
+
+            if os.path.isdir(destination) and \
+                    not os.path.islink(destination):
+                shutil.rmtree(destination)
+            elif os.path.lexists(destination):
+                os.remove(destination)
+            file_utils.link_or_copy(entry.path, destination)
+
+    def _load_manifest(self, source_abspath):
+        if not os.path.isdir(self.source_dir):
+            return None
+        try:
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('source') != source_abspath:
+            return None
+        return manifest.get('entries')
+
+    def _save_manifest(self, source_abspath, entries):
+        tmp_manifest_path = self._manifest_path + '.partial'
+        with open(tmp_manifest_path, 'w') as f:
+            json.dump({'source': source_abspath, 'entries': entries}, f)
+        os.replace(tmp_manifest_path, self._manifest_path)
+
+
+def _read_ignore_patterns(source_abspath):
+    patterns = []
+    with contextlib.suppress(FileNotFoundError):
+        with open(os.path.join(source_abspath, '.snapcraftignore')) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    patterns.append(line)
+    return patterns
+
+
+def _matches_ignore_pattern(path, is_dir, pattern):
+    if pattern.endswith('/'):
+        if not is_dir:
+            return False
+        pattern = pattern.rstrip('/')
+    if pattern.startswith('/'):
+        return fnmatch.fnmatch(path, pattern[1:])
+    return (fnmatch.fnmatch(os.path.basename(path), pattern) or
+            fnmatch.fnmatch(path, pattern))
 
 
 def get(sourcedir, builddir, options):
@@ -561,6 +1046,7 @@ def get(sourcedir, builddir, options):
         source_tag=getattr(options, 'source_tag', None),
         source_commit=getattr(options, 'source_commit', None),
         source_branch=getattr(options, 'source_branch', None),
+        source_checksum=getattr(options, 'source_checksum', None),
     )
 
     handler_class = get_source_handler(options.source, source_type=source_type)
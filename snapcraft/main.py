@@ -19,16 +19,16 @@
 snapcraft
 
 Usage:
-  snapcraft [options] [--enable-geoip --no-parallel-build]
+  snapcraft [options] [--enable-geoip --no-parallel-build --enable-ccache]
   snapcraft [options] init
   snapcraft [options] pull [<part> ...]  [--enable-geoip]
-  snapcraft [options] build [<part> ...] [--no-parallel-build]
+  snapcraft [options] build [<part> ...] [--no-parallel-build --enable-ccache]
   snapcraft [options] stage [<part> ...]
   snapcraft [options] prime [<part> ...]
   snapcraft [options] strip [<part> ...]
   snapcraft [options] clean [<part> ...] [--step <step>]
   snapcraft [options] snap [<directory> --output <snap-file>]
-  snapcraft [options] cleanbuild
+  snapcraft [options] cleanbuild [--incremental]
   snapcraft [options] login
   snapcraft [options] logout
   snapcraft [options] list-keys
@@ -74,6 +74,9 @@ Options specific to building:
   --no-parallel-build                   use only a single build job per part
                                         (the default number of jobs per part is
                                         equal to the number of CPUs)
+  --enable-ccache                       cache compiler output with ccache,
+                                        shared across builds for the same
+                                        target architecture.
 
 Options specific to cleaning:
   -s <step>, --step <step>              only clean the specified step and those
@@ -84,6 +87,12 @@ Options specific to snapping:
   -o <snap-file>, --output <snap-file>  used in case you want to rename the
                                         snap.
 
+Options specific to cleanbuild:
+  --incremental          reuse a prepared lxd base container with snapcraft
+                         installed and keep the project, along with its
+                         parts, in an lxd storage volume across cleanbuilds.
+                         The volume is deleted by `snapcraft clean`.
+
 Options specific to store interaction:
   --release <channels>  Comma separated list of channels to release to.
   --series <series>     Snap series [default: {DEFAULT_SERIES}].
@@ -149,12 +158,12 @@ from docopt import docopt
 
 import snapcraft
 from snapcraft.integrations import enable_ci
-from snapcraft.internal import lifecycle, log, parts
+from snapcraft.internal import log
 from snapcraft.internal.common import (
+    DEFAULT_SERIES,
     format_output_in_columns,
     get_terminal_width,
     get_tourdir)
-from snapcraft.storeapi.constants import DEFAULT_SERIES
 
 
 logger = logging.getLogger(__name__)
@@ -206,6 +215,7 @@ def _get_project_options(args):
     options['parallel_builds'] = not args['--no-parallel-build']
     options['target_deb_arch'] = args['--target-arch']
     options['debug'] = args['--debug']
+    options['use_ccache'] = args['--enable-ccache']
 
     return snapcraft.ProjectOptions(**options)
 
@@ -244,10 +254,12 @@ def _get_lifecycle_command(args):
 
 
 def _get_command_from_arg(args):
+    # Commands are only looked up once picked, looking them up imports
+    # the modules they live in.
     functions = {
-        'init': lifecycle.init,
-        'login': snapcraft.login,
-        'logout': snapcraft.logout,
+        'init': lambda: _lifecycle().init(),
+        'login': lambda: snapcraft.login(),
+        'logout': lambda: snapcraft.logout(),
         'list-plugins': _list_plugins,
     }
     function = [k for k in functions if args[k]]
@@ -260,14 +272,14 @@ def run(args, project_options):  # noqa
     lifecycle_command = _get_lifecycle_command(args)
     argless_command = _get_command_from_arg(args)
     if lifecycle_command:
-        lifecycle.execute(
+        _lifecycle().execute(
             lifecycle_command, project_options, args['<part>'])
     elif argless_command:
         argless_command()
     elif args['clean']:
         _run_clean(args, project_options)
     elif args['cleanbuild']:
-        lifecycle.cleanbuild(project_options),
+        _lifecycle().cleanbuild(project_options, args['--incremental']),
     elif _is_store_command(args):
         _run_store_command(args)
     elif args['tour']:
@@ -278,13 +290,14 @@ def run(args, project_options):  # noqa
     elif args['enable-ci']:
         enable_ci(args['<ci-system>'])
     elif args['update']:
-        parts.update()
+        _parts().update()
     elif args['define']:
-        parts.define(args['<part-name>'])
+        _parts().define(args['<part-name>'])
     elif args['search']:
-        parts.search(' '.join(args['<query>']))
+        _parts().search(' '.join(args['<query>']))
     else:  # snap by default:
-        lifecycle.snap(project_options, args['<directory>'], args['--output'])
+        _lifecycle().snap(
+            project_options, args['<directory>'], args['--output'])
 
     return project_options
 
@@ -295,7 +308,19 @@ def _run_clean(args, project_options):
         logger.warning('DEPRECATED: Use `prime` instead of `strip` '
                        'as the step to clean')
         step = 'prime'
-    lifecycle.clean(project_options, args['<part>'], step)
+    _lifecycle().clean(project_options, args['<part>'], step)
+
+
+# lifecycle and parts pull in most of snapcraft, they are only imported
+# for the commands that need them.
+def _lifecycle():
+    from snapcraft.internal import lifecycle
+    return lifecycle
+
+
+def _parts():
+    from snapcraft.internal import parts
+    return parts
 
 
 def _is_store_command(args):
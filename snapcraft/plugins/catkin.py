@@ -34,14 +34,28 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - include-roscore:
       (boolean)
       Whether or not to include roscore with the part. Defaults to true.
+
+Catkin packages are built in dependency order, packages that do not depend
+on each other being built in parallel. Each package is built on its own and
+installed into a staging directory which is then merged into the install
+directory. Packages whose sources, and those of the packages they depend
+upon, are unchanged since the last build are not built again, what they
+installed is reused instead.
 """
 
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import json
 import os
 import tempfile
 import logging
 import shutil
+import shlex
 import re
 import subprocess
+from xml.etree import ElementTree
 
 import snapcraft
 from snapcraft import (
@@ -50,9 +64,18 @@ from snapcraft import (
     formatting_utils,
     repo,
 )
+from snapcraft.internal import cache
+from snapcraft.internal.common import assemble_env, render_env
 
 logger = logging.getLogger(__name__)
 
+# The environment a Catkin package build picks up on top of the cmake
+# arguments.
+_BUILD_ENV_VARIABLES = [
+    'CC', 'CXX', 'CFLAGS', 'CPPFLAGS', 'CXXFLAGS', 'LDFLAGS', 'PATH',
+    'LD_LIBRARY_PATH', 'PKG_CONFIG_PATH', 'PYTHONPATH', 'CMAKE_PREFIX_PATH',
+    'ROS_PACKAGE_PATH']
+
 # Map ROS releases to Ubuntu releases
 _ROS_RELEASE_MAP = {
     'indigo': 'trusty',
@@ -60,6 +83,12 @@ _ROS_RELEASE_MAP = {
     'kinetic': 'xenial'
 }
 
+# The package.xml tags that make a package come after the one it names in
+# the build order.
+_ORDERING_DEPENDENCY_TAGS = (
+    'depend', 'build_depend', 'buildtool_depend', 'build_export_depend',
+    'run_depend', 'exec_depend')
+
 
 class CatkinPlugin(snapcraft.BasePlugin):
 
@@ -123,6 +152,17 @@ deb http://${{security}}.ubuntu.com/${{suffix}} {0}-security main universe
         self.catkin_packages = set(options.catkin_packages)
         self._rosdep_path = os.path.join(self.partdir, 'rosdep')
 
+        # The build and devel spaces, and what each package installed, are
+        # kept across builds so that unchanged packages can be reused.
+        self._catkin_path = os.path.join(self.partdir, 'catkin')
+        self._catkin_source_spaces = os.path.join(self._catkin_path, 'src')
+        self._catkin_build_space = os.path.join(self._catkin_path, 'build')
+        self._catkin_devel_space = os.path.join(self._catkin_path, 'devel')
+        self._catkin_installed_path = os.path.join(
+            self._catkin_path, 'installed')
+        self._catkin_stamps_file = os.path.join(
+            self._catkin_path, 'packages.json')
+
         # The path created via the `source` key (or a combination of `source`
         # and `source-subdir` keys) needs to point to a valid Catkin workspace
         # containing another subdirectory called the "source space." By
@@ -279,9 +319,11 @@ deb http://${{security}}.ubuntu.com/${{suffix}} {0}-security main universe
         return os.path.join(self.installdir, 'opt', 'ros',
                             self.options.rosdistro)
 
-    def _run_in_bash(self, commandlist, cwd=None):
+    def _run_in_bash(self, commandlist, cwd=None, env=None):
         with tempfile.NamedTemporaryFile(mode='w') as f:
             f.write('set -ex\n')
+            for name, value in sorted((env or {}).items()):
+                f.write('export {}={}\n'.format(name, shlex.quote(value)))
             f.write('exec {}\n'.format(' '.join(commandlist)))
             f.flush()
 
@@ -367,22 +409,162 @@ deb http://${{security}}.ubuntu.com/${{suffix}} {0}-security main universe
         if not self.catkin_packages:
             return
 
+        workspace = _find_catkin_packages(
+            os.path.join(self.builddir, self.options.source_space))
+        dependencies = _get_local_dependencies(workspace, self.catkin_packages)
+
+        cmake_args = self._get_cmake_args()
+        build_key = self._get_build_key(cmake_args)
+        stamps = self._load_package_stamps()
+        package_hashes = {}
+        pending = {}
+        for package_name in _get_build_order(dependencies):
+            package_hash = _get_package_hash(
+                workspace.get(package_name), build_key,
+                [package_hashes[d] for d in sorted(
+                    dependencies[package_name])])
+            package_hashes[package_name] = package_hash
+            if (package_hash and stamps.get(package_name) == package_hash and
+                    self._restore_package_install(package_name)):
+                logger.info('Catkin package {!r} is unchanged since the last '
+                            'build, reusing it'.format(package_name))
+            else:
+                pending[package_name] = dependencies[package_name]
+                stamps.pop(package_name, None)
+
+        missing = sorted(set(pending) - set(workspace))
+        if missing:
+            raise RuntimeError(
+                'Unable to find Catkin packages in the source space: '
+                '{}'.format(formatting_utils.humanize_list(missing, 'and')))
+
+        for package_dependencies in pending.values():
+            package_dependencies &= set(pending)
+
+        def package_built(package_name):
+            # Packages depending on this one are only started once it is
+            # part of the install directory.
+            self._merge_package_install(package_name)
+            if package_hashes[package_name]:
+                stamps[package_name] = package_hashes[package_name]
+                self._save_package_stamps(stamps)
+
+        self._build_catkin_packages_in_parallel(
+            pending, workspace, cmake_args, package_built)
+
+    def _build_catkin_packages_in_parallel(self, pending, workspace,
+                                           cmake_args, package_built):
+        """Build each package as soon as everything it depends upon is.
+
+        :param dict pending: maps each package to be built to the set of
+                             packages it is still waiting on.
+        :param dict workspace: the Catkin packages, keyed by their name.
+        :param package_built: callable called with the name of each package
+                              once it is built.
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.parallel_build_count) as executor:
+            running = {}
+            while pending or running:
+                for package_name in sorted(pending):
+                    if not pending[package_name]:
+                        del pending[package_name]
+                        future = executor.submit(
+                            self._build_catkin_package,
+                            workspace[package_name], cmake_args)
+                        running[future] = package_name
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    package_name = running.pop(future)
+                    future.result()
+                    for package_dependencies in pending.values():
+                        package_dependencies.discard(package_name)
+                    package_built(package_name)
+
+    def _get_cmake_args(self):
+        # Make sure we're using the compilers included in this .snap
+        return [
+            '-DCMAKE_C_FLAGS="$CFLAGS"',
+            '-DCMAKE_CXX_FLAGS="$CPPFLAGS -I{} -I{}"'.format(
+                os.path.join(self.installdir, 'usr', 'include', 'c++',
+                             self.gcc_version),
+                os.path.join(self.installdir, 'usr', 'include',
+                             self.project.arch_triplet, 'c++',
+                             self.gcc_version)),
+            '-DCMAKE_LD_FLAGS="$LDFLAGS"',
+            '-DCMAKE_C_COMPILER={}'.format(
+                os.path.join(self.installdir, 'usr', 'bin', 'gcc')),
+            '-DCMAKE_CXX_COMPILER={}'.format(
+                os.path.join(self.installdir, 'usr', 'bin', 'g++'))
+        ]
+
+    def _get_build_key(self, cmake_args):
+        """Return a digest of what goes into building every package.
+
+        Besides the cmake arguments, this covers the environment they refer
+        to, the packages the part builds with and the debs unpacked into
+        the install directory before any Catkin package is built there.
+        """
+        env = render_env()
+        build_env = {
+            'cmake-args': cmake_args,
+            'build-packages': sorted(self.build_packages),
+            'stage-packages': sorted(self.stage_packages),
+        }
+        if env is None:
+            # The entries needing a shell are taken as they are.
+            env = os.environ
+            build_env['snapcraft-env'] = assemble_env()
+        build_env['env'] = {
+            name: env.get(name) for name in _BUILD_ENV_VARIABLES}
+        with contextlib.suppress(FileNotFoundError):
+            build_env['debs'] = sorted(os.listdir(
+                os.path.join(self.partdir, 'ubuntu', 'download')))
+        return hashlib.sha256(
+            json.dumps(build_env, sort_keys=True).encode()).hexdigest()
+
+    def _build_catkin_package(self, package, cmake_args):
+        # Every package gets a source space holding nothing but itself, and
+        # build and devel spaces of its own. It is installed into a staging
+        # directory, by means of DESTDIR, which is merged into the install
+        # directory once it is built. catkin writes workspace wide files to
+        # each of these, which packages built in parallel would otherwise
+        # race on.
+        source_space = os.path.join(self._catkin_source_spaces, package.name)
+        if os.path.lexists(source_space):
+            shutil.rmtree(source_space)
+        os.makedirs(source_space)
+        os.symlink(package.path, os.path.join(source_space, package.name))
+
+        installed_path = os.path.join(
+            self._catkin_installed_path, package.name)
+        if os.path.lexists(installed_path):
+            shutil.rmtree(installed_path)
+        os.makedirs(self._get_installed_root(package.name))
+
         catkincmd = ['catkin_make_isolated']
 
         # Install the package
         catkincmd.append('--install')
 
-        # Specify the packages to be built
-        catkincmd.append('--pkg')
-        catkincmd.extend(self.catkin_packages)
+        # Parallelism within the package
+        catkincmd.append('-j{}'.format(self.parallel_build_count))
 
         # Don't clutter the real ROS workspace-- use the Snapcraft build
         # directory
         catkincmd.extend(['--directory', self.builddir])
 
-        # Account for a non-default source space by always specifying it
-        catkincmd.extend(['--source-space', os.path.join(
-            self.builddir, self.options.source_space)])
+        catkincmd.extend(['--source-space', source_space])
+
+        # Keep the build and devel spaces out of the build directory, which
+        # is recreated on every build, so that make only rebuilds what
+        # changed.
+        catkincmd.extend(['--build-space', os.path.join(
+            self._catkin_build_space, package.name)])
+        catkincmd.extend(['--devel-space', os.path.join(
+            self._catkin_devel_space, package.name)])
 
         # Specify that the package should be installed along with the rest of
         # the ROS distro.
@@ -390,62 +572,169 @@ deb http://${{security}}.ubuntu.com/${{suffix}} {0}-security main universe
 
         # All the arguments that follow are meant for CMake
         catkincmd.append('--cmake-args')
-
-        # Make sure we're using the compilers included in this .snap
-        catkincmd.extend([
-            '-DCMAKE_C_FLAGS="$CFLAGS"',
-            '-DCMAKE_CXX_FLAGS="$CPPFLAGS -I{} -I{}"'.format(
-                os.path.join(self.installdir, 'usr', 'include', 'c++',
-                             self.gcc_version),
-                os.path.join(self.installdir, 'usr', 'include',
-                             self.project.arch_triplet, 'c++',
-                             self.gcc_version)),
-            '-DCMAKE_LD_FLAGS="$LDFLAGS"',
-            '-DCMAKE_C_COMPILER={}'.format(
-                os.path.join(self.installdir, 'usr', 'bin', 'gcc')),
-            '-DCMAKE_CXX_COMPILER={}'.format(
-                os.path.join(self.installdir, 'usr', 'bin', 'g++'))
-        ])
+        catkincmd.extend(cmake_args)
 
         # This command must run in bash due to a bug in Catkin that causes it
         # to explode if there are spaces in the cmake args (which there are).
         # This has been fixed in Catkin Tools... perhaps we should be using
         # that instead.
-        self._run_in_bash(catkincmd)
+        self._run_in_bash(catkincmd, env={'DESTDIR': installed_path})
+
+    def _load_package_stamps(self):
+        try:
+            with open(self._catkin_stamps_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_package_stamps(self, stamps):
+        os.makedirs(self._catkin_path, exist_ok=True)
+        with open(self._catkin_stamps_file, 'w') as f:
+            json.dump(stamps, f, indent=2, sort_keys=True)
+
+    def _get_installed_root(self, package_name):
+        """Return where package_name installed to within its staging."""
+        return os.path.join(self._catkin_installed_path, package_name,
+                            os.path.abspath(self.installdir).lstrip(os.sep))
+
+    def _merge_package_install(self, package_name):
+        """Copy what package_name installed into the install directory.
+
+        Files are copied rather than linked, as some are rewritten in place
+        once all packages are built.
+        """
+        file_utils.link_or_copy_tree(
+            self._get_installed_root(package_name), self.installdir,
+            copy_function=_replace_with_copy)
+
+    def _restore_package_install(self, package_name):
+        if not os.path.isdir(self._get_installed_root(package_name)):
+            return False
+
+        self._merge_package_install(package_name)
+        return True
+
+
+def _replace_with_copy(source, destination):
+    # Other packages may be building against destination, so it is
+    # replaced in one go.
+    partial_destination = '{}.{}.partial'.format(destination, os.getpid())
+    shutil.copy2(source, partial_destination, follow_symlinks=False)
+    os.replace(partial_destination, destination)
+
+
+_CatkinPackage = collections.namedtuple(
+    '_CatkinPackage', ['name', 'path', 'dependencies'])
+
+
+def _find_catkin_packages(source_space):
+    """Return the Catkin packages in source_space, keyed by their name."""
+    packages = {}
+    for root, directories, files in os.walk(source_space):
+        if 'CATKIN_IGNORE' in files:
+            directories[:] = []
+        elif 'package.xml' in files:
+            # Packages don't nest.
+            directories[:] = []
+            manifest = ElementTree.parse(os.path.join(root, 'package.xml'))
+            name = manifest.findtext('name', '').strip()
+            dependencies = set()
+            for tag in _ORDERING_DEPENDENCY_TAGS:
+                dependencies.update(element.text.strip()
+                                    for element in manifest.iter(tag)
+                                    if element.text)
+            packages[name] = _CatkinPackage(name, root, dependencies)
+        else:
+            directories.sort()
+    return packages
+
+
+def _get_local_dependencies(workspace, package_names):
+    """Return what each package depends upon among package_names."""
+    dependencies = {}
+    for package_name in package_names:
+        package = workspace.get(package_name)
+        if package:
+            dependencies[package_name] = (
+                set(package.dependencies) & set(package_names))
+        else:
+            dependencies[package_name] = set()
+    return dependencies
+
+
+def _get_build_order(dependencies):
+    """Return the packages in an order where dependencies come first."""
+    order = []
+    remaining = {name: set(package_dependencies)
+                 for name, package_dependencies in dependencies.items()}
+    while remaining:
+        ready = sorted(name for name, package_dependencies in
+                       remaining.items() if not package_dependencies)
+        if not ready:
+            raise RuntimeError(
+                'Circular dependency between Catkin packages: {}'.format(
+                    formatting_utils.humanize_list(remaining.keys(), 'and')))
+        for name in ready:
+            del remaining[name]
+        for package_dependencies in remaining.values():
+            package_dependencies.difference_update(ready)
+        order.extend(ready)
+    return order
+
+
+def _get_package_hash(package, build_key, dependency_hashes):
+    """Return a digest of what goes into building package.
+
+    This is None if it cannot be known, as happens for packages missing
+    from the workspace or depending on one that is.
+    """
+    if not package or None in dependency_hashes:
+        return None
+
+    digest = hashlib.sha256()
+    for argument in [build_key] + dependency_hashes:
+        digest.update(argument.encode() + b'\0')
+    for root, directories, files in os.walk(package.path):
+        directories.sort()
+        for file_name in sorted(files + [d for d in directories
+                                         if os.path.islink(
+                                             os.path.join(root, d))]):
+            path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(path, package.path).encode() +
+                          b'\0')
+            if os.path.islink(path):
+                digest.update(os.readlink(path).encode())
+            else:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(2**20), b''):
+                        digest.update(chunk)
+    return digest.hexdigest()
 
 
 def _find_system_dependencies(catkin_packages, rosdep):
     """Find system dependencies for a given set of Catkin packages."""
 
-    system_dependencies = {}
-
     logger.info('Determining system dependencies for Catkin packages...')
-    for package in catkin_packages:
-        # Query rosdep for the list of dependencies for this package
-        dependencies = rosdep.get_dependencies(package)
-
-        for dependency in dependencies:
-            # No need to resolve this dependency if we know it's local, or if
-            # we've already resolved it into a system dependency
-            if (dependency in catkin_packages or
-                    dependency in system_dependencies):
-                continue
-
-            # In this situation, the package depends on something that we
-            # weren't instructed to build. It's probably a system dependency,
-            # but the developer could have also forgotten to tell us to build
-            # it.
-            try:
-                these_dependencies = rosdep.resolve_dependency(dependency)
-            except SystemDependencyNotFound:
-                raise RuntimeError(
-                    "Package {!r} isn't a valid system dependency. "
-                    "Did you forget to add it to catkin-packages? If "
-                    "not, add the Ubuntu package containing it to "
-                    "stage-packages until you can get it into the "
-                    "rosdep database.".format(dependency))
 
-            system_dependencies[dependency] = these_dependencies
+    # Query rosdep for the dependencies of all the packages at once. No need
+    # to resolve the ones we know are local.
+    dependencies = set(rosdep.get_dependencies(catkin_packages))
+    dependencies -= set(catkin_packages)
+    if not dependencies:
+        return set()
+
+    # In case a package depends on something that we weren't instructed to
+    # build it's probably a system dependency, but the developer could have
+    # also forgotten to tell us to build it.
+    try:
+        system_dependencies = rosdep.resolve_dependencies(dependencies)
+    except SystemDependencyNotFound as e:
+        raise RuntimeError(
+            "Package {!r} isn't a valid system dependency. "
+            "Did you forget to add it to catkin-packages? If "
+            "not, add the Ubuntu package containing it to "
+            "stage-packages until you can get it into the "
+            "rosdep database.".format(e.dependency_name))
 
     # Finally, return a list of all system dependencies
     return set(item for sublist in system_dependencies.values()
@@ -453,7 +742,12 @@ def _find_system_dependencies(catkin_packages, rosdep):
 
 
 class SystemDependencyNotFound(Exception):
-    pass
+
+    def __init__(self, dependency_name):
+        super().__init__(
+            '{!r} does not resolve to a system dependency'.format(
+                dependency_name))
+        self.dependency_name = dependency_name
 
 
 class _Rosdep:
@@ -468,6 +762,10 @@ class _Rosdep:
                                                  'sources.list.d')
         self._rosdep_cache_path = os.path.join(self._rosdep_path, 'cache')
         self._project = project
+        self._resolutions_cache = cache.RosdepCache(
+            rosdistro=ros_distro, release=_ROS_RELEASE_MAP[ros_distro])
+        self._database_hash = None
+        self._resolutions = None
 
     def setup(self):
         # Make sure we can run multiple times without error, while leaving the
@@ -508,41 +806,119 @@ class _Rosdep:
             raise RuntimeError(
                 'Error updating rosdep database:\n{}'.format(output))
 
-    def get_dependencies(self, package_name):
+        # Resolutions are to be looked up against the updated database.
+        self._resolutions = None
+
+    def get_dependencies(self, package_names):
+        """Return the rosdep keys the given packages depend upon."""
+        package_names = sorted(package_names)
         try:
-            output = self._run(['keys', package_name]).strip()
-            if output:
-                return output.split('\n')
-            else:
-                return []
+            output = self._run(['keys'] + package_names).strip()
         except subprocess.CalledProcessError:
-            raise FileNotFoundError(
-                'Unable to find Catkin package "{}"'.format(package_name))
+            # Find out which of the packages rosdep doesn't know about.
+            for package_name in package_names:
+                try:
+                    self._run(['keys', package_name])
+                except subprocess.CalledProcessError:
+                    raise FileNotFoundError(
+                        'Unable to find Catkin package "{}"'.format(
+                            package_name))
+            raise
+
+        if output:
+            return output.split('\n')
+        else:
+            return []
 
     def resolve_dependency(self, dependency_name):
+        return self.resolve_dependencies([dependency_name])[dependency_name]
+
+    def resolve_dependencies(self, dependency_names):
+        """Resolve rosdep keys into system dependencies.
+
+        Keys that were already resolved against the current rosdep database
+        are served from the cache, the rest are resolved in one go.
+
+        :returns: a dictionary mapping each key to a list of packages.
+        :raises SystemDependencyNotFound: if a key cannot be resolved.
+        """
+        if self._resolutions is None:
+            self._database_hash = self._get_database_hash()
+            if self._database_hash:
+                self._resolutions = self._resolutions_cache.get(
+                    database_hash=self._database_hash)
+            else:
+                self._resolutions = {}
+
+        unresolved = sorted(
+            set(dependency_names).difference(self._resolutions))
+        if unresolved:
+            self._resolutions.update(self._resolve(unresolved))
+            if self._database_hash:
+                self._resolutions_cache.cache(
+                    database_hash=self._database_hash,
+                    resolutions=self._resolutions)
+                self._resolutions_cache.prune(keep_hash=self._database_hash)
+
+        return {dependency_name: self._resolutions[dependency_name]
+                for dependency_name in dependency_names}
+
+    def _resolve(self, dependency_names):
         try:
             # rosdep needs three pieces of information here:
             #
-            # 1) The dependency we're trying to lookup.
+            # 1) The dependencies we're trying to lookup.
             # 2) The rosdistro being used.
             # 3) The version of Ubuntu being used. We're telling rosdep to
             #    resolve dependencies using the version of Ubuntu that
             #    corresponds to the ROS release (even if we're running on
             #    something else).
-            output = self._run(['resolve', dependency_name, '--rosdistro',
-                                self._ros_distro, '--os',
-                                'ubuntu:{}'.format(
-                                    _ROS_RELEASE_MAP[self._ros_distro])])
+            output = self._run(['resolve'] + dependency_names + [
+                '--rosdistro', self._ros_distro, '--os',
+                'ubuntu:{}'.format(_ROS_RELEASE_MAP[self._ros_distro])])
         except subprocess.CalledProcessError:
-            raise SystemDependencyNotFound(
-                '{!r} does not resolve to a system dependency'.format(
-                    dependency_name))
-
-        # Everything that isn't a package name is prepended with the pound
-        # sign, so we'll ignore everything with that.
+            # rosdep stops at the first key it cannot resolve, find out
+            # which one it was.
+            if len(dependency_names) == 1:
+                raise SystemDependencyNotFound(dependency_names[0])
+            resolutions = {}
+            for dependency_name in dependency_names:
+                resolutions.update(self._resolve([dependency_name]))
+            return resolutions
+
+        # When resolving more than one key, the packages for each of them
+        # are introduced by a #ROSDEP[key] line. Everything else that isn't
+        # a package name is prepended with the pound sign, so we'll ignore
+        # everything with that.
+        resolutions = {}
+        packages = resolutions.setdefault(dependency_names[0], [])
         delimiters = re.compile(r'\n|\s')
-        lines = delimiters.split(output)
-        return [line for line in lines if not line.startswith('#')]
+        for line in delimiters.split(output):
+            match = re.match(r'#ROSDEP\[(.*)\]$', line)
+            if match:
+                packages = resolutions.setdefault(match.group(1), [])
+            elif line and not line.startswith('#'):
+                packages.append(line)
+        return resolutions
+
+    def _get_database_hash(self):
+        """Return a digest of the rosdep database, None if there is none."""
+        sources_cache_path = os.path.join(
+            self._rosdep_cache_path, 'rosdep', 'sources.cache')
+        if not os.path.isdir(sources_cache_path):
+            return None
+
+        digest = hashlib.sha256()
+        for root, directories, files in os.walk(sources_cache_path):
+            directories.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                digest.update(
+                    os.path.relpath(path, sources_cache_path).encode())
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(2**20), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
 
     def _run(self, arguments):
         env = os.environ.copy()
@@ -40,8 +40,17 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - go-buildtags:
       (list of strings)
       Tags to use during the go build. Default is not to use any build tags.
+
+Dependencies are fetched into a GOPATH in the snapcraft cache directory
+($XDG_CACHE_HOME/snapcraft/go) which is shared by all parts and projects, and
+updated on every pull. Each part builds against a snapshot of the revisions
+its dependencies were at when it was pulled, only the few most recently used
+snapshots of each dependency are kept.
 """
 
+import concurrent.futures
+import contextlib
+import json
 import logging
 import os
 import shutil
@@ -49,6 +58,7 @@ from glob import iglob
 
 import snapcraft
 from snapcraft import common
+from snapcraft.internal import cache
 
 
 logger = logging.getLogger(__name__)
@@ -103,15 +113,14 @@ class GoPlugin(snapcraft.BasePlugin):
         self._gopath_src = os.path.join(self._gopath, 'src')
         self._gopath_bin = os.path.join(self._gopath, 'bin')
         self._gopath_pkg = os.path.join(self._gopath, 'pkg')
+        self._gopath_pkg_config = os.path.join(self._gopath, 'pkg.json')
+        self._go_cache = cache.GoCache()
 
     def pull(self):
-        # use -d to only download (build will happen later)
-        # use -t to also get the test-deps
-        # since we are not using -u the sources will stick to the
-        # original checkout.
         super().pull()
         os.makedirs(self._gopath_src, exist_ok=True)
 
+        go_packages = []
         if any(iglob('{}/**/*.go'.format(self.sourcedir), recursive=True)):
             go_package = self._get_local_go_package()
             go_package_path = os.path.join(self._gopath_src, go_package)
@@ -119,10 +128,106 @@ class GoPlugin(snapcraft.BasePlugin):
                 os.unlink(go_package_path)
             os.makedirs(os.path.dirname(go_package_path), exist_ok=True)
             os.symlink(self.sourcedir, go_package_path)
-            self._run(['go', 'get', '-t', '-d', './{}/...'.format(go_package)])
+            go_packages.append('./{}/...'.format(go_package))
+        go_packages.extend(self.options.go_packages)
+
+        if go_packages:
+            self._go_get(go_packages)
+            self._update_shared_sources(go_packages)
+            self._link_shared_sources(go_packages)
+            self._go_cache.prune()
+
+    def _shared_environment(self):
+        # go get downloads into the first entry in GOPATH, which makes the
+        # dependencies end up in the shared GOPATH.
+        env = self._build_environment()
+        env['GOPATH'] = '{}:{}'.format(self._go_cache.gopath, self._gopath)
+        return env
 
-        for go_package in self.options.go_packages:
-            self._run(['go', 'get', '-t', '-d', go_package])
+    def _go_get(self, go_packages):
+        # use -d to only download (build will happen later)
+        # use -t to also get the test-deps
+        env = self._shared_environment()
+
+        def go_get(go_package):
+            self._run(['go', 'get', '-t', '-d', go_package], env=env)
+
+        if len(go_packages) == 1:
+            go_get(go_packages[0])
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.parallel_build_count) as executor:
+            futures = [executor.submit(go_get, go_package)
+                       for go_package in go_packages]
+        # Concurrent fetches can trip over a dependency they have in common,
+        # give the ones that failed another go one at a time.
+        for go_package, future in zip(go_packages, futures):
+            if future.exception():
+                go_get(go_package)
+
+    def _get_shared_repositories(self, go_packages):
+        """Return the shared repositories go_packages resolve to."""
+        output = self._run_output(
+            ['go', 'list', '-e', '-f', '{{.ImportPath}} {{join .Deps " "}}'] +
+            go_packages, env=self._shared_environment())
+        import_paths = set(output.split())
+
+        resolved = []
+        for repository in self._go_cache.get_repositories():
+            prefix = repository.replace(os.sep, '/')
+            if any(import_path == prefix or
+                   import_path.startswith(prefix + '/')
+                   for import_path in import_paths):
+                resolved.append(repository)
+        return resolved
+
+    def _update_shared_sources(self, go_packages):
+        # go get only fetches what is missing, the shared sources the part
+        # resolves to are brought up to date here.
+        repositories = self._get_shared_repositories(go_packages)
+        if repositories:
+            self._run(['go', 'get', '-u', '-d'] +
+                      ['{}/...'.format(r.replace(os.sep, '/'))
+                       for r in repositories],
+                      env=self._shared_environment())
+
+    def _link_shared_sources(self, go_packages):
+        """Link snapshots of the shared sources go_packages resolve to."""
+        for repository in self._get_shared_repositories(go_packages):
+            # Never link into sources that are themselves linked in, such as
+            # the ones for the part.
+            parents = repository.split(os.sep)[:-1]
+            if any(os.path.islink(os.path.join(
+                    self._gopath_src, *parents[:i + 1]))
+                    for i in range(len(parents))):
+                continue
+
+            snapshot = self._go_cache.snapshot(repository)
+            path = os.path.join(self._gopath_src, repository)
+            if os.path.islink(path):
+                if os.readlink(path) == snapshot:
+                    continue
+                os.unlink(path)
+            elif os.path.lexists(path):
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.symlink(snapshot, path)
+
+    def _relink_pruned_snapshots(self):
+        # The snapshots linked in on pull may have been pruned since, by the
+        # pull of another part, those are linked in again as they are now.
+        for root, directories, files in os.walk(self._gopath_src):
+            for name in files:
+                path = os.path.join(root, name)
+                if (not os.path.islink(path) or os.path.exists(path) or
+                        not os.readlink(path).startswith(
+                            self._go_cache.snapshots_dir + os.sep)):
+                    continue
+                os.unlink(path)
+                os.symlink(self._go_cache.snapshot(
+                    os.path.relpath(path, self._gopath_src)), path)
 
     def clean_pull(self):
         super().clean_pull()
@@ -148,11 +253,16 @@ class GoPlugin(snapcraft.BasePlugin):
         if self.options.go_buildtags:
             tags = ['-tags={}'.format(','.join(self.options.go_buildtags))]
 
+        env = self._build_environment()
+        self._relink_pruned_snapshots()
+        self._check_pkg(tags, env)
+
         for go_package in self.options.go_packages:
-            self._run(['go', 'install'] + tags + [go_package])
+            self._run(['go', 'install'] + tags + [go_package], env=env)
         if not self.options.go_packages:
             self._run(['go', 'install'] + tags +
-                      ['./{}/...'.format(self._get_local_go_package())])
+                      ['./{}/...'.format(self._get_local_go_package())],
+                      env=env)
 
         install_bin_path = os.path.join(self.installdir, 'bin')
         os.makedirs(install_bin_path, exist_ok=True)
@@ -161,19 +271,44 @@ class GoPlugin(snapcraft.BasePlugin):
             binary_path = os.path.join(self._gopath_bin, binary)
             shutil.copy2(binary_path, install_bin_path)
 
+    def _check_pkg(self, tags, env):
+        # Compiled packages are kept from one build to the next so go only
+        # recompiles what changed, but go does not notice changes to the
+        # build tags or cgo flags by itself.
+        pkg_config = {
+            'tags': tags,
+            'env': {name: env.get(name) for name in (
+                'CC', 'CXX', 'CGO_CFLAGS', 'CGO_CPPFLAGS', 'CGO_CXXFLAGS',
+                'CGO_LDFLAGS')},
+        }
+        previous_pkg_config = None
+        with contextlib.suppress(OSError, ValueError):
+            with open(self._gopath_pkg_config) as f:
+                previous_pkg_config = json.load(f)
+
+        if previous_pkg_config != pkg_config and \
+                os.path.isdir(self._gopath_pkg):
+            shutil.rmtree(self._gopath_pkg)
+        os.makedirs(self._gopath, exist_ok=True)
+        with open(self._gopath_pkg_config, 'w') as f:
+            json.dump(pkg_config, f)
+
     def clean_build(self):
         super().clean_build()
 
         if os.path.isdir(self._gopath_bin):
             shutil.rmtree(self._gopath_bin)
 
-        if os.path.isdir(self._gopath_pkg):
-            shutil.rmtree(self._gopath_pkg)
-
-    def _run(self, cmd, **kwargs):
-        env = self._build_environment()
+    def _run(self, cmd, env=None, **kwargs):
+        if env is None:
+            env = self._build_environment()
         return self.run(cmd, cwd=self._gopath_src, env=env, **kwargs)
 
+    def _run_output(self, cmd, env=None, **kwargs):
+        if env is None:
+            env = self._build_environment()
+        return self.run_output(cmd, cwd=self._gopath_src, env=env, **kwargs)
+
     def _build_environment(self):
         env = os.environ.copy()
         env['GOPATH'] = self._gopath
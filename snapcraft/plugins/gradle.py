@@ -28,15 +28,20 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - gradle-options:
       (list of strings)
       flags to pass to the build using the gradle semantics for parameters.
+
+Dependencies are fetched into a gradle user home in the snapcraft cache
+during pull, which is shared by all parts, and the build then runs offline.
 """
 
 import glob
 import logging
 import os
+import re
 import urllib.parse
 import snapcraft
 import snapcraft.common
 import snapcraft.plugins.jdk
+from snapcraft.internal import cache
 
 
 logger = logging.getLogger(__name__)
@@ -44,6 +49,11 @@ logger = logging.getLogger(__name__)
 
 class GradlePlugin(snapcraft.plugins.jdk.JdkPlugin):
 
+    # What gradle reports when something is missing from its caches while
+    # building offline.
+    _offline_resolution_error = re.compile(
+        r'available for offline mode|Could not resolve')
+
     @classmethod
     def schema(cls):
         schema = super().schema()
@@ -67,13 +77,32 @@ class GradlePlugin(snapcraft.plugins.jdk.JdkPlugin):
         super().__init__(name, options, project)
         self.build_packages.append('ca-certificates-java')
 
+    def _get_gradle_cmd(self):
+        return ['./gradlew', '--gradle-user-home',
+                cache.JavaCache().gradle_user_home]
+
+    def pull(self):
+        super().pull()
+
+        # Keep the project cache out of the sources, they are copied over
+        # to the build dir.
+        self.run(self._get_gradle_cmd() +
+                 ['--project-cache-dir',
+                  os.path.join(self.partdir, 'gradle')] +
+                 self._get_proxy_options() +
+                 self.options.gradle_options + ['dependencies'],
+                 cwd=self.sourcedir)
+
     def build(self):
         super().build()
 
-        gradle_cmd = ['./gradlew']
-        self.run(gradle_cmd +
-                 self._get_proxy_options() +
-                 self.options.gradle_options + ['jar'])
+        gradle_cmd = self._get_gradle_cmd() + self._get_proxy_options()
+        if not self._build_offline(gradle_cmd + ['--offline'] +
+                                   self.options.gradle_options + ['jar']):
+            # The dependencies task only resolves what the project declares.
+            logger.warning('Unable to resolve everything offline, retrying '
+                           'with network access.')
+            self.run(gradle_cmd + self.options.gradle_options + ['jar'])
 
         src = os.path.join(self.builddir, 'build', 'libs')
         jarfiles = glob.glob(os.path.join(src, '*.jar'))
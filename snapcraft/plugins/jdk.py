@@ -14,11 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import subprocess
+import threading
+
 import snapcraft
 
 
 class JdkPlugin(snapcraft.BasePlugin):
 
+    # What the build tool reports when something is missing from its local
+    # repository while building offline, set by plugins building offline.
+    _offline_resolution_error = None
+
     def __init__(self, name, options, project):
         super().__init__(name, options, project)
         self.stage_packages.append('default-jdk')
@@ -28,6 +36,37 @@ class JdkPlugin(snapcraft.BasePlugin):
                 'PATH=%s/usr/lib/jvm/default-java/bin:'
                 '%s/usr/lib/jvm/default-java/jre/bin:$PATH' % (root, root)]
 
+    def _build_offline(self, cmd):
+        """Run cmd, return False if it failed to resolve dependencies.
+
+        The output is passed through as it comes, looking for
+        _offline_resolution_error in it along the way.
+        """
+        read_fd, write_fd = os.pipe()
+        unresolved = []
+
+        def tee():
+            with open(read_fd, 'rb') as output:
+                for line in output:
+                    line = line.decode(errors='replace')
+                    print(line, end='', flush=True)
+                    if self._offline_resolution_error.search(line):
+                        unresolved.append(line)
+
+        thread = threading.Thread(target=tee)
+        thread.start()
+        try:
+            try:
+                self.run(cmd, stdout=write_fd, stderr=subprocess.STDOUT)
+            finally:
+                os.close(write_fd)
+                thread.join()
+        except subprocess.CalledProcessError:
+            if unresolved:
+                return False
+            raise
+        return True
+
     def snap_fileset(self):
         # Cut out jdk bits (jre bits are in default-java/jre)
         return (['-usr/lib/jvm/default-java/bin',
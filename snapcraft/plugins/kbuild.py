@@ -57,10 +57,12 @@ be used.
 
 import logging
 import os
+import shlex
 import shutil
 import subprocess
 
 from snapcraft import BasePlugin
+from snapcraft.internal import cache
 
 
 logger = logging.getLogger(__name__)
@@ -109,6 +111,15 @@ class KBuildPlugin(BasePlugin):
             'make', '-j{}'.format(self.parallel_build_count)]
         if logger.isEnabledFor(logging.DEBUG):
             self.make_cmd.append('V=1')
+        if project.use_ccache:
+            # kbuild sets CC itself so the environment one is not honored.
+            self.make_cmd.append('CC=ccache {}gcc'.format(
+                cache.CompilerCache.get_compiler_prefix(project)))
+
+    @property
+    def outdir(self):
+        """Directory kbuild writes its output to, the build dir by default."""
+        return self.builddir
 
     def do_base_config(self, config_path):
         # if kconfigfile is provided use that
@@ -144,7 +155,8 @@ class KBuildPlugin(BasePlugin):
 
     def do_remake_config(self):
         # update config to include kconfig amendments using oldconfig
-        cmd = 'yes "" | {} oldconfig'.format(' '.join(self.make_cmd))
+        cmd = 'yes "" | {} oldconfig'.format(
+            ' '.join(shlex.quote(arg) for arg in self.make_cmd))
         subprocess.check_call(cmd, shell=True, cwd=self.builddir)
 
     def do_build(self):
@@ -160,7 +172,7 @@ class KBuildPlugin(BasePlugin):
     def build(self):
         super().build()
 
-        config_path = os.path.join(self.builddir, '.config')
+        config_path = os.path.join(self.outdir, '.config')
 
         self.do_base_config(config_path)
         self.do_patch_config(config_path)
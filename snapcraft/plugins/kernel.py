@@ -20,6 +20,11 @@ kernel snaps with all the bells and whistles in one shot...
 WARNING: this plugin's API is unstable. The cross compiling support is
          experimental.
 
+Objects are built out of tree, in a directory within the part that is kept
+when the build step is cleaned. Changes to the kernel configuration then only
+rebuild the objects they affect, the configuration symbols that changed since
+the previous build are reported.
+
 The following kernel specific options are provided by this plugin:
 
     - kernel-image-target:
@@ -35,7 +40,10 @@ The following kernel specific options are provided by this plugin:
       (array of string)
       list of modules to include in initrd; note that kernel snaps do not
       provide the core boot logic which comes from snappy Ubuntu Core
-      OS snap. Include all modules you need for mounting rootfs here.
+      OS snap. Include all modules you need for mounting rootfs here,
+      their dependencies are included as listed in modules.dep.
+      Generated initrds are cached, an initrd is only generated again
+      when the OS snap initrd or any of the files added to it change.
 
     - kernel-with-firmware:
       (boolean; default: True)
@@ -50,21 +58,29 @@ The following kernel specific options are provided by this plugin:
     - kernel-initrd-compression:
       (string; default: gz)
       initrd compression to use; the only supported value now is 'gz'.
+      pigz is used instead of gzip when it is available.
 
     - kernel-device-trees:
       (array of string)
       list of device trees to build, the format is <device-tree-name>.dts.
 """
 
+import contextlib
 import glob
+import gzip
+import hashlib
 import logging
+import lzma
 import magic
 import os
 import shutil
+import stat
 import subprocess
 import tempfile
 
 import snapcraft
+from snapcraft import file_utils
+from snapcraft.internal import cache, cpio
 from snapcraft.plugins import kbuild
 
 logger = logging.getLogger(__name__)
@@ -74,6 +90,49 @@ _compression_command = {
     'gz': 'gzip',
 }
 
+# Drop-in replacements that compress using all the available cores.
+_parallel_compression_command = {
+    'gzip': 'pigz',
+}
+
+
+def _read_config(config_path):
+    """Return the symbols set in the kernel config at config_path.
+
+    :returns: a dictionary of symbols to their values, symbols that are not
+              set have a value of 'n'. None if there is no config.
+    """
+    config = {}
+    try:
+        with open(config_path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('CONFIG_'):
+                    symbol, _, value = line.partition('=')
+                    config[symbol] = value
+                elif line.startswith('# CONFIG_') and line.endswith(
+                        ' is not set'):
+                    config[line[2:-len(' is not set')]] = 'n'
+    except FileNotFoundError:
+        return None
+    return config
+
+
+def _get_parent_directories(names):
+    directories = set()
+    for name in names:
+        name = os.path.dirname(name)
+        while name:
+            directories.add(name)
+            name = os.path.dirname(name)
+    return directories
+
+
+def _get_module_name(module):
+    # modules.dep and modprobe treat dashes and underscores the same.
+    module = os.path.basename(module.strip())
+    return module.split('.ko', 1)[0].replace('-', '_')
+
 
 class KernelPlugin(kbuild.KBuildPlugin):
 
@@ -150,6 +209,7 @@ class KernelPlugin(kbuild.KBuildPlugin):
 
         self.os_snap = os.path.join(self.sourcedir, 'os.snap')
         self.kernel_release = ''
+        self._previous_config = None
 
     def enable_cross_compilation(self):
         logger.info('Cross compiling kernel target {!r}'.format(
@@ -188,103 +248,196 @@ class KernelPlugin(kbuild.KBuildPlugin):
             'INSTALL_FW_PATH={}'.format(
                 os.path.join(self.installdir, 'lib', 'firmware'))]
 
-    def _unpack_generic_initrd(self):
+    @contextlib.contextmanager
+    def _generic_initrd(self):
+        """Extract the generic initrd out of the OS snap, yield its path."""
         initrd_path = os.path.join(
             'usr', 'lib', 'ubuntu-core-generic-initrd', 'initrd.img-core')
-        initrd_unpacked_path = os.path.join(self.builddir, 'initrd-staging')
-        if os.path.exists(initrd_unpacked_path):
-            shutil.rmtree(initrd_unpacked_path)
-        os.makedirs(initrd_unpacked_path)
 
         with tempfile.TemporaryDirectory() as temp_dir:
             subprocess.check_call([
                 'unsquashfs', self.os_snap, os.path.dirname(initrd_path)],
                 cwd=temp_dir)
 
-            tmp_initrd_path = os.path.join(
-                temp_dir, 'squashfs-root', initrd_path)
+            # Make sure we're working with the actual initrd, not a
+            # symbolic link.
+            yield os.path.realpath(os.path.join(
+                temp_dir, 'squashfs-root', initrd_path))
+
+    def _open_initrd(self, initrd_path):
+        mime_detector = magic.open(
+            magic.MAGIC_MIME_TYPE | magic.MAGIC_ERROR)
+        mime_detector.load()
+        mime_type = mime_detector.file(initrd_path)
+        if not mime_type:
+            raise RuntimeError(
+                'Unable to determine mime type for {!r}: {}'.format(
+                    initrd_path, os.strerror(mime_detector.errno())))
+        logger.debug('initrd mime_type: {} {}'.format(
+            initrd_path, mime_type))
+
+        # Support gzip and lzma/xz
+        gzip_mime_types = ('application/gzip', 'application/x-gzip')
+        xz_mime_types = ('application/x-xz', 'application/x-lzma')
+        if any(x in mime_type for x in gzip_mime_types):
+            return gzip.open(initrd_path)
+        elif any(x in mime_type for x in xz_mime_types):
+            return lzma.open(initrd_path)
+        else:
+            raise RuntimeError(
+                'initrd file type is unsupported: {!r}'.format(mime_type))
+
+    def _get_initrd_modules(self):
+        """Return the modules for the initrd along with their dependencies.
+
+        Dependencies are resolved from modules.dep, which already lists the
+        full set of dependencies for every module.
+        """
+        if not self.options.kernel_initrd_modules:
+            return []
 
-            mime_detector = magic.open(
-                magic.MAGIC_MIME_TYPE | magic.MAGIC_ERROR)
-            mime_detector.load()
-            # Make sure we're getting the mime type of the actual initrd, not
-            # a symbolic link.
-            mime_type = mime_detector.file(os.path.realpath(tmp_initrd_path))
-            if not mime_type:
-                raise RuntimeError(
-                    'Unable to determine mime type for {!r}: {}'.format(
-                        tmp_initrd_path, os.strerror(mime_detector.errno())))
-            logger.debug('initrd mime_type: {} {}'.format(
-                tmp_initrd_path, mime_type))
-
-            # Support gzip and lzma/xz
-            gzip_mime_types = ('application/gzip', 'application/x-gzip')
-            xz_mime_types = ('application/x-xz', 'application/x-lzma')
-            if any(x in mime_type for x in gzip_mime_types):
-                decompressor = 'gzip'
-            elif any(x in mime_type for x in xz_mime_types):
-                decompressor = 'xz'
+        modules_path = os.path.join('lib', 'modules', self.kernel_release)
+        dependencies = {}
+        with open(os.path.join(
+                self.installdir, modules_path, 'modules.dep')) as f:
+            for line in f:
+                module, _, module_dependencies = line.partition(':')
+                if module:
+                    dependencies[_get_module_name(module)] = (
+                        [module] + module_dependencies.split())
+
+        builtin_modules = set()
+        with contextlib.suppress(FileNotFoundError):
+            with open(os.path.join(
+                    self.installdir, modules_path, 'modules.builtin')) as f:
+                builtin_modules = {_get_module_name(line) for line in f}
+
+        modules = set()
+        for module in self.options.kernel_initrd_modules:
+            module_name = _get_module_name(module)
+            if module_name in dependencies:
+                modules.update(dependencies[module_name])
+            elif module_name in builtin_modules:
+                logger.debug('Module {!r} is built in'.format(module))
             else:
                 raise RuntimeError(
-                    'initrd file type is unsupported: {!r}'.format(mime_type))
+                    'Cannot find module {!r} for kernel release {}'.format(
+                        module, self.kernel_release))
 
-            subprocess.check_call(
-                'cat {0} | {1} -dc | cpio -i'.format(
-                    tmp_initrd_path, decompressor),
-                shell=True, cwd=initrd_unpacked_path)
+        if not modules:
+            return []
 
-        return initrd_unpacked_path
+        initrd_modules = [
+            os.path.join(modules_path, module_info)
+            for module_info in ['modules.dep', 'modules.dep.bin']]
+        for module in sorted(modules):
+            # Older depmod versions list modules with absolute paths.
+            if os.path.isabs(module):
+                module = os.path.relpath(
+                    module, os.path.join(os.sep, modules_path))
+            initrd_modules.append(os.path.join(modules_path, module))
+        return initrd_modules
+
+    def _get_initrd_firmware(self):
+        # TODO pickup required firmware from modules.
+        firmware_files = []
+        for firmware in self.options.kernel_initrd_firmware:
+            firmware_files.append(os.path.normpath(firmware))
+            src = os.path.join(self.installdir, firmware)
+            for root, directories, files in os.walk(src):
+                for name in directories + files:
+                    firmware_files.append(os.path.relpath(
+                        os.path.join(root, name), self.installdir))
+        return firmware_files
+
+    def _get_initrd_key(self, base_initrd_path, initrd_files):
+        """Return a key identifying the initrd by everything it is made of."""
+        def update(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(2**20), b''):
+                    key.update(chunk)
+
+        key = hashlib.sha256()
+        key.update(self.options.kernel_initrd_compression.encode())
+        update(base_initrd_path)
+        for name in initrd_files:
+            path = os.path.join(self.installdir, name)
+            key.update(b'\0' + name.encode() + b'\0')
+            if os.path.islink(path):
+                key.update(os.readlink(path).encode())
+            elif os.path.isfile(path):
+                update(path)
+        return key.hexdigest()
+
+    def _write_initrd(self, base_initrd_path, initrd_files, initrd_path):
+        # The base entries are streamed through to the compressor, files
+        # we add take precedence over the ones in the base initrd.
+        replaced = set(initrd_files)
+        directories = _get_parent_directories(initrd_files)
+        compression_cmd = self._get_compression_cmd()
+
+        with open(initrd_path, 'wb') as f:
+            compressor = subprocess.Popen(
+                [compression_cmd, '-c'], stdin=subprocess.PIPE, stdout=f)
+            with compressor.stdin:
+                writer = cpio.Writer(compressor.stdin)
+                with self._open_initrd(base_initrd_path) as base_initrd:
+                    for entry in cpio.read(base_initrd):
+                        name = os.path.normpath(entry.name)
+                        if name in replaced:
+                            continue
+                        if stat.S_ISDIR(entry.mode):
+                            directories.discard(name)
+                        writer.add(entry)
+                for name in sorted(directories - replaced):
+                    writer.add(cpio.Entry(
+                        name=name, mode=stat.S_IFDIR | 0o755))
+                for name in sorted(initrd_files):
+                    writer.add_path(name, os.path.join(self.installdir, name))
+                writer.close()
+            if compressor.wait() != 0:
+                raise subprocess.CalledProcessError(
+                    compressor.returncode, compression_cmd)
+
+    def _get_compression_cmd(self):
+        parallel_compression_cmd = _parallel_compression_command.get(
+            self.compression_cmd)
+        if parallel_compression_cmd and shutil.which(
+                parallel_compression_cmd):
+            return parallel_compression_cmd
+        return self.compression_cmd
 
     def _make_initrd(self):
         logger.info('Generating driver initrd for kernel release: {}'.format(
             self.kernel_release))
 
-        initrd_unpacked_path = self._unpack_generic_initrd()
-
-        modprobe_outs = []
-        for module in self.options.kernel_initrd_modules:
-            modprobe_out = self.run_output([
-                'modprobe', '-n', '--show-depends', '-d', self.installdir,
-                '-S', self.kernel_release, module])
-            modprobe_outs.extend(modprobe_out.split(os.linesep))
-
-        modules_path = os.path.join('lib', 'modules', self.kernel_release)
-        for src in set(modprobe_outs):
-            src = src.split()[-1:][0]
-            dst = os.path.join(initrd_unpacked_path,
-                               os.path.relpath(src, self.installdir))
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            os.link(src, dst)
-
-        if modprobe_outs:
-            for module_info in ['modules.dep', 'modules.dep.bin']:
-                module_info_path = os.path.join(modules_path, module_info)
-                src = os.path.join(self.installdir, module_info_path)
-                dst = os.path.join(initrd_unpacked_path, module_info_path)
-                os.link(src, dst)
-
-        # TODO pickup required firmware from modules.
-        for firmware in self.options.kernel_initrd_firmware:
-            src = os.path.join(self.installdir, firmware)
-            dst = os.path.join(initrd_unpacked_path, firmware)
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            if os.path.isdir(src):
-                shutil.copytree(src, dst)
-            else:
-                os.link(src, dst)
+        initrd_files = self._get_initrd_modules()
+        initrd_files.extend(self._get_initrd_firmware())
 
         initrd = 'initrd-{}.img'.format(self.kernel_release)
         initrd_path = os.path.join(self.installdir, initrd)
-        subprocess.check_call(
-            'find . | cpio --create --format=newc | '
-            '{} > {}'.format(self.compression_cmd, initrd_path), shell=True,
-            cwd=initrd_unpacked_path)
+        if os.path.exists(initrd_path):
+            os.remove(initrd_path)
+
+        initrd_cache = cache.InitrdCache()
+        with self._generic_initrd() as base_initrd_path:
+            initrd_key = self._get_initrd_key(base_initrd_path, initrd_files)
+            cached_initrd_path = initrd_cache.get(initrd_key)
+            if cached_initrd_path:
+                logger.info('Using cached initrd')
+                file_utils.link_or_copy(cached_initrd_path, initrd_path)
+            else:
+                self._write_initrd(
+                    base_initrd_path, initrd_files, initrd_path)
+                initrd_cache.cache(key=initrd_key, filename=initrd_path)
+                initrd_cache.prune()
+
         unversioned_initrd_path = os.path.join(self.installdir, 'initrd.img')
         os.link(initrd_path, unversioned_initrd_path)
 
     def _parse_kernel_release(self):
         kernel_release_path = os.path.join(
-            self.builddir, 'include', 'config', 'kernel.release')
+            self.outdir, 'include', 'config', 'kernel.release')
 
         with open(kernel_release_path, 'r') as f:
             self.kernel_release = f.read().strip()
@@ -296,7 +449,7 @@ class KernelPlugin(kbuild.KBuildPlugin):
 
     def _get_build_arch_dir(self):
         return os.path.join(
-            self.builddir, 'arch', self.project.kernel_arch, 'boot')
+            self.outdir, 'arch', self.project.kernel_arch, 'boot')
 
     def _copy_vmlinuz(self):
         kernel = '{}-{}'.format(
@@ -312,7 +465,7 @@ class KernelPlugin(kbuild.KBuildPlugin):
         os.link(src, os.path.join(self.installdir, 'kernel.img'))
 
     def _copy_system_map(self):
-        src = os.path.join(self.builddir, 'System.map')
+        src = os.path.join(self.outdir, 'System.map')
         dst = os.path.join(
             self.installdir, 'System.map-{}'.format(self.kernel_release))
         if not os.path.exists(src):
@@ -336,11 +489,55 @@ class KernelPlugin(kbuild.KBuildPlugin):
             for f in found_dtbs:
                 os.link(f, os.path.join(dtb_dir, os.path.basename(f)))
 
+    @property
+    def outdir(self):
+        # Objects are kept out of tree and outside of the build dir, which
+        # is recreated from source on every build, so that only what is
+        # affected by a change is rebuilt. Objects built for different
+        # architectures or by different compilers are kept apart.
+        compiler = 'gcc'
+        if self.project.is_cross_compiling:
+            compiler = '{}gcc'.format(self.project.cross_compiler_prefix)
+        return os.path.join(
+            self.partdir, 'kbuild', '{}-{}'.format(
+                self.project.kernel_arch, compiler))
+
+    def do_base_config(self, config_path):
+        self._previous_config = _read_config(config_path)
+        super().do_base_config(config_path)
+
+    def do_remake_config(self):
+        super().do_remake_config()
+
+        if self._previous_config is None:
+            return
+        config = _read_config(os.path.join(self.outdir, '.config'))
+        changes = []
+        for symbol in sorted(set(config) | set(self._previous_config)):
+            previous_value = self._previous_config.get(symbol, 'n')
+            value = config.get(symbol, 'n')
+            if previous_value != value:
+                changes.append('{}: {} -> {}'.format(
+                    symbol, previous_value, value))
+        if changes:
+            logger.info('Kernel config changes since the last build:\n'
+                        '{}'.format('\n'.join(changes)))
+        else:
+            logger.info('Kernel config unchanged since the last build')
+
     def pull(self):
         super().pull()
         snapcraft.download(
             'ubuntu-core', 'edge', self.os_snap, self.project.deb_arch)
 
+    def build(self):
+        os.makedirs(self.outdir, exist_ok=True)
+        # make_cmd outlives a single build, only ever carry one O= in it.
+        self.make_cmd = [arg for arg in self.make_cmd
+                         if not arg.startswith('O=')]
+        self.make_cmd.append('O={}'.format(self.outdir))
+        super().build()
+
     def do_install(self):
         super().do_install()
 
@@ -28,17 +28,22 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - maven-options:
       (list of strings)
       flags to pass to the build using the maven semantics for parameters.
+
+Dependencies are fetched into a local repository in the snapcraft cache
+during pull, which is shared by all parts, and the build then runs offline.
 """
 
 import glob
 import logging
 import os
+import re
 from urllib.parse import urlparse
 from xml.etree import ElementTree
 
 import snapcraft
 import snapcraft.common
 import snapcraft.plugins.jdk
+from snapcraft.internal import cache
 
 
 logger = logging.getLogger(__name__)
@@ -46,6 +51,12 @@ logger = logging.getLogger(__name__)
 
 class MavenPlugin(snapcraft.plugins.jdk.JdkPlugin):
 
+    # What maven reports when something is missing from the local
+    # repository while building offline.
+    _offline_resolution_error = re.compile(
+        r'in offline mode|could not be resolved|'
+        r'Could not resolve dependencies')
+
     @classmethod
     def schema(cls):
         schema = super().schema()
@@ -83,16 +94,32 @@ class MavenPlugin(snapcraft.plugins.jdk.JdkPlugin):
     def _use_proxy(self):
         return any(k in os.environ for k in ('http_proxy', 'https_proxy'))
 
-    def build(self):
-        super().build()
-
-        mvn_cmd = ['mvn', 'package']
+    def _get_mvn_args(self):
+        mvn_args = ['-Dmaven.repo.local={}'.format(
+            cache.JavaCache().maven_repository)]
         if self._use_proxy():
             settings_path = os.path.join(self.partdir, 'm2', 'settings.xml')
             _create_settings(settings_path)
-            mvn_cmd += ['-s', settings_path]
+            mvn_args += ['-s', settings_path]
+        return mvn_args
+
+    def pull(self):
+        super().pull()
+
+        self.run(['mvn', 'dependency:go-offline'] + self._get_mvn_args() +
+                 self.options.maven_options, cwd=self.sourcedir)
+
+    def build(self):
+        super().build()
 
-        self.run(mvn_cmd + self.options.maven_options)
+        mvn_cmd = ['mvn', 'package'] + self._get_mvn_args()
+        if not self._build_offline(
+                mvn_cmd + ['--offline'] + self.options.maven_options):
+            # go-offline does not know about everything plugins resolve
+            # while building.
+            logger.warning('Unable to resolve everything offline, retrying '
+                           'with network access.')
+            self.run(mvn_cmd + self.options.maven_options)
 
         for f in self.options.maven_targets:
             src = os.path.join(self.builddir, f, 'target')
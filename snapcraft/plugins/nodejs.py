@@ -43,7 +43,8 @@ import platform
 import shutil
 
 import snapcraft
-from snapcraft import sources
+from snapcraft import file_utils, sources
+from snapcraft.internal import cache
 
 logger = logging.getLogger(__name__)
 
@@ -104,13 +105,36 @@ class NodePlugin(snapcraft.BasePlugin):
         self._npm_dir = os.path.join(self.partdir, 'npm')
         self._nodejs_tar = sources.Tar(get_nodejs_release(
             self.options.node_engine), self._npm_dir)
+        self._nodejs_base = _get_nodejs_base(self.options.node_engine)
+        # Shared by all the parts in the project, pull fills it up and build
+        # installs from it.
+        self._npm_cache_dir = os.path.join(
+            os.path.dirname(self.partdir), '.npm')
+        self._npm_command = [
+            'npm', '--cache={}'.format(self._npm_cache_dir),
+            '--cache-min=Infinity']
 
     def pull(self):
         super().pull()
         os.makedirs(self._npm_dir, exist_ok=True)
-        self._nodejs_tar.download()
-        # do the install in the pull phase to download all dependencies.
-        self._npm_install(rootdir=self.sourcedir)
+        nodejs_dir = self._get_nodejs()
+
+        # Only fetch the dependencies into the npm cache here, installing
+        # them is left to build.
+        env = os.environ.copy()
+        env['PATH'] = '{}:{}'.format(
+            os.path.join(nodejs_dir, 'bin'), env.get('PATH', ''))
+        if self.options.node_packages:
+            # npm has no way to just fetch packages with their dependencies,
+            # so they are installed into a scratch prefix.
+            fetch_dir = os.path.join(self._npm_dir, 'fetch')
+            self.run(self._npm_command + [
+                'install', '--global', '--prefix', fetch_dir] +
+                self.options.node_packages, cwd=self._npm_dir, env=env)
+            shutil.rmtree(fetch_dir, ignore_errors=True)
+        if os.path.exists(os.path.join(self.sourcedir, 'package.json')):
+            self.run(self._npm_command + ['install'], cwd=self.sourcedir,
+                     env=env)
 
     def clean_pull(self):
         super().clean_pull()
@@ -121,19 +145,55 @@ class NodePlugin(snapcraft.BasePlugin):
 
     def build(self):
         super().build()
-        self._npm_install(rootdir=self.builddir)
-
-    def _npm_install(self, rootdir):
-        self._nodejs_tar.provision(
-            self.installdir, clean_target=False, keep_tarball=True)
-        npm_install = ['npm', '--cache-min=Infinity', 'install']
-        for pkg in self.options.node_packages:
-            self.run(npm_install + ['--global'] + [pkg], cwd=rootdir)
-        if os.path.exists(os.path.join(rootdir, 'package.json')):
-            self.run(npm_install)
-            self.run(npm_install + ['--global'], cwd=rootdir)
+        # npm installs globally into the toolchain's prefix and may rewrite
+        # files in it, so the cached toolchain is copied rather than linked.
+        file_utils.link_or_copy_tree(self._get_nodejs(), self.installdir,
+                                     copy_function=_copy)
+
+        if self.options.node_packages:
+            self.run(self._npm_command + ['install', '--global'] +
+                     self.options.node_packages, cwd=self.builddir)
+        if os.path.exists(os.path.join(self.builddir, 'package.json')):
+            self.run(self._npm_command + ['install'], cwd=self.builddir)
+            self.run(self._npm_command + ['install', '--global'],
+                     cwd=self.builddir)
         for target in self.options.npm_run:
-            self.run(['npm', 'run', target], cwd=rootdir)
+            self.run(['npm', 'run', target], cwd=self.builddir)
+
+    def _get_nodejs(self):
+        """Return the path to the node toolchain, fetching it if needed."""
+        def provision(directory):
+            os.makedirs(self._npm_dir, exist_ok=True)
+            self._nodejs_tar.download()
+            self._nodejs_tar.provision(
+                directory, clean_target=False, keep_tarball=True)
+
+        toolchain_cache = cache.ToolchainCache()
+        nodejs_dir = toolchain_cache.cache(self._nodejs_base, provision)
+        self._prune_nodejs(toolchain_cache)
+        return nodejs_dir
+
+    def _prune_nodejs(self, toolchain_cache):
+        # Releases of the same major version supersede one another, only
+        # the newest of them is kept around.
+        prefix = 'node-v{}.'.format(self.options.node_engine.split('.')[0])
+        version = _parse_version(self.options.node_engine)
+        for name in os.listdir(toolchain_cache.toolchain_cache_dir):
+            if (name.startswith(prefix) and
+                    _parse_version(name[len('node-v'):]) > version):
+                return
+        toolchain_cache.prune(prefix=prefix, keep=self._nodejs_base)
+
+
+def _copy(source, destination):
+    if os.path.lexists(destination):
+        os.remove(destination)
+    shutil.copy2(source, destination, follow_symlinks=False)
+
+
+def _parse_version(version):
+    version = version.split('-')[0]
+    return tuple(int(n) for n in version.split('.') if n.isdigit())
 
 
 def _get_nodejs_base(node_engine):
@@ -45,6 +45,8 @@ Additionally, this plugin uses the following plugin-specific keywords:
       The python version to use. Valid options are: python2 and python3
 """
 
+import concurrent.futures
+import logging
 import os
 import re
 import shutil
@@ -59,6 +61,15 @@ from textwrap import dedent
 import snapcraft
 from snapcraft import file_utils
 from snapcraft.common import isurl
+from snapcraft.internal import cache
+
+# Environment variables that have a say in how wheels are built from source.
+_BUILD_ENV_VARIABLES = ['CC', 'CXX', 'CFLAGS', 'CPPFLAGS', 'CXXFLAGS',
+                        'LDFLAGS', 'PKG_CONFIG_PATH']
+
+_SDIST_EXTENSIONS = ['.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip', '.tar']
+
+logger = logging.getLogger(__name__)
 
 
 class PythonPlugin(snapcraft.BasePlugin):
@@ -139,6 +150,9 @@ class PythonPlugin(snapcraft.BasePlugin):
         self.build_packages.extend(self.plugin_build_packages)
         self.stage_packages.extend(self.plugin_stage_packages)
         self._python_package_dir = os.path.join(self.partdir, 'packages')
+        self._wheel_cache = cache.WheelCache(
+            python_version=self.options.python_version,
+            arch=self.project.deb_arch)
 
     def env(self, root):
         return [
@@ -172,9 +186,20 @@ class PythonPlugin(snapcraft.BasePlugin):
                    package_dir=self._python_package_dir, env=env,
                    extra_install_args=['--ignore-installed'])
 
-        if download:
-            pip.download(args)
-        pip.wheel(args)
+        # pip, setuptools and wheel only need to be fetched once per python
+        # version, whatever the part or project, until they get old.
+        bootstrap_wheels = self._wheel_cache.get_bootstrap_wheels()
+        if bootstrap_wheels:
+            os.makedirs(self._python_package_dir, exist_ok=True)
+            for wheel in bootstrap_wheels:
+                destination = os.path.join(
+                    self._python_package_dir, os.path.basename(wheel))
+                if not os.path.exists(destination):
+                    file_utils.link_or_copy(wheel, destination)
+        else:
+            if download:
+                pip.download(args)
+            self._wheel_cache.set_bootstrap_wheels(pip.wheel(args))
         pip.install(args)
 
     def _get_build_env(self):
@@ -188,29 +213,86 @@ class PythonPlugin(snapcraft.BasePlugin):
 
         return env
 
-    def _get_commands(self, setup):
-        commands = []
+    def _get_wheel_build_dir(self, env):
+        build_env = {name: env.get(name) for name in _BUILD_ENV_VARIABLES}
+        build_env['build-packages'] = sorted(self.build_packages)
+        build_env['stage-packages'] = sorted(self.stage_packages)
+        return self._wheel_cache.get_build_dir(build_env)
+
+    def _get_pip_args(self, setup):
+        # Requirements, packages and the project itself are all handed over
+        # to pip at once so their dependencies are resolved together.
+        args = []
         if self.options.requirements:
             requirements = self.options.requirements
             if not isurl(requirements):
                 requirements = os.path.join(self.sourcedir,
                                             self.options.requirements)
 
-            commands.append(dict(args=['--requirement', requirements]))
+            args.extend(['--requirement', requirements])
 
         if self.options.python_packages:
-            commands.append(dict(args=self.options.python_packages))
+            args.extend(self.options.python_packages)
 
         if os.path.exists(setup):
-            cwd = os.path.dirname(setup)
-            commands.append(dict(args=['.'], cwd=cwd))
-
-        return commands
+            args.append(os.path.dirname(os.path.abspath(setup)))
+
+        return args
+
+    def _get_sdists(self):
+        """Return the downloaded source distributions by name and version."""
+        sdists = {}
+        for file_name in os.listdir(self._python_package_dir):
+            for extension in _SDIST_EXTENSIONS:
+                if file_name.endswith(extension):
+                    name_version = _normalize_name(
+                        file_name[:-len(extension)])
+                    sdists[name_version] = os.path.join(
+                        self._python_package_dir, file_name)
+                    break
+        return sdists
+
+    def _build_missing_wheels(self, pip, wheel_build_dir):
+        # Everything pull downloaded is known at this point, so any source
+        # distribution without a wheel can be built on its own.
+        built = set()
+        for directory in (self._python_package_dir, wheel_build_dir):
+            for wheel in glob(os.path.join(directory, '*.whl')):
+                built.add(_get_wheel_name_version(wheel))
+        missing = [sdist for name_version, sdist in
+                   sorted(self._get_sdists().items())
+                   if name_version not in built]
+        if missing:
+            pip.build_wheels(missing, wheel_dir=wheel_build_dir,
+                             jobs=self.parallel_build_count)
+
+    def _link_cached_wheels(self, wheel_build_dir):
+        # pip only gets to see the cached wheels matching what pull
+        # downloaded, the cache may hold newer versions built for other
+        # parts which pip would otherwise prefer.
+        sdists = self._get_sdists()
+        for wheel in glob(os.path.join(wheel_build_dir, '*.whl')):
+            if _get_wheel_name_version(wheel) not in sdists:
+                continue
+            self._wheel_cache.mark_used(wheel)
+            destination = os.path.join(
+                self._python_package_dir, os.path.basename(wheel))
+            if not os.path.exists(destination):
+                file_utils.link_or_copy(wheel, destination)
+
+    def _cache_wheels(self, wheels, directory):
+        # Only wheels built from a downloaded source distribution are worth
+        # caching, anything built from the project itself is not.
+        sdists = self._get_sdists()
+        for wheel in wheels:
+            if _get_wheel_name_version(wheel) in sdists:
+                self._wheel_cache.cache(wheel=wheel, directory=directory)
 
     def _run_pip(self, setup, download=False):
         self._install_pip(download)
 
         env = self._get_build_env()
+        wheel_build_dir = self._get_wheel_build_dir(env)
 
         constraints = []
         if self.options.constraints:
@@ -225,21 +307,25 @@ class PythonPlugin(snapcraft.BasePlugin):
                    constraints=constraints,
                    dependency_links=self.options.process_dependency_links)
 
-        commands = self._get_commands(setup)
+        args = self._get_pip_args(setup)
+        if not args:
+            return
 
         if download:
-            for command in commands:
-                pip.download(**command)
+            pip.download(args)
         else:
-            for command in commands:
-                wheels = pip.wheel(**command)
-                installed = pip.list(self.run_output)
-                wheel_names = [os.path.basename(w).split('-')[0]
-                               for w in wheels]
-                # we want to avoid installing what is already provided in
-                # stage-packages
-                need_install = [k for k in wheel_names if k not in installed]
-                pip.install(need_install + ['--no-deps', '--upgrade'])
+            self._build_missing_wheels(pip, wheel_build_dir)
+            self._link_cached_wheels(wheel_build_dir)
+            wheels = pip.wheel(args)
+            self._cache_wheels(wheels, wheel_build_dir)
+            self._wheel_cache.prune()
+            installed = pip.list(self.run_output)
+            wheel_names = [os.path.basename(w).split('-')[0]
+                           for w in wheels]
+            # we want to avoid installing what is already provided in
+            # stage-packages
+            need_install = [k for k in wheel_names if k not in installed]
+            pip.install(need_install + ['--no-deps', '--upgrade'])
 
     def _fix_permissions(self):
         for root, dirs, files in os.walk(self.installdir):
@@ -332,6 +418,42 @@ class _Pip:
 
         return [os.path.join(self._package_dir, wheel) for wheel in wheels]
 
+    def build_wheels(self, sources, *, wheel_dir, jobs=1):
+        """Build wheels for sources, up to jobs at a time, into wheel_dir.
+
+        Dependencies are not built, sources failing to build are left for
+        a later wheel call to report.
+        """
+        os.makedirs(wheel_dir, exist_ok=True)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=jobs) as executor:
+            futures = {executor.submit(self._build_wheel, source, wheel_dir):
+                       source for source in sources}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except subprocess.CalledProcessError:
+                    logger.warning('Unable to build a wheel for {}.'.format(
+                        os.path.basename(futures[future])))
+
+    def _build_wheel(self, source, wheel_dir):
+        cmd = [
+            self._runnable, 'wheel',
+            '--disable-pip-version-check', '--no-index', '--no-deps',
+            '--find-links', self._package_dir,
+        ]
+        cmd.extend(self._extra_pip_args)
+
+        # Build out of place so that wheel_dir never holds a partial wheel.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cmd.extend(['--wheel-dir', temp_dir, source])
+            self._exec_func(cmd, env=self._env)
+            for wheel in os.listdir(temp_dir):
+                destination = os.path.join(wheel_dir, wheel)
+                if not os.path.exists(destination):
+                    file_utils.link_or_copy(
+                        os.path.join(temp_dir, wheel), destination)
+
     def download(self, args, **kwargs):
         cmd = [
             self._runnable, 'download',
@@ -357,6 +479,15 @@ class _Pip:
         self._exec_func(cmd, env=self._env, **kwargs)
 
 
+def _normalize_name(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def _get_wheel_name_version(wheel):
+    return _normalize_name(
+        '-'.join(os.path.basename(wheel).split('-')[:2]))
+
+
 def _replicate_owner_mode(path):
     if not os.path.exists(path):
         return
@@ -28,13 +28,21 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - rust-revision
       (string)
       select rust version
+
+Rust toolchains are kept in the snapcraft cache and shared across parts
+and projects, toolchains for a channel are refreshed daily. Crates are
+fetched into a shared cargo home during pull so the build itself does not
+hit the network, and compiled crates are kept across builds in the part's
+cargo-target directory.
 """
 
+import datetime
 import os
 import shutil
 
 import snapcraft
 from snapcraft import sources
+from snapcraft.internal import cache
 
 _RUSTUP = "https://static.rust-lang.org/rustup.sh"
 
@@ -59,33 +67,64 @@ class RustPlugin(snapcraft.BasePlugin):
         self._rustdoc = os.path.join(self._rustpath, "bin", "rustdoc")
         self._cargo = os.path.join(self._rustpath, "bin", "cargo")
         self._rustlib = os.path.join(self._rustpath, "lib")
-        self._rustup_get = sources.Script(_RUSTUP, self._rustpath)
-        self._rustup = os.path.join(self._rustpath, "rustup.sh")
+        self._cargo_target = os.path.join(self.partdir, "cargo-target")
 
     def build(self):
         super().build()
-        self.run([self._cargo, "install",
-                  "-j{}".format(self.parallel_build_count),
-                  "--root", self.installdir], env=self._build_env())
+        # The toolchain pulled for a channel is pruned once a newer one for
+        # the same channel comes along, leaving the link to it dangling.
+        if os.path.islink(self._rustpath) and \
+                not os.path.exists(self._rustpath):
+            self._fetch_rust()
+        cmd = [self._cargo, "install",
+               "-j{}".format(self.parallel_build_count),
+               "--root", self.installdir, "--path", self.builddir]
+        # Dependencies were fetched and locked during pull.
+        if os.path.exists(os.path.join(self.builddir, "Cargo.lock")):
+            cmd.append("--frozen")
+        self.run(cmd, env=self._build_env())
 
     def _build_env(self):
         env = os.environ.copy()
         env.update({"RUSTC": self._rustc,
                     "RUSTDOC": self._rustdoc,
-                    "RUST_PATH": self._rustlib})
+                    "RUST_PATH": self._rustlib,
+                    "CARGO_HOME": cache.CargoCache().cargo_home,
+                    "CARGO_TARGET_DIR": self._cargo_target})
         return env
 
     def pull(self):
         super().pull()
         self._fetch_rust()
+        self._fetch_crates()
 
     def clean_pull(self):
         super().clean_pull()
 
         # Remove the rust path (if any)
-        if os.path.exists(self._rustpath):
+        if os.path.islink(self._rustpath):
+            os.remove(self._rustpath)
+        elif os.path.exists(self._rustpath):
             shutil.rmtree(self._rustpath)
 
+    def _fetch_crates(self):
+        manifest_dir = self.sourcedir
+        source_subdir = getattr(self.options, 'source_subdir', None)
+        if source_subdir:
+            manifest_dir = os.path.join(manifest_dir, source_subdir)
+        if os.path.exists(os.path.join(manifest_dir, "Cargo.toml")):
+            self.run([self._cargo, "fetch"], cwd=manifest_dir,
+                     env=self._build_env())
+
+    def _get_channel_prefix(self):
+        return "rust-{}-".format(self.options.rust_channel or "stable")
+
+    def _get_toolchain_name(self):
+        if self.options.rust_revision:
+            return "rust-{}".format(self.options.rust_revision)
+        # Channels move, so only reuse their toolchain for a day.
+        return self._get_channel_prefix() + datetime.date.today().isoformat()
+
     def _fetch_rust(self):
         options = []
 
@@ -98,9 +137,23 @@ class RustPlugin(snapcraft.BasePlugin):
             else:
                 raise EnvironmentError("%s is not a valid rust channel"
                                        % self.options.rust_channel)
-        if not os.path.exists(self._rustpath):
-            os.makedirs(self._rustpath)
-        self._rustup_get.download()
-        self.run(["%s" % self._rustup,
-                  "--prefix=%s" % self._rustpath,
-                  "--disable-sudo", "--save"])
+
+        def provision(directory):
+            sources.Script(_RUSTUP, directory).download()
+            self.run([os.path.join(directory, "rustup.sh"),
+                      "--prefix=%s" % directory,
+                      "--disable-sudo", "--save"] + options)
+
+        toolchain_cache = cache.ToolchainCache()
+        toolchain_name = self._get_toolchain_name()
+        toolchain = toolchain_cache.cache(toolchain_name, provision)
+        if not self.options.rust_revision:
+            toolchain_cache.prune(prefix=self._get_channel_prefix(),
+                                  keep=toolchain_name)
+
+        if os.path.islink(self._rustpath):
+            os.remove(self._rustpath)
+        elif os.path.exists(self._rustpath):
+            shutil.rmtree(self._rustpath)
+        os.makedirs(self.partdir, exist_ok=True)
+        os.symlink(toolchain, self._rustpath)
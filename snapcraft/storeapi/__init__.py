@@ -35,7 +35,8 @@ import requests
 from simplejson.scanner import JSONDecodeError
 
 import snapcraft
-from snapcraft import config
+from snapcraft import config, file_utils
+from snapcraft.internal import cache
 from snapcraft.internal.indicators import download_requests_stream
 from snapcraft.storeapi import (
     _upload,
@@ -259,14 +260,28 @@ class StoreClient():
             logger.info('Already downloaded {} at {}'.format(
                 name, download_path))
             return
+        file_cache = cache.FileCache()
+        cached_snap = file_cache.get(algorithm='sha512', hash=expected_sha512)
+        if cached_snap:
+            logger.info('Using cached {} at {}'.format(name, download_path))
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(download_path)
+            file_utils.link_or_copy(cached_snap, download_path)
+            return
         logger.info('Downloading {}'.format(name, download_path))
         request = self.cpi.get(download_url, stream=True)
         request.raise_for_status()
+        # Never write through a hard link into the cache.
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(download_path)
         download_requests_stream(request, download_path)
 
         if self._is_downloaded(download_path, expected_sha512):
             logger.info('Successfully downloaded {} at {}'.format(
                 name, download_path))
+            file_cache.cache(filename=download_path, algorithm='sha512',
+                             hash=expected_sha512)
+            file_cache.prune()
         else:
             raise errors.SHAMismatchError(download_path, expected_sha512)
 
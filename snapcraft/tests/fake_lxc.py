@@ -0,0 +1,116 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Stand in for the lxc command line client.
+
+Usage: fake_lxc.py <state-dir> <lxc arguments>...
+
+Every invocation is appended to <state-dir>/calls.log. Containers,
+snapshots and storage volumes are only recorded by name, files pushed to
+and pulled from them live under <state-dir>/fs and commands run in them
+are not executed.
+"""
+
+import json
+import os
+import shutil
+import sys
+
+
+def _load_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'state.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'containers': [], 'volumes': [], 'mounts': {}}
+
+
+def _save_state(state_dir, state):
+    with open(os.path.join(state_dir, 'state.json'), 'w') as f:
+        json.dump(state, f)
+
+
+def _resolve(state_dir, state, target):
+    container, path = target.split('/', 1)
+    path = os.path.normpath('/' + path.lstrip('/'))
+    mounts = state['mounts'].get(container, {})
+    for mount_path, volume in mounts.items():
+        if path == mount_path or path.startswith(mount_path + '/'):
+            return os.path.join(
+                state_dir, 'fs', 'volumes', volume,
+                os.path.relpath(path, mount_path))
+    return os.path.join(state_dir, 'fs', 'containers', container,
+                        path.lstrip('/'))
+
+
+def _file(state_dir, state, args):
+    action, src, dst = args
+    if action == 'push':
+        dst = _resolve(state_dir, state, dst)
+    else:
+        src = _resolve(state_dir, state, src)
+    if not os.path.exists(src):
+        print('error: not found', file=sys.stderr)
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    shutil.copyfile(src, dst)
+    return 0
+
+
+def _storage(state_dir, state, args):
+    action, pool, volume = args[1:4]
+    if action == 'show':
+        return 0 if volume in state['volumes'] else 1
+    elif action == 'create':
+        state['volumes'].append(volume)
+    elif action == 'delete':
+        state['volumes'].remove(volume)
+        shutil.rmtree(os.path.join(state_dir, 'fs', 'volumes', volume),
+                      ignore_errors=True)
+    elif action == 'attach':
+        container, path = args[4:6]
+        state['mounts'].setdefault(container, {})[path] = volume
+    return 0
+
+
+def main(state_dir, args):
+    with open(os.path.join(state_dir, 'calls.log'), 'a') as f:
+        f.write(json.dumps(args) + '\n')
+
+    state = _load_state(state_dir)
+    names = [arg for arg in args[1:] if not arg.startswith('-')]
+    command = args[0]
+    status = 0
+    if command == 'info':
+        status = 0 if names[0] in state['containers'] else 1
+    elif command == 'launch':
+        state['containers'].append(names[-1])
+    elif command == 'copy':
+        state['containers'].append(names[-1])
+    elif command == 'snapshot':
+        state['containers'].append('/'.join(names))
+    elif command == 'delete':
+        state['containers'].remove(names[0])
+    elif command == 'file':
+        status = _file(state_dir, state, args[1:])
+    elif command == 'storage':
+        status = _storage(state_dir, state, args[1:])
+    _save_state(state_dir, state)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2:]))
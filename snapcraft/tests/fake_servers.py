@@ -16,6 +16,7 @@
 
 from collections import OrderedDict
 from datetime import datetime
+import gzip
 import json
 import logging
 import http.server
@@ -49,6 +50,7 @@ class FakePartsRequestHandler(BaseHTTPRequestHandler):
 
     _date_format = '%a, %d %b %Y %H:%M:%S GMT'
     _parts_date = datetime(2016, 7, 7, 10, 0, 20)
+    _parts_etag = '1111'
 
     def do_GET(self):
         logger.debug('Handling getting parts')
@@ -60,6 +62,9 @@ class FakePartsRequestHandler(BaseHTTPRequestHandler):
         if ims_date is not None and ims_date >= self._parts_date:
             self.send_response(304)
             response = {}
+        elif self.headers.get('If-None-Match') == self._parts_etag:
+            self.send_response(304)
+            response = {}
         else:
             self.send_response(200)
             response = OrderedDict((
@@ -88,14 +93,18 @@ class FakePartsRequestHandler(BaseHTTPRequestHandler):
                     ('maintainer', 'none'),
                 ))),
             ))
+        body = yaml.dump(response).encode()
         self.send_header('Content-Type', 'text/plain')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
         if 'NO_CONTENT_LENGTH' not in os.environ:
-            self.send_header('Content-Length', '1000')
+            self.send_header('Content-Length', str(len(body)))
         self.send_header(
             'Last-Modified', self._parts_date.strftime(self._date_format))
-        self.send_header('ETag', '1111')
+        self.send_header('ETag', self._parts_etag)
         self.end_headers()
-        self.wfile.write(yaml.dump(response).encode())
+        self.wfile.write(body)
 
 
 class FakePartsWikiServer(http.server.HTTPServer):
@@ -16,6 +16,7 @@
 
 from functools import partial
 import io
+import json
 import os
 import sys
 import threading
@@ -88,6 +89,41 @@ class CleanEnvironment(fixtures.Fixture):
         self.addCleanup(os.environ.update, current_environment)
 
 
+class FakeLXC(fixtures.Fixture):
+    """Put a fake lxc command line client first in PATH.
+
+    See fake_lxc for what it is able to do.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.useFixture(fixtures.TempDir()).path
+        bin_dir = os.path.join(self.path, 'bin')
+        os.mkdir(bin_dir)
+        lxc_path = os.path.join(bin_dir, 'lxc')
+        with open(lxc_path, 'w') as f:
+            f.write('#!/bin/sh\nexec {} {} {} "$@"\n'.format(
+                sys.executable,
+                os.path.join(os.path.dirname(__file__), 'fake_lxc.py'),
+                self.path))
+        os.chmod(lxc_path, 0o755)
+        self.useFixture(fixtures.EnvironmentVariable(
+            'PATH', '{}:{}'.format(bin_dir, os.environ.get('PATH', ''))))
+
+    @property
+    def calls(self):
+        """The argument lists lxc was called with, in order."""
+        try:
+            with open(os.path.join(self.path, 'calls.log')) as f:
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+
+    def volume_path(self, volume, path=''):
+        """Return where the fake keeps path inside storage volume."""
+        return os.path.join(self.path, 'fs', 'volumes', volume, path)
+
+
 class _FakeStdout(io.StringIO):
     """A fake stdout using StringIO implementing the missing fileno attrib."""
 
@@ -166,6 +166,21 @@ class DownloadTestCase(tests.TestCase):
             'Already downloaded test-snap at {}'.format(download_path),
             self.fake_logger.output)
 
+    def test_download_snap_uses_cache(self):
+        self.fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(self.fake_logger)
+        self.client.login('dummy', 'test correct password')
+        self.client.download(
+            'test-snap', 'test-channel',
+            os.path.join(self.path, 'test-snap.snap'))
+        download_path = os.path.join(self.path, 'other-test-snap.snap')
+        self.client.download(
+            'test-snap', 'test-channel', download_path)
+        self.assertIn(
+            'Using cached test-snap at {}'.format(download_path),
+            self.fake_logger.output)
+        self.assertTrue(os.path.isfile(download_path))
+
     def test_download_on_sha_mismatch(self):
         self.fake_logger = fixtures.FakeLogger(level=logging.INFO)
         self.useFixture(self.fake_logger)
@@ -16,6 +16,8 @@
 
 import logging
 import os
+import subprocess
+from unittest import mock
 
 import fixtures
 
@@ -156,3 +158,359 @@ class SnapCachedFilePruneTestCase(tests.TestCase):
             self.assertTrue(
                 os.path.isfile(os.path.join(snap_cache.snap_cache_dir,
                                             real_cached_snap)))
+
+
+class FileCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.file_cache = cache.FileCache()
+
+    def _make_file(self, name, size):
+        with open(name, 'wb') as f:
+            f.write(b'x' * size)
+        return name
+
+    def test_cache_and_get(self):
+        self.file_cache.cache(
+            filename=self._make_file('file', 1), algorithm='sha256',
+            hash='digest')
+
+        cached_file = self.file_cache.get(algorithm='sha256', hash='digest')
+
+        self.assertTrue(os.path.isfile(cached_file))
+        self.assertIsNone(
+            self.file_cache.get(algorithm='sha256', hash='other'))
+
+    def test_url_info_is_dropped_with_its_file(self):
+        cached_file = self.file_cache.cache(
+            filename=self._make_file('file', 1), algorithm='sha256',
+            hash='digest')
+        self.file_cache.set_url(
+            'http://test/file', algorithm='sha256', hash='digest',
+            etag='"etag"')
+
+        self.assertEqual(
+            {'url': 'http://test/file', 'algorithm': 'sha256',
+             'hash': 'digest', 'etag': '"etag"'},
+            self.file_cache.get_url('http://test/file'))
+
+        os.remove(cached_file)
+        self.assertIsNone(self.file_cache.get_url('http://test/file'))
+
+    def test_prune_evicts_least_recently_used(self):
+        for index, name in enumerate(('old', 'used', 'new')):
+            cached_file = self.file_cache.cache(
+                filename=self._make_file(name, 10), algorithm='sha256',
+                hash=name)
+            os.utime(cached_file, (index, index))
+        # Hard links to the same file are accounted for once.
+        self.file_cache.cache(
+            filename='new', algorithm='sha384', hash='new')
+        # Looking up a file marks it as recently used.
+        self.file_cache.get(algorithm='sha256', hash='used')
+
+        pruned_files = self.file_cache.prune(max_size=20)
+
+        self.assertEqual(1, len(pruned_files))
+        self.assertIsNone(self.file_cache.get(algorithm='sha256', hash='old'))
+        self.assertIsNotNone(
+            self.file_cache.get(algorithm='sha256', hash='used'))
+        self.assertIsNotNone(
+            self.file_cache.get(algorithm='sha384', hash='new'))
+
+
+class RosdepCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rosdep_cache = cache.RosdepCache(
+            rosdistro='kinetic', release='xenial')
+
+    def test_get_uncached(self):
+        self.assertEqual({}, self.rosdep_cache.get(database_hash='hash'))
+
+    def test_cache_and_get(self):
+        self.rosdep_cache.cache(
+            database_hash='hash', resolutions={'foo': ['bar']})
+
+        self.assertEqual(
+            {'foo': ['bar']}, self.rosdep_cache.get(database_hash='hash'))
+        self.assertEqual({}, self.rosdep_cache.get(database_hash='other'))
+
+    def test_prune_keeps_other_distros(self):
+        indigo_cache = cache.RosdepCache(rosdistro='indigo', release='trusty')
+        indigo_cache.cache(database_hash='old', resolutions={})
+        self.rosdep_cache.cache(database_hash='old', resolutions={})
+        self.rosdep_cache.cache(database_hash='new', resolutions={})
+
+        pruned_files = self.rosdep_cache.prune(keep_hash='new')
+
+        self.assertEqual(1, len(pruned_files))
+        self.assertTrue(
+            pruned_files[0].endswith('kinetic-xenial-old.json'))
+        self.assertTrue(os.path.exists(
+            os.path.join(indigo_cache.rosdep_cache_dir,
+                         'indigo-trusty-old.json')))
+
+
+class ToolchainCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.toolchain_cache = cache.ToolchainCache()
+
+    def test_cache_provisions_once(self):
+        provisioned = []
+
+        def provision(directory):
+            provisioned.append(directory)
+            open(os.path.join(directory, 'tool'), 'w').close()
+
+        path = self.toolchain_cache.cache('tool-1.0', provision)
+        self.assertEqual(
+            path, self.toolchain_cache.cache('tool-1.0', provision))
+
+        self.assertEqual(1, len(provisioned))
+        self.assertEqual(path, self.toolchain_cache.get('tool-1.0'))
+        self.assertTrue(os.path.exists(os.path.join(path, 'tool')))
+
+    def test_failed_provision_is_not_cached(self):
+        def provision(directory):
+            raise RuntimeError('no network')
+
+        self.assertRaises(RuntimeError, self.toolchain_cache.cache,
+                          'tool-1.0', provision)
+
+        self.assertIsNone(self.toolchain_cache.get('tool-1.0'))
+        self.assertEqual(
+            [], os.listdir(self.toolchain_cache.toolchain_cache_dir))
+
+    def test_prune_keeps_other_toolchains(self):
+        for name in ('tool-old', 'tool-new', 'other-old'):
+            self.toolchain_cache.cache(name, lambda directory: None)
+
+        pruned = self.toolchain_cache.prune(prefix='tool-', keep='tool-new')
+
+        self.assertEqual(
+            [os.path.join(self.toolchain_cache.toolchain_cache_dir,
+                          'tool-old')], pruned)
+        self.assertEqual(
+            ['other-old', 'tool-new'],
+            sorted(os.listdir(self.toolchain_cache.toolchain_cache_dir)))
+
+
+class GoCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.go_cache = cache.GoCache()
+        self.repository = os.path.join('github.com', 'snapcore', 'dep')
+        self.path = os.path.join(self.go_cache.gopath_src, self.repository)
+        os.makedirs(self.path)
+        self._git('init', '--quiet')
+        self._commit('1')
+
+    def _git(self, *args):
+        subprocess.check_call(
+            ['git', '-C', self.path, '-c', 'user.name=test',
+             '-c', 'user.email=test@example.com'] + list(args))
+
+    def _commit(self, content):
+        with open(os.path.join(self.path, 'dep.go'), 'w') as f:
+            f.write(content)
+        self._git('add', 'dep.go')
+        self._git('commit', '--quiet', '-m', content)
+
+    def test_get_repositories(self):
+        self.assertEqual([self.repository], self.go_cache.get_repositories())
+
+    def test_snapshot_per_revision(self):
+        first = self.go_cache.snapshot(self.repository)
+        self.assertEqual(first, self.go_cache.snapshot(self.repository))
+
+        self._commit('2')
+        second = self.go_cache.snapshot(self.repository)
+
+        self.assertNotEqual(first, second)
+        for snapshot, content in ((first, '1'), (second, '2')):
+            with open(os.path.join(snapshot, 'dep.go')) as f:
+                self.assertEqual(content, f.read())
+            self.assertFalse(os.path.exists(os.path.join(snapshot, '.git')))
+
+    def test_prune_keeps_most_recently_used_snapshots(self):
+        snapshots = []
+        for content in ('1', '2', '3'):
+            if content != '1':
+                self._commit(content)
+            snapshots.append(self.go_cache.snapshot(self.repository))
+            os.utime(snapshots[-1], (int(content), int(content)))
+        # Taking the first snapshot again marks it as used.
+        self._git('checkout', '--quiet', 'HEAD~2')
+        self.go_cache.snapshot(self.repository)
+
+        pruned = self.go_cache.prune(keep=2)
+
+        self.assertEqual([snapshots[1]], pruned)
+        self.assertTrue(os.path.isdir(snapshots[0]))
+        self.assertTrue(os.path.isdir(snapshots[2]))
+
+
+class CompilerCacheTestCase(tests.TestCase):
+
+    def test_compiler_cache_dir_is_per_arch(self):
+        amd64_cache = cache.CompilerCache(deb_arch='amd64')
+        arm64_cache = cache.CompilerCache(deb_arch='arm64')
+
+        self.assertNotEqual(amd64_cache.compiler_cache_dir,
+                            arm64_cache.compiler_cache_dir)
+        self.assertTrue(
+            arm64_cache.compiler_cache_dir.endswith('ccache/arm64'))
+
+    def test_get_env(self):
+        compiler_cache = cache.CompilerCache(deb_arch='arm64')
+
+        self.assertEqual(
+            compiler_cache.get_env(compiler_prefix='aarch64-linux-gnu-',
+                                   base_dir='/project'),
+            ['CCACHE_DIR={}'.format(compiler_cache.compiler_cache_dir),
+             'CC="ccache aarch64-linux-gnu-gcc"',
+             'CXX="ccache aarch64-linux-gnu-g++"',
+             'CCACHE_BASEDIR=/project'])
+
+    @mock.patch('subprocess.check_output')
+    def test_get_stats(self, mock_check_output):
+        mock_check_output.return_value = (
+            b'cache directory                     /cache\n'
+            b'cache hit (direct)                     5\n'
+            b'cache hit (preprocessed)               2\n'
+            b'cache miss                            11\n'
+            b'cache size                           1.2 MB\n')
+        compiler_cache = cache.CompilerCache(deb_arch='amd64')
+
+        self.assertEqual(
+            compiler_cache.get_stats(),
+            {'cache hit (direct)': 5, 'cache hit (preprocessed)': 2,
+             'cache miss': 11})
+        self.assertEqual(
+            mock_check_output.call_args[1]['env']['CCACHE_DIR'],
+            compiler_cache.compiler_cache_dir)
+
+    @mock.patch('subprocess.check_output')
+    def test_get_stats_without_ccache(self, mock_check_output):
+        mock_check_output.side_effect = FileNotFoundError()
+        compiler_cache = cache.CompilerCache(deb_arch='amd64')
+
+        self.assertEqual(compiler_cache.get_stats(), {})
+
+
+class InitrdCacheTestCase(tests.TestCase):
+
+    def test_cache_and_get(self):
+        initrd_cache = cache.InitrdCache()
+        with open('initrd.img', 'wb') as f:
+            f.write(b'initrd')
+
+        self.assertIsNone(initrd_cache.get('key'))
+        cached_initrd_path = initrd_cache.cache(
+            key='key', filename='initrd.img')
+
+        self.assertEqual(cached_initrd_path, initrd_cache.get('key'))
+        self.assertIsNone(initrd_cache.get('other-key'))
+        with open(cached_initrd_path, 'rb') as f:
+            self.assertEqual(b'initrd', f.read())
+
+    def test_prune_evicts_least_recently_used(self):
+        initrd_cache = cache.InitrdCache()
+        for key, mtime in (('old', 1), ('used', 2), ('new', 3)):
+            with open(key, 'wb') as f:
+                f.write(b'x' * 10)
+            path = initrd_cache.cache(key=key, filename=key)
+            os.utime(path, (mtime, mtime))
+        # Looking up the oldest one keeps it around.
+        initrd_cache.get('old')
+
+        pruned = initrd_cache.prune(max_size=20)
+
+        self.assertEqual(
+            [os.path.join(initrd_cache.initrd_cache_dir, 'used')], pruned)
+        self.assertIsNotNone(initrd_cache.get('old'))
+        self.assertIsNotNone(initrd_cache.get('new'))
+
+
+class WheelCacheTestCase(tests.TestCase):
+
+    def _cache_wheel(self, wheel_cache, name, directory, mtime):
+        with open(name, 'wb') as f:
+            f.write(b'x' * 10)
+        path = wheel_cache.cache(wheel=name, directory=directory)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_prune_evicts_least_recently_used(self):
+        wheel_cache = cache.WheelCache(python_version='python3', arch='amd64')
+        build_dir = wheel_cache.get_build_dir({'CFLAGS': '-O2'})
+        other_build_dir = wheel_cache.get_build_dir({'CFLAGS': '-O3'})
+        old = self._cache_wheel(
+            wheel_cache, 'old-1.0-py3-none-any.whl', build_dir, 1)
+        unused = self._cache_wheel(
+            wheel_cache, 'unused-1.0-py3-none-any.whl', other_build_dir, 2)
+        new = self._cache_wheel(
+            wheel_cache, 'new-1.0-py3-none-any.whl', build_dir, 3)
+        bootstrap = self._cache_wheel(
+            wheel_cache, 'pip-9.0.1-py3-none-any.whl',
+            wheel_cache.bootstrap_dir, 0)
+        wheel_cache.mark_used(old)
+
+        pruned = wheel_cache.prune(max_size=20)
+
+        self.assertEqual([unused], pruned)
+        self.assertFalse(os.path.exists(other_build_dir))
+        for path in (old, new, bootstrap):
+            self.assertTrue(os.path.exists(path))
+
+    def test_bootstrap_wheels_expire(self):
+        wheel_cache = cache.WheelCache(python_version='python3', arch='amd64')
+        self.assertEqual([], wheel_cache.get_bootstrap_wheels())
+
+        open('pip-9.0.0-py3-none-any.whl', 'w').close()
+        wheel_cache.set_bootstrap_wheels(['pip-9.0.0-py3-none-any.whl'])
+        old = os.path.join(
+            wheel_cache.bootstrap_dir, 'pip-9.0.0-py3-none-any.whl')
+        self.assertEqual([old], wheel_cache.get_bootstrap_wheels())
+
+        os.utime(old, (0, 0))
+        self.assertEqual([], wheel_cache.get_bootstrap_wheels())
+
+        # Newer ones replace the old ones.
+        open('pip-9.0.1-py3-none-any.whl', 'w').close()
+        wheel_cache.set_bootstrap_wheels(['pip-9.0.1-py3-none-any.whl'])
+        self.assertEqual(
+            [os.path.join(
+                wheel_cache.bootstrap_dir, 'pip-9.0.1-py3-none-any.whl')],
+            wheel_cache.get_bootstrap_wheels())
+
+
+class SchemaCacheTestCase(tests.TestCase):
+
+    def test_cache_and_get(self):
+        schema_cache = cache.SchemaCache()
+        schema = {'properties': {'name': {'type': 'string'}}}
+
+        self.assertIsNone(schema_cache.get(schema_file='schema.yaml', mtime=1))
+        schema_cache.cache(schema_file='schema.yaml', mtime=1, schema=schema)
+
+        self.assertEqual(
+            schema, schema_cache.get(schema_file='schema.yaml', mtime=1))
+        self.assertIsNone(schema_cache.get(schema_file='schema.yaml', mtime=2))
+        self.assertIsNone(schema_cache.get(schema_file='other.yaml', mtime=1))
+
+    def test_corrupted_cache_is_a_miss(self):
+        schema_cache = cache.SchemaCache()
+        schema_cache.cache(schema_file='schema.yaml', mtime=1, schema={})
+        for file_name in os.listdir(schema_cache.schema_cache_dir):
+            with open(os.path.join(schema_cache.schema_cache_dir, file_name),
+                      'wb') as f:
+                f.write(b'garbage')
+
+        self.assertIsNone(schema_cache.get(schema_file='schema.yaml', mtime=1))
@@ -81,6 +81,23 @@ parts:
         self.assertFalse(os.path.exists(self.stage_dir))
         self.assertFalse(os.path.exists(self.snap_dir))
 
+    @mock.patch('snapcraft.internal.lxd.delete_project_volume')
+    def test_clean_all_deletes_cleanbuild_volume(self, mock_delete):
+        self.make_snapcraft_yaml(n=3)
+
+        main(['clean'])
+
+        mock_delete.assert_called_once_with('clean-test', mock.ANY)
+
+    @mock.patch('snapcraft.internal.lxd.delete_project_volume')
+    def test_partial_clean_keeps_cleanbuild_volume(self, mock_delete):
+        self.make_snapcraft_yaml(n=3)
+
+        main(['clean', 'clean0'])
+        main(['clean', '--step', 'build'])
+
+        mock_delete.assert_not_called()
+
     def test_local_plugin_not_removed(self):
         self.make_snapcraft_yaml(n=3)
 
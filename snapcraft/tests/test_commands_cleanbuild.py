@@ -23,6 +23,7 @@ import fixtures
 
 from snapcraft.main import main
 from snapcraft import tests
+from snapcraft.tests import fixture_setup
 
 
 class CleanBuildCommandTestCase(tests.TestCase):
@@ -69,7 +70,7 @@ parts:
             os.path.join(self.stage_dir, 'binary'),
             os.path.join(self.snap_dir, 'binary'),
             'snap-test.snap',
-            'snap-test_1.0_source.tar.bz2',
+            'snap-test_1.0_source.tar',
         ]
         for d in dirs:
             os.makedirs(d)
@@ -85,7 +86,7 @@ parts:
             'Retrieved snap-test_1.0_amd64.snap\n',
             fake_logger.output)
 
-        with tarfile.open('snap-test_1.0_source.tar.bz2') as tar:
+        with tarfile.open('snap-test_1.0_source.tar') as tar:
             tar_members = tar.getnames()
 
         for f in files_no_tar:
@@ -115,3 +116,34 @@ parts:
             '"Ubuntu Desktop and Ubuntu Server" section on '
             'https://linuxcontainers.org/lxd/getting-started-cli/'
             '#ubuntu-desktop-and-ubuntu-server to enable a proper setup.\n')
+
+    @mock.patch('snapcraft.internal.repo.is_package_installed')
+    def test_cleanbuild_incremental(self, mock_installed):
+        mock_installed.return_value = True
+        fake_lxc = fixture_setup.FakeLXC()
+        self.useFixture(fake_lxc)
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        self.make_snapcraft_yaml()
+        open('main.c', 'w').close()
+
+        # Stand in for the snap the build in the container would make.
+        def fake_build(builder, project_dir):
+            snap_path = fake_lxc.volume_path(
+                builder._volume_name, 'snap-test_1.0_amd64.snap')
+            open(snap_path, 'w').close()
+            builder._pull_snap(project_dir)
+
+        with mock.patch('snapcraft.internal.lxd.IncrementalCleanbuilder.'
+                        '_build', autospec=True, side_effect=fake_build):
+            main(['cleanbuild', '--incremental'])
+
+        self.assertIn(
+            'Syncing project assets with the container\n'
+            'Waiting for a network connection...\n'
+            'Network connection established\n'
+            'Retrieved snap-test_1.0_amd64.snap\n',
+            fake_logger.output)
+        self.assertTrue(os.path.exists('snap-test_1.0_amd64.snap'))
+        self.assertFalse(os.path.exists('snap-test_1.0_source.tar'))
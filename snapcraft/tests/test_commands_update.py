@@ -18,8 +18,10 @@
 from collections import OrderedDict
 import logging
 import os
+from unittest import mock
 
 import fixtures
+import requests
 import yaml
 from xdg import BaseDirectory
 
@@ -67,6 +69,7 @@ class UpdateCommandTestCase(tests.TestWithFakeRemoteParts):
 
         expected_headers = {
             'If-Modified-Since': 'Thu, 07 Jul 2016 10:00:20 GMT',
+            'If-None-Match': '1111',
         }
 
         with open(self.parts_yaml) as parts_file:
@@ -104,3 +107,45 @@ class UpdateCommandTestCase(tests.TestWithFakeRemoteParts):
     def test_update_with_no_content_length_is_supported(self):
         self.useFixture(fixtures.EnvironmentVariable('NO_CONTENT_LENGTH', '1'))
         main.main(['update'])
+
+    def test_update_with_unchanged_etag_does_not_download_again(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        main.main(['update'])
+        with open(self.headers_yaml, 'w') as headers_file:
+            yaml.dump({'If-None-Match': '1111'}, headers_file)
+        main.main(['update'])
+
+        self.assertEqual(
+            'The parts cache is already up to date.\n',
+            fake_logger.output)
+
+    def test_update_without_parts_yaml_downloads_again(self):
+        main.main(['update'])
+        os.remove(self.parts_yaml)
+
+        main.main(['update'])
+
+        self.assertTrue(os.path.exists(self.parts_yaml))
+
+    def test_interrupted_update_keeps_parts_yaml(self):
+        main.main(['update'])
+        with open(self.parts_yaml) as parts_file:
+            parts = parts_file.read()
+        os.remove(self.headers_yaml)
+
+        def partial_download(request, destination, message):
+            with open(destination, 'w') as destination_file:
+                destination_file.write('partial')
+            raise requests.exceptions.ConnectionError()
+
+        with mock.patch('snapcraft.internal.parts.download_requests_stream',
+                        side_effect=partial_download):
+            with self.assertRaises(SystemExit):
+                main.main(['update'])
+
+        with open(self.parts_yaml) as parts_file:
+            self.assertEqual(parts, parts_file.read())
+        self.assertEqual(
+            ['parts.db', 'parts.yaml'], sorted(os.listdir(self.parts_dir)))
@@ -15,6 +15,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import subprocess
+from unittest import mock
+
+import fixtures
 
 from snapcraft.internal import common
 from snapcraft import tests
@@ -48,6 +52,96 @@ class CommonTestCase(tests.TestCase):
         self.assertFalse(common.isurl('/fo:o'))
 
 
+class RunTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, common, 'env', common.env)
+
+    def _get_from_shell(self, name):
+        return subprocess.check_output(
+            ['/bin/sh', '-c', '{}\nprintenv {}'.format(
+                common.assemble_env(), name)]).decode()[:-1]
+
+    def test_render_env_matches_the_shell(self):
+        self.useFixture(fixtures.EnvironmentVariable('FOO', 'foo'))
+        common.env = [
+            'PATH="/usr/local/my bin:$PATH"',
+            'LITERAL=\'$FOO "quoted"\'',
+            'BRACED=${FOO}bar',
+            'MIXED="$FOO"\'$FOO\'$FOO\\$FOO',
+            'ESCAPED="\\$FOO \\" \\a"',
+            'EMPTY=',
+            'UNSET=$NOT_SET:/a',
+            'FOO="$FOO:$FOO"',
+        ]
+
+        rendered_env = common.render_env()
+
+        for name in ('PATH', 'LITERAL', 'BRACED', 'MIXED', 'ESCAPED',
+                     'EMPTY', 'UNSET', 'FOO'):
+            self.assertEqual(self._get_from_shell(name), rendered_env[name],
+                             'Rendering {} differs'.format(name))
+
+    def test_render_env_needing_a_shell(self):
+        for entry in ('FOO=$(echo foo)', 'FOO=`echo foo`', 'FOO=a b',
+                      'FOO=${BAR:-bar}', 'FOO=*', 'echo FOO=BAR\n. setup'):
+            common.env = [entry]
+            self.assertIsNone(common.render_env(), entry)
+
+    def test_render_env_is_cached(self):
+        common.env = ['FOO=foo']
+        rendered_env = common.render_env()
+
+        self.assertIs(rendered_env, common.render_env())
+        common.env.append('BAR=bar')
+        self.assertIsNot(rendered_env, common.render_env())
+        self.assertEqual('bar', common.render_env()['BAR'])
+
+    @mock.patch('subprocess.check_call')
+    def test_run_does_not_use_a_shell(self, mock_call):
+        common.env = ['FOO="foo bar"']
+
+        common.run(['make', 'install'], cwd='/tmp')
+
+        mock_call.assert_called_once_with(
+            ['make', 'install'], cwd='/tmp', env=mock.ANY)
+        self.assertEqual('foo bar', mock_call.call_args[1]['env']['FOO'])
+
+    def test_run_output(self):
+        common.env = ['FOO="foo bar"', 'BAR=${FOO}baz']
+
+        self.assertEqual('foo barbaz', common.run_output(['printenv', 'BAR']))
+
+    def test_run_output_with_env_needing_a_shell(self):
+        common.env = ['FOO=$(echo foo)']
+
+        self.assertEqual('foo', common.run_output(['printenv', 'FOO']))
+
+    def test_run_command_not_found(self):
+        for env in ([], ['FOO=$(echo foo)']):
+            common.env = env
+            for run in (common.run, common.run_output):
+                with self.assertRaises(
+                        subprocess.CalledProcessError) as raised:
+                    run(['not-a-command'])
+                self.assertEqual(127, raised.exception.returncode)
+
+    def test_run_missing_cwd_is_not_command_not_found(self):
+        common.env = []
+
+        self.assertRaises(FileNotFoundError, common.run, ['true'],
+                          cwd='missing')
+
+    def test_run_output_points_pwd_to_cwd(self):
+        self.useFixture(fixtures.EnvironmentVariable('PWD', '/'))
+        os.mkdir('subdir')
+
+        self.assertEqual(
+            os.path.abspath('subdir'),
+            common.run_output(['printenv', 'PWD'], cwd='subdir'))
+
+
 class CommonMigratedTestCase(tests.TestCase):
 
     def test_parallel_build_count_migration_message(self):
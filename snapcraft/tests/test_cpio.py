@@ -0,0 +1,98 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import stat
+
+from snapcraft.internal import cpio
+from snapcraft import tests
+
+
+class CpioTestCase(tests.TestCase):
+
+    def _write(self, add):
+        fileobj = io.BytesIO()
+        writer = cpio.Writer(fileobj)
+        add(writer)
+        writer.close()
+        return fileobj.getvalue()
+
+    def test_write_and_read(self):
+        def add(writer):
+            writer.add(cpio.Entry(name='dir', mode=stat.S_IFDIR | 0o755))
+            writer.add(cpio.Entry(name='dir/file', mode=stat.S_IFREG | 0o644,
+                                  data=b'contents', mtime=42))
+
+        archive = self._write(add)
+
+        self.assertEqual(0, len(archive) % 512)
+        self.assertTrue(archive.startswith(b'070701'))
+        entries = list(cpio.read(io.BytesIO(archive)))
+        self.assertEqual(['dir', 'dir/file'], [e.name for e in entries])
+        self.assertEqual(b'contents', entries[1].data)
+        self.assertEqual(stat.S_IFREG | 0o644, entries[1].mode)
+        self.assertEqual(42, entries[1].mtime)
+        self.assertNotEqual(entries[0].ino, entries[1].ino)
+
+    def test_hard_links_keep_sharing_an_inode(self):
+        def add(writer):
+            writer.add(cpio.Entry(name='a', mode=stat.S_IFREG | 0o644,
+                                  ino=7, nlink=2))
+            writer.add(cpio.Entry(name='other', mode=stat.S_IFREG | 0o644,
+                                  ino=7))
+            writer.add(cpio.Entry(name='b', mode=stat.S_IFREG | 0o644,
+                                  data=b'data', ino=7, nlink=2))
+
+        entries = list(cpio.read(io.BytesIO(self._write(add))))
+
+        self.assertEqual(entries[0].ino, entries[2].ino)
+        self.assertNotEqual(entries[0].ino, entries[1].ino)
+
+    def test_add_path(self):
+        os.mkdir('dir')
+        with open(os.path.join('dir', 'file'), 'w') as f:
+            f.write('contents')
+        os.symlink('file', os.path.join('dir', 'link'))
+
+        def add(writer):
+            for name in ['dir', 'dir/file', 'dir/link']:
+                writer.add_path(name, name)
+
+        entries = list(cpio.read(io.BytesIO(self._write(add))))
+
+        self.assertTrue(stat.S_ISDIR(entries[0].mode))
+        self.assertEqual(b'contents', entries[1].data)
+        self.assertTrue(stat.S_ISLNK(entries[2].mode))
+        self.assertEqual(b'file', entries[2].data)
+
+    def test_read_truncated_archive(self):
+        def add(writer):
+            writer.add(cpio.Entry(name='file', mode=stat.S_IFREG | 0o644,
+                                  data=b'contents'))
+
+        archive = self._write(add)
+
+        with self.assertRaises(ValueError) as raised:
+            list(cpio.read(io.BytesIO(archive[:120])))
+
+        self.assertEqual('Truncated cpio archive', str(raised.exception))
+
+    def test_read_not_an_archive(self):
+        with self.assertRaises(ValueError) as raised:
+            list(cpio.read(io.BytesIO(b'0' * 512)))
+
+        self.assertEqual('Not a newc cpio archive', str(raised.exception))
@@ -0,0 +1,67 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015, 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import types
+
+import snapcraft
+from snapcraft import (
+    _lazy,
+    tests,
+)
+
+
+class DeferAttributesTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.module = types.ModuleType('snapcraft.fake')
+        sys.modules['snapcraft.fake'] = self.module
+        self.addCleanup(sys.modules.pop, 'snapcraft.fake')
+        _lazy.defer_attributes('snapcraft.fake', {
+            'common': ('snapcraft.common', None),
+            'humanize_list': ('snapcraft.formatting_utils', 'humanize_list'),
+        })
+
+    def test_deferred_module(self):
+        self.assertNotIn('common', vars(self.module))
+
+        common = self.module.common
+
+        self.assertIs(sys.modules['snapcraft.common'], common)
+        self.assertIn('common', vars(self.module))
+
+    def test_deferred_attribute(self):
+        humanize_list = self.module.humanize_list
+
+        self.assertIs(sys.modules['snapcraft.formatting_utils'].humanize_list,
+                      humanize_list)
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError) as raised:
+            self.module.unknown
+
+        self.assertEqual(
+            "module 'snapcraft.fake' has no attribute 'unknown'",
+            str(raised.exception))
+
+    def test_dir_lists_deferred_attributes(self):
+        self.assertIn('humanize_list', dir(self.module))
+
+    def test_snapcraft_submodules_are_reachable(self):
+        config = snapcraft.config
+
+        self.assertIs(sys.modules['snapcraft.config'], config)
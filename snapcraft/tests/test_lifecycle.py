@@ -570,3 +570,39 @@ grade: stable
         self.assertEqual(
             "The 'pull' step of 'part1' is out of date. Please clean that "
             "part's 'pull' step in order to rebuild", str(raised.exception))
+
+    @mock.patch('snapcraft.repo.install_build_packages')
+    @mock.patch('snapcraft.internal.cache.CompilerCache.get_stats')
+    def test_build_with_ccache_logs_stats(
+            self, mock_get_stats, mock_install_build_packages):
+        self.make_snapcraft_yaml("""parts:
+  part1:
+    plugin: nil
+""")
+        mock_get_stats.side_effect = [
+            {'cache hit (direct)': 2, 'cache hit (preprocessed)': 1,
+             'cache miss': 4},
+            {'cache hit (direct)': 8, 'cache hit (preprocessed)': 1,
+             'cache miss': 6},
+        ]
+
+        lifecycle.execute('build', snapcraft.ProjectOptions(use_ccache=True))
+
+        mock_install_build_packages.assert_called_once_with(['ccache'])
+        self.assertIn(
+            'Compiler cache: 6 hits, 2 misses (75% hit rate)\n',
+            self.fake_logger.output)
+
+    @mock.patch('snapcraft.repo.install_build_packages')
+    @mock.patch('snapcraft.internal.cache.CompilerCache.get_stats')
+    def test_pull_with_ccache_does_not_log_stats(
+            self, mock_get_stats, mock_install_build_packages):
+        self.make_snapcraft_yaml("""parts:
+  part1:
+    plugin: nil
+""")
+
+        lifecycle.execute('pull', snapcraft.ProjectOptions(use_ccache=True))
+
+        self.assertFalse(mock_get_stats.called)
+        self.assertNotIn('Compiler cache', self.fake_logger.output)
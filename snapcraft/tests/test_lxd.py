@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import os
+import tarfile
 from subprocess import CalledProcessError
 from unittest.mock import (
     call,
@@ -25,6 +27,7 @@ import fixtures
 
 from snapcraft.internal import lxd
 from snapcraft import tests
+from snapcraft.tests import fixture_setup
 from snapcraft._options import ProjectOptions  # noqa
 
 
@@ -126,3 +129,127 @@ class LXDTestCase(tests.TestCase):
                              project_options).execute()
 
         self.assertNotIn(['bash', '-i'], call_list)
+
+
+class IncrementalCleanbuilderTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fake_lxc = fixture_setup.FakeLXC()
+        self.useFixture(self.fake_lxc)
+        self.project_options = ProjectOptions()
+        self.base_name = 'snapcraft-base-xenial-{}'.format(
+            self.project_options.deb_arch)
+
+        with open('main.c', 'w') as f:
+            f.write('int main() {}')
+        os.mkdir('parts')
+        open(os.path.join('parts', 'built'), 'w').close()
+
+    def _tar_filter(self, tarinfo):
+        if (tarinfo.name.startswith('./parts') or
+                tarinfo.name.endswith('.snap')):
+            return None
+        return tarinfo
+
+    def _execute(self):
+        builder = lxd.IncrementalCleanbuilder(
+            'snap.snap', 'project.tar', self.project_options,
+            project_name='my-snap', tar_filter=self._tar_filter)
+        # Stand in for the snap the build in the container would make.
+        snap_path = self.fake_lxc.volume_path(
+            builder._volume_name, 'snap.snap')
+        os.makedirs(os.path.dirname(snap_path), exist_ok=True)
+        open(snap_path, 'w').close()
+
+        calls_count = len(self.fake_lxc.calls)
+        builder.execute()
+        return builder, self.fake_lxc.calls[calls_count:]
+
+    def _get_synced_names(self, builder):
+        with tarfile.open(os.path.join(
+                self.fake_lxc.path, 'fs', 'containers',
+                builder._container_name, 'root', 'project.tar')) as t:
+            return sorted(t.getnames())
+
+    def test_first_build_prepares_base_container(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        builder, calls = self._execute()
+
+        self.assertIn(['launch', 'ubuntu:xenial/{}'.format(
+            self.project_options.deb_arch), self.base_name], calls)
+        self.assertIn(['exec', self.base_name, '--', 'apt-get', 'install',
+                       '-y', 'snapcraft', 'build-essential', 'bzr', 'git',
+                       'mercurial', 'subversion'], calls)
+        self.assertIn(['snapshot', self.base_name, 'ready'], calls)
+        # The clone upgrades snapcraft, the base container gets old.
+        self.assertIn(['exec', builder._container_name, '--', 'apt-get',
+                       'install', '-y', 'snapcraft'], calls)
+        self.assertIn(['storage', 'volume', 'create', 'default',
+                       builder._volume_name], calls)
+        self.assertIn(['copy', '-e', '{}/ready'.format(self.base_name),
+                       builder._container_name], calls)
+        self.assertIn(['exec', builder._container_name, '--', 'sh', '-c',
+                       'cd "$0" && exec "$@"', '/root/build', 'snapcraft',
+                       'snap', '--output', 'snap.snap'], calls)
+        self.assertEqual(['stop', '-f', builder._container_name], calls[-1])
+        self.assertEqual(['.', './main.c'], self._get_synced_names(builder))
+        self.assertFalse(os.path.exists('project.tar'))
+        self.assertTrue(os.path.exists('snap.snap'))
+        self.assertIn('Retrieved snap.snap\n', fake_logger.output)
+
+    def test_later_builds_reuse_base_container_and_sync_changes(self):
+        self._execute()
+        os.utime('main.c', (0, 0))
+        open('new.c', 'w').close()
+
+        builder, calls = self._execute()
+
+        self.assertNotIn(['launch', 'ubuntu:xenial/{}'.format(
+            self.project_options.deb_arch), self.base_name], calls)
+        self.assertFalse(any(
+            call[:3] == ['storage', 'volume', 'create'] for call in calls))
+        self.assertFalse(any(
+            call[:2] == ['exec', self.base_name] for call in calls))
+        self.assertEqual(['.', './main.c', './new.c'],
+                         self._get_synced_names(builder))
+
+        builder, calls = self._execute()
+
+        self.assertEqual(['.'], self._get_synced_names(builder))
+
+        os.remove('new.c')
+        builder, calls = self._execute()
+
+        self.assertIn(['exec', builder._container_name, '--', 'rm', '-rf',
+                       '--', '/root/build/.snapcraft-cleanbuild.json',
+                       '/root/build/new.c'], calls)
+
+    def test_failed_base_container_is_removed(self):
+        with patch('snapcraft.internal.lxd.Cleanbuilder._wait_for_network',
+                   side_effect=CalledProcessError(1, ['python3'])):
+            with self.assertRaises(CalledProcessError):
+                self._execute()
+
+        self.assertIn(['delete', '-f', self.base_name], self.fake_lxc.calls)
+        self.assertFalse(any(
+            call[0] == 'copy' for call in self.fake_lxc.calls))
+
+    def test_delete_project_volume(self):
+        builder, calls = self._execute()
+
+        lxd.delete_project_volume('my-snap', self.project_options)
+
+        self.assertEqual(['storage', 'volume', 'delete', 'default',
+                          builder._volume_name], self.fake_lxc.calls[-1])
+        self.assertFalse(os.path.exists(
+            self.fake_lxc.volume_path(builder._volume_name)))
+
+        calls_count = len(self.fake_lxc.calls)
+        lxd.delete_project_volume('my-snap', self.project_options)
+
+        self.assertFalse(any(
+            call[:3] == ['storage', 'volume', 'delete']
+            for call in self.fake_lxc.calls[calls_count:]))
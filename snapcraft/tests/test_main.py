@@ -15,6 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import os
+import subprocess
+import sys
 from unittest import mock
 
 import fixtures
@@ -32,7 +35,7 @@ class TestMain(TestCase):
             snapcraft.main.main([])
             mock_project_options.assert_called_once_with(
                 debug=False, parallel_builds=True, target_deb_arch=None,
-                use_geoip=False)
+                use_geoip=False, use_ccache=False)
             self.assertTrue(mock_cmd.called, mock_cmd.called)
 
     @mock.patch('snapcraft.internal.lifecycle.snap')
@@ -42,7 +45,7 @@ class TestMain(TestCase):
             self.assertTrue(mock_cmd.called, mock_cmd.called)
             mock_project_options.assert_called_once_with(
                 debug=False, parallel_builds=True, target_deb_arch=None,
-                use_geoip=True)
+                use_geoip=True, use_ccache=False)
 
     def test_command_error(self):
         fake_logger = fixtures.FakeLogger(level=logging.ERROR)
@@ -77,7 +80,7 @@ class TestMain(TestCase):
             snapcraft.main.main(['--debug'])
             mock_project_options.assert_called_once_with(
                 debug=True, parallel_builds=True, target_deb_arch=None,
-                use_geoip=False)
+                use_geoip=False, use_ccache=False)
 
     @mock.patch('snapcraft.internal.lifecycle.snap')
     def test_command_with_parallel_builds(self, mock_cmd):
@@ -85,7 +88,7 @@ class TestMain(TestCase):
             snapcraft.main.main([])
             mock_project_options.assert_called_once_with(
                 debug=False, parallel_builds=True, target_deb_arch=None,
-                use_geoip=False)
+                use_geoip=False, use_ccache=False)
 
     @mock.patch('snapcraft.internal.lifecycle.snap')
     def test_command_disable_parallel_build(self, mock_cmd):
@@ -93,7 +96,15 @@ class TestMain(TestCase):
             snapcraft.main.main(['--no-parallel-build'])
             mock_project_options.assert_called_once_with(
                 debug=False, parallel_builds=False, target_deb_arch=None,
-                use_geoip=False)
+                use_geoip=False, use_ccache=False)
+
+    @mock.patch('snapcraft.internal.lifecycle.snap')
+    def test_command_enable_ccache(self, mock_cmd):
+        with mock.patch('snapcraft.ProjectOptions') as mock_project_options:
+            snapcraft.main.main(['--enable-ccache'])
+            mock_project_options.assert_called_once_with(
+                debug=False, parallel_builds=True, target_deb_arch=None,
+                use_geoip=False, use_ccache=True)
 
     @mock.patch('snapcraft.internal.lifecycle.snap')
     def test_command_with_target_deb_arch(self, mock_cmd):
@@ -101,4 +112,55 @@ class TestMain(TestCase):
             snapcraft.main.main(['--target-arch', 'arm64'])
             mock_project_options.assert_called_once_with(
                 debug=False, parallel_builds=True, target_deb_arch='arm64',
-                use_geoip=False)
+                use_geoip=False, use_ccache=False)
+
+
+class StartupTestCase(TestCase):
+    """Keep what commands that need little of snapcraft import in check."""
+
+    # Modules that take long to import and are of no use to these commands.
+    costly_modules = [
+        'apt',
+        'jsonschema',
+        'requests',
+        'snapcraft._baseplugin',
+        'snapcraft._store',
+        'snapcraft.internal.lifecycle',
+        'snapcraft.internal.parts',
+        'snapcraft.internal.project_loader',
+        'snapcraft.internal.repo',
+        'snapcraft.plugins',
+        'snapcraft.storeapi',
+    ]
+
+    def get_imported_modules(self, argv):
+        script = '\n'.join([
+            'import sys',
+            'import snapcraft.main',
+            'try:',
+            '    snapcraft.main.main({!r})'.format(argv),
+            'except SystemExit:',
+            '    pass',
+            'print("\\n".join(sys.modules))',
+        ])
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(
+            os.path.dirname(os.path.abspath(snapcraft.__file__)))
+        output = subprocess.check_output(
+            [sys.executable, '-c', script], env=env,
+            stderr=subprocess.DEVNULL)
+        return set(output.decode().splitlines())
+
+    def test_version_imports_little(self):
+        imported_modules = self.get_imported_modules(['--version'])
+
+        self.assertIn('snapcraft._version', imported_modules)
+        for module in self.costly_modules:
+            self.assertNotIn(module, imported_modules)
+
+    def test_list_plugins_does_not_import_the_store(self):
+        imported_modules = self.get_imported_modules(['list-plugins'])
+
+        for module in ('requests', 'snapcraft._store', 'snapcraft.storeapi',
+                       'snapcraft.internal.lifecycle'):
+            self.assertNotIn(module, imported_modules)
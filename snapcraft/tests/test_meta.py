@@ -454,8 +454,8 @@ PATH={0}/part1/install/usr/bin:{0}/part1/install/bin
         with open(os.path.join(self.snap_dir, relative_exe_path), 'rb') as exe:
             self.assertEqual(exe_contents, exe.read())
 
-    @patch('snapcraft.internal.common.run')
-    def test_exe_is_in_path(self, run_mock):
+    @patch('shutil.which')
+    def test_exe_is_in_path(self, which_mock):
         app_path = os.path.join(self.snap_dir, 'bin', 'app1')
         os.mkdir(os.path.dirname(app_path))
         open(app_path, 'w').close()
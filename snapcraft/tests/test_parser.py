@@ -14,14 +14,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
 import os
+import tracemalloc
 from unittest import mock
 
 import requests
 import fixtures
 import yaml
 from collections import OrderedDict
+from xdg import BaseDirectory
 
 import snapcraft                           # noqa, initialize yaml
 from snapcraft.internal.errors import MissingCommandError
@@ -59,7 +62,9 @@ def _get_part_list_count(path=PARTS_FILE):
 
 class TestParserBaseDir(TestCase):
     def test__get_base_dir(self):
-        self.assertEqual('/tmp', parser._get_base_dir())
+        self.assertEqual(
+            os.path.join(BaseDirectory.xdg_cache_home, 'snapcraft', 'parser'),
+            parser._get_base_dir())
 
 
 class TestParser(TestCase):
@@ -494,6 +499,79 @@ parts: [main2]
 
         self.assertEqual(2, _get_part_list_count())
 
+    @mock.patch('snapcraft.internal.parser._get_origin_data')
+    def test_origin_is_fetched_once(self, mock_get_origin_data):
+        _create_example_output("""
+---
+maintainer: John Doe <john.doe@example.com
+origin: lp:snapcraft-parser-example
+description: example
+parts: [main]
+---
+maintainer: John Doe <john.doe@example.com
+origin: lp:snapcraft-parser-example
+description: example
+parts: [main2]
+---
+maintainer: John Doe <john.doe@example.com
+origin: lp:other-snapcraft-parser-example
+description: example
+parts: [main3]
+""")
+        mock_get_origin_data.return_value = {
+            'parts': {
+                name: {'source': 'lp:project', 'plugin': 'copy'}
+                for name in ('main', 'main2', 'main3')
+            }
+        }
+        main(['--index', TEST_OUTPUT_PATH])
+
+        self.assertEqual(3, _get_part_list_count())
+        self.assertEqual(
+            [mock.call('lp:other-snapcraft-parser-example', source_type=None),
+             mock.call('lp:snapcraft-parser-example', source_type=None)],
+            sorted(self.mock_get.call_args_list))
+
+    @mock.patch('snapcraft.internal.parser._get_origin_data')
+    def test_git_origin_is_shallow(self, mock_get_origin_data):
+        _create_example_output("""
+---
+maintainer: John Doe <john.doe@example.com
+origin: https://github.com/example/example.git
+description: example
+parts: [main]
+""")
+        mock_get_origin_data.return_value = {
+            'parts': {'main': {'source': '.', 'plugin': 'copy'}}}
+
+        with mock.patch('snapcraft.internal.sources.Git') as mock_git:
+            self.mock_get.return_value = mock_git
+            main(['--index', TEST_OUTPUT_PATH])
+
+        self.assertEqual(1, mock_git.call_args[1]['source_depth'])
+        mock_git.return_value.pull.assert_called_once_with()
+
+    @mock.patch('snapcraft.internal.parser._get_origin_data')
+    def test_fetch_timings_are_logged(self, mock_get_origin_data):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+        _create_example_output("""
+---
+maintainer: John Doe <john.doe@example.com
+origin: lp:snapcraft-parser-example
+description: example
+parts: [main]
+""")
+        mock_get_origin_data.return_value = {
+            'parts': {'main': {'source': 'lp:project', 'plugin': 'copy'}}}
+
+        main(['--index', TEST_OUTPUT_PATH])
+
+        self.assertRegex(
+            fake_logger.output,
+            r'Processed 1 origins in [0-9.]+s\n'
+            r'  [0-9.]+s lp:snapcraft-parser-example\n')
+
     @mock.patch('snapcraft.internal.parser._get_origin_data')
     def test_maintaner_is_included(self, mock_get_origin_data):
         """Test maintainer is included in parsed parts."""
@@ -795,8 +873,7 @@ description: example
 parts: [somepart]
 """.format(origin_url=origin_url))
 
-        origin_dir = os.path.join(parser._get_base_dir(),
-                                  _encode_origin(origin_url))
+        origin_dir = parser._get_origin_dir(origin_url, None)
         os.makedirs(origin_dir, exist_ok=True)
 
         # Create a fake snapcraft.yaml for _get_origin_data() to parse
@@ -825,8 +902,7 @@ description: example
 parts: [somepart]
 """.format(origin_url=origin_url))
 
-        origin_dir = os.path.join(parser._get_base_dir(),
-                                  _encode_origin(origin_url))
+        origin_dir = parser._get_origin_dir(origin_url, None)
         os.makedirs(origin_dir, exist_ok=True)
 
         # Create a fake snapcraft.yaml for _get_origin_data() to parse
@@ -1005,6 +1081,52 @@ parts: [app1]
 
         self.assertEqual('lptestusertestprojecttestbranch', origin_dir)
 
+    def test__get_origin_dir_is_unique_per_origin_and_type(self):
+        origin_dirs = {
+            parser._get_origin_dir('lp:a/b', None),
+            parser._get_origin_dir('lp:ab', None),
+            parser._get_origin_dir('lp:ab', 'bzr'),
+        }
+
+        self.assertEqual(3, len(origin_dirs))
+        for origin_dir in origin_dirs:
+            self.assertEqual(self.tempdir_path, os.path.dirname(origin_dir))
+            self.assertTrue(os.path.basename(origin_dir).startswith('lpab-'))
+        self.assertEqual(parser._get_origin_dir('lp:ab', None),
+                         parser._get_origin_dir('lp:ab', None))
+
+
+class WikiEntriesTestCase(TestCase):
+
+    def test_entries_are_split(self):
+        index_file = io.BytesIO(
+            b'{{{\n---\na: 1\n---\n\nb: 2\r\nc: 3\n---\n}}}\n')
+
+        self.assertEqual(
+            ['\na: 1', '\n\nb: 2\nc: 3'],
+            list(parser._iter_wiki_entries(index_file)))
+
+    def test_large_wiki_is_streamed(self):
+        entry = (b'---\n'
+                 b'maintainer: John Doe <john.doe@example.com>\n'
+                 b'origin: lp:snapcraft-parser-example\n'
+                 b'description: example\n'
+                 b'parts: [main]\n')
+        with open('wiki', 'wb') as f:
+            for i in range(100000):
+                f.write(entry)
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        with open('wiki', 'rb') as index_file:
+            count = sum(1 for e in parser._iter_wiki_entries(index_file))
+        current, peak = tracemalloc.get_traced_memory()
+
+        self.assertEqual(100000, count)
+        # The wiki is over 10MB, entries are read one at a time.
+        self.assertGreater(os.path.getsize('wiki'), 10 * 1024 * 1024)
+        self.assertLess(peak, 1024 * 1024)
+
 
 class MissingAssetsTestCase(TestCase):
 
@@ -1032,6 +1154,7 @@ parts: [main]
 """)
         with self.assertRaises(FileNotFoundError):
             main(['--debug', '--index', TEST_OUTPUT_PATH])
+        self.assertFalse(os.path.exists(PARTS_FILE + '.partial'))
 
     def test_missing_packages(self):
         self.mock_check_command.side_effect = MissingCommandError('bzr')
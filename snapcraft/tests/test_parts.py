@@ -15,14 +15,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import os
 import unittest
 import unittest.mock
 
 import fixtures
+import yaml
 
 import snapcraft
 from snapcraft.internal import dirs
+from snapcraft.internal import parts
 from snapcraft.internal import project_loader
+from snapcraft.internal.errors import SnapcraftPartMissingError
 from snapcraft import tests
 
 
@@ -79,3 +83,54 @@ parts:
                 'part/1')
             in fake_logger.output,
             'Missing slash deprecation warning in output')
+
+
+class RemotePartsTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.parts_yaml = parts.get_remote_parts_path()
+        os.makedirs(os.path.dirname(self.parts_yaml))
+        self.write_parts_yaml({
+            'curl': {'plugin': 'autotools', 'source': 'http://curl.org',
+                     'description': 'test entry for curl',
+                     'maintainer': 'none'},
+            'multiline-part': {'plugin': 'go', 'source': 'http://source',
+                               'description': 'multiline\ndescription',
+                               'maintainer': 'none'},
+        })
+
+    def write_parts_yaml(self, remote_parts):
+        with open(self.parts_yaml, 'w') as parts_file:
+            yaml.dump(remote_parts, parts_file)
+
+    def test_get_part_from_existing_parts_yaml(self):
+        self.assertEqual(
+            {'plugin': 'autotools', 'source': 'http://curl.org'},
+            parts.get_remote_parts().get_part('curl'))
+
+    def test_get_missing_part_raises(self):
+        with self.assertRaises(SnapcraftPartMissingError):
+            parts.get_remote_parts().get_part('missing')
+
+    def test_modified_parts_yaml_is_indexed_again(self):
+        parts.get_remote_parts()
+        self.write_parts_yaml({'wget': {
+            'plugin': 'make', 'description': 'wget', 'maintainer': 'none'}})
+
+        remote_parts = parts.get_remote_parts()
+
+        self.assertEqual({'plugin': 'make'}, remote_parts.get_part('wget'))
+        with self.assertRaises(SnapcraftPartMissingError):
+            remote_parts.get_part('curl')
+
+    def test_matches_for(self):
+        remote_parts = parts.get_remote_parts()
+
+        for query, expected in (('curl', ['curl']),
+                                ('mulitline-part', ['multiline-part']),
+                                ('ur', ['curl']),
+                                ('', ['curl', 'multiline-part'])):
+            with self.subTest(query=query):
+                matches, max_len = remote_parts.matches_for(query)
+                self.assertEqual(expected, sorted(matches))
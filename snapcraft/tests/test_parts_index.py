@@ -0,0 +1,102 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2016 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+
+from snapcraft.internal import parts_index
+from snapcraft import tests
+
+
+class PartsIndexTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        open('parts.yaml', 'w').close()
+        self.index = parts_index.PartsIndex('parts.db')
+        self.addCleanup(self.index.close)
+
+    def test_get(self):
+        self.index.compile({'curl': {'plugin': 'autotools'}}, 'parts.yaml')
+
+        self.assertEqual({'plugin': 'autotools'}, self.index.get('curl'))
+        self.assertIsNone(self.index.get('wget'))
+
+    def test_is_current(self):
+        self.assertFalse(self.index.is_current('parts.yaml'))
+
+        self.index.compile({}, 'parts.yaml')
+        self.assertTrue(self.index.is_current('parts.yaml'))
+
+        with open('parts.yaml', 'w') as f:
+            f.write('curl: {}\n')
+        self.assertFalse(self.index.is_current('parts.yaml'))
+
+    def test_corrupted_index_is_not_current(self):
+        with open('parts.db', 'w') as f:
+            f.write('garbage')
+
+        self.assertFalse(self.index.is_current('parts.yaml'))
+
+    def test_candidates_for(self):
+        self.index.compile(
+            {name: {} for name in ('curl', 'libcurl', 'wget', 'go')},
+            'parts.yaml')
+
+        self.assertEqual(
+            ['curl', 'libcurl'],
+            sorted(self.index.candidates_for('curl', 0.6)))
+        self.assertEqual(['go'], self.index.candidates_for('gox', 0.6))
+        # Too short to be indexed, every part could match.
+        self.assertEqual(
+            ['curl', 'go', 'libcurl', 'wget'],
+            sorted(self.index.candidates_for('ur', 0.6)))
+
+    def test_candidates_for_similar_names_without_shared_trigrams(self):
+        self.index.compile(
+            {name: {} for name in ('XaXbXcXd', 'XaXbXcX', 'wget')},
+            'parts.yaml')
+
+        # SequenceMatcher('XaXbXcXd', 'abcd').ratio() is 0.67.
+        self.assertEqual(
+            ['XaXbXcXd'], self.index.candidates_for('abcd', 0.6))
+        # SequenceMatcher('XaXbXcX', 'abc').ratio() is exactly 0.6.
+        self.assertEqual(
+            ['XaXbXcX'], self.index.candidates_for('abc', 0.6))
+        self.assertEqual([], self.index.candidates_for('abc', 0.61))
+
+    def _make_name(self, i):
+        number = int(hashlib.sha1(str(i).encode()).hexdigest(), 16)
+        letters = []
+        for _ in range(10):
+            number, letter = divmod(number, 26)
+            letters.append(chr(ord('a') + letter))
+        return ''.join(letters)
+
+    def test_large_index(self):
+        names = [self._make_name(i) for i in range(50000)]
+        self.index.compile(
+            {name: {'plugin': 'nil', 'description': name} for name in names},
+            'parts.yaml')
+
+        self.assertEqual(
+            {'plugin': 'nil', 'description': names[25000]},
+            self.index.get(names[25000]))
+        # Searching only looks at a small fraction of the parts.
+        candidates = self.index.candidates_for(names[25000], 0.6)
+        self.assertIn(names[25000], candidates)
+        self.assertLess(len(candidates), len(names) / 10)
+        self.assertTrue(os.path.exists('parts.db'))
@@ -16,12 +16,16 @@
 
 import os
 import os.path
+import shutil
 import subprocess
 import builtins
 
 from unittest import mock
 
+import fixtures
+
 import snapcraft
+from snapcraft.internal import common
 from snapcraft.plugins import catkin
 from snapcraft import (
     repo,
@@ -447,7 +451,7 @@ class CatkinPluginTestCase(tests.TestCase):
                    run_output_mock, bashrun_mock, run_mock):
         plugin = catkin.CatkinPlugin('test-part', self.properties,
                                      self.project_options)
-        os.makedirs(os.path.join(plugin.sourcedir, 'src'))
+        self._write_package(plugin, 'my_package')
 
         plugin.build()
 
@@ -461,14 +465,19 @@ class CatkinPluginTestCase(tests.TestCase):
                 return (
                     args[0] == 'catkin_make_isolated' and
                     '--install' in command and
-                    '--pkg my_package' in command and
                     '--directory {}'.format(plugin.builddir) in command and
                     '--install-space {}'.format(plugin.rosdir) in command and
                     '--source-space {}'.format(os.path.join(
-                        plugin.builddir,
-                        plugin.options.source_space)) in command)
+                        plugin.partdir, 'catkin', 'src',
+                        'my_package')) in command)
 
-        bashrun_mock.assert_called_with(check_build_command())
+        bashrun_mock.assert_called_with(check_build_command(), env={
+            'DESTDIR': os.path.join(
+                plugin.partdir, 'catkin', 'installed', 'my_package')})
+        self.assertEqual(
+            os.path.join(plugin.builddir, 'src', 'my_package'),
+            os.readlink(os.path.join(plugin.partdir, 'catkin', 'src',
+                                     'my_package', 'my_package')))
 
         self.assertFalse(
             self.dependencies_mock.called,
@@ -487,22 +496,13 @@ class CatkinPluginTestCase(tests.TestCase):
 
         plugin = catkin.CatkinPlugin('test-part', self.properties,
                                      self.project_options)
-        os.makedirs(os.path.join(plugin.sourcedir, 'src'))
+        self._write_package(plugin, 'my_package')
+        self._write_package(plugin, 'package_2')
 
         plugin.build()
 
-        class check_pkg_arguments():
-            def __init__(self, test):
-                self.test = test
-
-            def __eq__(self, args):
-                index = args.index('--pkg')
-                packages = args[index+1:index+3]
-                self.test.assertIn('my_package', packages)
-                self.test.assertIn('package_2', packages)
-                return True
-
-        bashrun_mock.assert_called_with(check_pkg_arguments(self))
+        packages = self._get_built_packages(bashrun_mock)
+        self.assertEqual(['my_package', 'package_2'], sorted(packages))
 
         self.assertFalse(
             self.dependencies_mock.called,
@@ -510,12 +510,259 @@ class CatkinPluginTestCase(tests.TestCase):
 
         finish_build_mock.assert_called_once_with()
 
+    def _write_package(self, plugin, name, dependencies=()):
+        package_path = os.path.join(
+            plugin.builddir, plugin.options.source_space, name)
+        os.makedirs(package_path, exist_ok=True)
+        with open(os.path.join(package_path, 'package.xml'), 'w') as f:
+            f.write('<package format="2"><name>{}</name>{}</package>'.format(
+                name, ''.join('<depend>{}</depend>'.format(d)
+                              for d in dependencies)))
+
+    def _get_built_packages(self, bashrun_mock):
+        return [os.path.basename(args[args.index('--source-space') + 1])
+                for (args,), kwargs in bashrun_mock.call_args_list]
+
+    def _fake_catkin_make_isolated(self, plugin):
+        def catkin_make_isolated(args, env):
+            package_name = os.path.basename(
+                args[args.index('--source-space') + 1])
+            installed_file = os.path.join(
+                env['DESTDIR'], plugin.rosdir.lstrip(os.sep), 'lib',
+                package_name)
+            os.makedirs(os.path.dirname(installed_file), exist_ok=True)
+            open(installed_file, 'w').close()
+        return catkin_make_isolated
+
+    @mock.patch.object(catkin.CatkinPlugin, '_run_in_bash')
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_in_dependency_order(self, run_output_mock,
+                                                       bashrun_mock):
+        self.properties.catkin_packages = ['a', 'b', 'c']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a', ['b', 'roscpp'])
+        self._write_package(plugin, 'b', ['c'])
+        self._write_package(plugin, 'c')
+
+        plugin._build_catkin_packages()
+
+        packages = self._get_built_packages(bashrun_mock)
+        self.assertEqual(['c', 'b', 'a'], packages)
+        args = bashrun_mock.call_args[0][0]
+        self.assertIn(
+            '-j{}'.format(plugin.parallel_build_count), args)
+        self.assertEqual(
+            os.path.join(plugin.partdir, 'catkin', 'build', 'a'),
+            args[args.index('--build-space') + 1])
+        self.assertEqual(
+            os.path.join(plugin.partdir, 'catkin', 'devel', 'a'),
+            args[args.index('--devel-space') + 1])
+
+    @mock.patch.object(catkin.CatkinPlugin, '_run_in_bash')
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_missing_package(self, run_output_mock,
+                                                   bashrun_mock):
+        self.properties.catkin_packages = ['a', 'b']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a')
+
+        with self.assertRaises(RuntimeError) as raised:
+            plugin._build_catkin_packages()
+
+        self.assertEqual(
+            "Unable to find Catkin packages in the source space: 'b'",
+            str(raised.exception))
+        bashrun_mock.assert_not_called()
+
+    @mock.patch.object(catkin.CatkinPlugin, '_run_in_bash')
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_circular_dependency(self, run_output_mock,
+                                                       bashrun_mock):
+        self.properties.catkin_packages = ['a', 'b']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a', ['b'])
+        self._write_package(plugin, 'b', ['a'])
+
+        with self.assertRaises(RuntimeError) as raised:
+            plugin._build_catkin_packages()
+
+        self.assertEqual(
+            "Circular dependency between Catkin packages: 'a' and 'b'",
+            str(raised.exception))
+        bashrun_mock.assert_not_called()
+
+    @mock.patch.object(catkin.CatkinPlugin, '_run_in_bash')
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_reuses_unchanged(self, run_output_mock,
+                                                    bashrun_mock):
+        self.properties.catkin_packages = ['a', 'b']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a', ['b'])
+        self._write_package(plugin, 'b')
+        bashrun_mock.side_effect = self._fake_catkin_make_isolated(plugin)
+
+        plugin._build_catkin_packages()
+        self.assertEqual(2, bashrun_mock.call_count)
+
+        # A new build starts off a clean install directory.
+        shutil.rmtree(plugin.installdir)
+        bashrun_mock.reset_mock()
+
+        plugin._build_catkin_packages()
+
+        bashrun_mock.assert_not_called()
+        for package_name in ('a', 'b'):
+            installed_file = os.path.join(plugin.rosdir, 'lib', package_name)
+            self.assertTrue(os.path.isfile(installed_file))
+            # What is reused is copied, as it is rewritten in place.
+            self.assertEqual(1, os.stat(installed_file).st_nlink)
+
+    @mock.patch.object(catkin.CatkinPlugin, '_run_in_bash')
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_rebuilds_dependents(self, run_output_mock,
+                                                       bashrun_mock):
+        self.properties.catkin_packages = ['a', 'b', 'c']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a', ['b'])
+        self._write_package(plugin, 'b')
+        self._write_package(plugin, 'c')
+        bashrun_mock.side_effect = self._fake_catkin_make_isolated(plugin)
+
+        plugin._build_catkin_packages()
+        bashrun_mock.reset_mock()
+
+        with open(os.path.join(plugin.builddir, 'src', 'b', 'b.cpp'),
+                  'w') as f:
+            f.write('int main() {}')
+        plugin._build_catkin_packages()
+
+        packages = self._get_built_packages(bashrun_mock)
+        self.assertEqual(['b', 'a'], packages)
+
+    def _install_fake_catkin_make_isolated(self):
+        # Installs a file named after the package, through DESTDIR, and logs
+        # the packages it built.
+        bin_dir = os.path.join(self.path, 'fake-bin')
+        os.makedirs(bin_dir)
+        build_log = os.path.join(self.path, 'built.log')
+        script = os.path.join(bin_dir, 'catkin_make_isolated')
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    'while [ $# -gt 0 ]; do\n'
+                    '    case "$1" in\n'
+                    '        --source-space) source_space=$2; shift ;;\n'
+                    '        --install-space) install_space=$2; shift ;;\n'
+                    '    esac\n'
+                    '    shift\n'
+                    'done\n'
+                    'package=$(basename "$source_space")\n'
+                    'mkdir -p "$DESTDIR$install_space/lib"\n'
+                    'echo "$package $CFLAGS" > '
+                    '"$DESTDIR$install_space/lib/$package"\n'
+                    'echo "$package" >> {}\n'.format(build_log))
+        os.chmod(script, 0o755)
+        self.useFixture(fixtures.EnvironmentVariable(
+            'PATH', '{}:{}'.format(bin_dir, os.environ['PATH'])))
+        self.addCleanup(setattr, common, 'env', common.env)
+        common.env = []
+
+        # Keep the build output out of the test output.
+        def run(plugin, cmd, **kwargs):
+            return snapcraft.BasePlugin.run(
+                plugin, cmd, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, **kwargs)
+        patcher = mock.patch.object(
+            catkin.CatkinPlugin, 'run', autospec=True, side_effect=run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('sys.stdout')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def get_built():
+            if not os.path.exists(build_log):
+                return []
+            with open(build_log) as f:
+                built = f.read().split()
+            os.remove(build_log)
+            return built
+        return get_built
+
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_merges_and_restores_on_disk(
+            self, run_output_mock):
+        get_built = self._install_fake_catkin_make_isolated()
+        self.properties.catkin_packages = ['a', 'b']
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'a', ['b'])
+        self._write_package(plugin, 'b')
+
+        plugin._build_catkin_packages()
+
+        self.assertEqual(['b', 'a'], get_built())
+        installed_file = os.path.join(plugin.rosdir, 'lib', 'a')
+        with open(installed_file) as f:
+            self.assertEqual('a \n', f.read())
+        self.assertEqual(1, os.stat(installed_file).st_nlink)
+
+        # Rewriting what got installed, as _finish_build does, leaves what
+        # is reused alone.
+        with open(installed_file, 'w') as f:
+            f.write('rewritten')
+        shutil.rmtree(plugin.installdir)
+
+        plugin._build_catkin_packages()
+
+        self.assertEqual([], get_built())
+        with open(installed_file) as f:
+            self.assertEqual('a \n', f.read())
+        self.assertTrue(os.path.isfile(
+            os.path.join(plugin.rosdir, 'lib', 'b')))
+
+    @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
+    def test_build_catkin_packages_rebuilds_on_environment_changes(
+            self, run_output_mock):
+        get_built = self._install_fake_catkin_make_isolated()
+        plugin = catkin.CatkinPlugin('test-part', self.properties,
+                                     self.project_options)
+        self._write_package(plugin, 'my_package')
+        plugin._build_catkin_packages()
+        self.assertEqual(['my_package'], get_built())
+
+        common.env = ['CFLAGS="-O3"']
+        plugin._build_catkin_packages()
+
+        self.assertEqual(['my_package'], get_built())
+        with open(os.path.join(plugin.rosdir, 'lib', 'my_package')) as f:
+            self.assertEqual('my_package -O3\n', f.read())
+
+        plugin.stage_packages.append('libfoo-dev')
+        plugin._build_catkin_packages()
+        self.assertEqual(['my_package'], get_built())
+
+        # A newer version of the debs unpacked into the install directory.
+        download_dir = os.path.join(plugin.partdir, 'ubuntu', 'download')
+        os.makedirs(download_dir)
+        open(os.path.join(download_dir, 'libfoo-dev_1.1_amd64.deb'),
+             'w').close()
+        plugin._build_catkin_packages()
+        self.assertEqual(['my_package'], get_built())
+
+        plugin._build_catkin_packages()
+        self.assertEqual([], get_built())
+
     @mock.patch.object(catkin.CatkinPlugin, 'run')
     @mock.patch.object(catkin.CatkinPlugin, 'run_output', return_value='foo')
     def test_build_runs_in_bash(self, run_output_mock, run_mock):
         plugin = catkin.CatkinPlugin('test-part', self.properties,
                                      self.project_options)
-        os.makedirs(os.path.join(plugin.sourcedir, 'src'))
+        self._write_package(plugin, 'my_package')
 
         plugin.build()
 
@@ -727,13 +974,13 @@ class FindSystemDependenciesTestCase(tests.TestCase):
     def test_find_system_dependencies_system_only(self):
         rosdep_mock = mock.MagicMock()
         rosdep_mock.get_dependencies.return_value = ['bar']
-        rosdep_mock.resolve_dependency.return_value = ['baz']
+        rosdep_mock.resolve_dependencies.return_value = {'bar': ['baz']}
 
         self.assertEqual({'baz'}, catkin._find_system_dependencies(
             {'foo'}, rosdep_mock))
 
-        rosdep_mock.get_dependencies.assert_called_once_with('foo')
-        rosdep_mock.resolve_dependency.assert_called_once_with('bar')
+        rosdep_mock.get_dependencies.assert_called_once_with({'foo'})
+        rosdep_mock.resolve_dependencies.assert_called_once_with({'bar'})
 
     def test_find_system_dependencies_local_only(self):
         rosdep_mock = mock.MagicMock()
@@ -742,23 +989,21 @@ class FindSystemDependenciesTestCase(tests.TestCase):
         self.assertEqual(set(), catkin._find_system_dependencies(
             {'foo', 'bar'}, rosdep_mock))
 
-        rosdep_mock.get_dependencies.assert_has_calls([mock.call('foo'),
-                                                       mock.call('bar')],
-                                                      any_order=True)
-        rosdep_mock.resolve_dependency.assert_not_called()
+        rosdep_mock.get_dependencies.assert_called_once_with({'foo', 'bar'})
+        rosdep_mock.resolve_dependencies.assert_not_called()
 
     def test_find_system_dependencies_mixed(self):
         rosdep_mock = mock.MagicMock()
-        rosdep_mock.get_dependencies.return_value = ['bar', 'baz']
-        rosdep_mock.resolve_dependency.return_value = ['qux']
+        rosdep_mock.get_dependencies.return_value = ['bar', 'baz', 'quux']
+        rosdep_mock.resolve_dependencies.return_value = {
+            'baz': ['qux'], 'quux': ['qux', 'corge']}
 
-        self.assertEqual({'qux'}, catkin._find_system_dependencies(
+        self.assertEqual({'qux', 'corge'}, catkin._find_system_dependencies(
             {'foo', 'bar'}, rosdep_mock))
 
-        rosdep_mock.get_dependencies.assert_has_calls([mock.call('foo'),
-                                                       mock.call('bar')],
-                                                      any_order=True)
-        rosdep_mock.resolve_dependency.assert_called_once_with('baz')
+        rosdep_mock.get_dependencies.assert_called_once_with({'foo', 'bar'})
+        rosdep_mock.resolve_dependencies.assert_called_once_with(
+            {'baz', 'quux'})
 
     def test_find_system_dependencies_missing_local_dependency(self):
         rosdep_mock = mock.MagicMock()
@@ -766,8 +1011,8 @@ class FindSystemDependenciesTestCase(tests.TestCase):
         # Setup a dependency on a non-existing package, and it doesn't resolve
         # to a system dependency.'
         rosdep_mock.get_dependencies.return_value = ['bar']
-        exception = catkin.SystemDependencyNotFound('foo')
-        rosdep_mock.resolve_dependency.side_effect = exception
+        exception = catkin.SystemDependencyNotFound('bar')
+        rosdep_mock.resolve_dependencies.side_effect = exception
 
         with self.assertRaises(RuntimeError) as raised:
             catkin._find_system_dependencies({'foo'}, rosdep_mock)
@@ -859,27 +1104,50 @@ class RosdepTestCase(tests.TestCase):
     def test_get_dependencies(self):
         self.check_output_mock.return_value = b'foo\nbar\nbaz'
 
-        self.assertEqual(self.rosdep.get_dependencies('foo'),
+        self.assertEqual(self.rosdep.get_dependencies(['foo']),
                          ['foo', 'bar', 'baz'])
 
         self.check_output_mock.assert_called_with(['rosdep', 'keys', 'foo'],
                                                   env=mock.ANY)
 
+    def test_get_dependencies_of_multiple_packages(self):
+        self.check_output_mock.return_value = b'baz\nqux'
+
+        self.assertEqual(self.rosdep.get_dependencies({'foo', 'bar'}),
+                         ['baz', 'qux'])
+
+        self.check_output_mock.assert_called_once_with(
+            ['rosdep', 'keys', 'bar', 'foo'], env=mock.ANY)
+
     def test_get_dependencies_no_dependencies(self):
         self.check_output_mock.return_value = b''
 
-        self.assertEqual(self.rosdep.get_dependencies('foo'), [])
+        self.assertEqual(self.rosdep.get_dependencies(['foo']), [])
 
     def test_get_dependencies_invalid_package(self):
         self.check_output_mock.side_effect = subprocess.CalledProcessError(
             1, 'foo')
 
         with self.assertRaises(FileNotFoundError) as raised:
-            self.rosdep.get_dependencies('bar')
+            self.rosdep.get_dependencies(['bar'])
 
         self.assertEqual(str(raised.exception),
                          'Unable to find Catkin package "bar"')
 
+    def test_get_dependencies_invalid_package_among_many(self):
+        def run(args, **kwargs):
+            if 'foo' in args:
+                raise subprocess.CalledProcessError(1, 'foo')
+            return b'baz'
+
+        self.check_output_mock.side_effect = run
+
+        with self.assertRaises(FileNotFoundError) as raised:
+            self.rosdep.get_dependencies(['bar', 'foo'])
+
+        self.assertEqual(str(raised.exception),
+                         'Unable to find Catkin package "foo"')
+
     def test_resolve_dependency(self):
         self.check_output_mock.return_value = b'#apt\nmylib-dev'
 
@@ -911,6 +1179,65 @@ class RosdepTestCase(tests.TestCase):
         self.assertEqual(self.rosdep.resolve_dependency('foo'),
                          ['lib1', 'lib2'])
 
+    def test_resolve_dependencies(self):
+        self.check_output_mock.return_value = (
+            b'#ROSDEP[bar]\n#apt\nlib1 lib2\n#ROSDEP[foo]\n#apt\nmylib-dev')
+
+        self.assertEqual(self.rosdep.resolve_dependencies(['foo', 'bar']),
+                         {'foo': ['mylib-dev'], 'bar': ['lib1', 'lib2']})
+
+        self.check_output_mock.assert_called_once_with(
+            ['rosdep', 'resolve', 'bar', 'foo', '--rosdistro', 'kinetic',
+             '--os', 'ubuntu:xenial'],
+            env=mock.ANY)
+
+    def test_resolve_dependencies_invalid_dependency(self):
+        def run(args, **kwargs):
+            if 'bar' in args:
+                raise subprocess.CalledProcessError(1, 'foo')
+            return b'#apt\nmylib-dev'
+
+        self.check_output_mock.side_effect = run
+
+        with self.assertRaises(catkin.SystemDependencyNotFound) as raised:
+            self.rosdep.resolve_dependencies(['foo', 'bar'])
+
+        self.assertEqual(raised.exception.dependency_name, 'bar')
+
+    def test_resolve_dependencies_are_memoized(self):
+        self.check_output_mock.return_value = b'#apt\nmylib-dev'
+
+        self.rosdep.resolve_dependencies(['foo'])
+        self.assertEqual(self.rosdep.resolve_dependencies(['foo']),
+                         {'foo': ['mylib-dev']})
+
+        self.assertEqual(self.check_output_mock.call_count, 1)
+
+    def test_resolve_dependencies_are_cached_per_database(self):
+        sources_cache_path = os.path.join(
+            self.rosdep._rosdep_cache_path, 'rosdep', 'sources.cache')
+        os.makedirs(sources_cache_path)
+        with open(os.path.join(sources_cache_path, 'index'), 'w') as f:
+            f.write('database')
+        self.check_output_mock.return_value = b'#apt\nmylib-dev'
+
+        self.rosdep.resolve_dependencies(['foo'])
+
+        # A fresh rosdep does not need to run for the same database.
+        rosdep = catkin._Rosdep('kinetic', 'package_path', 'rosdep_path',
+                                'sources', self.project)
+        self.assertEqual(rosdep.resolve_dependencies(['foo']),
+                         {'foo': ['mylib-dev']})
+        self.assertEqual(self.check_output_mock.call_count, 1)
+
+        # But it does once the database changes.
+        with open(os.path.join(sources_cache_path, 'index'), 'w') as f:
+            f.write('updated database')
+        rosdep = catkin._Rosdep('kinetic', 'package_path', 'rosdep_path',
+                                'sources', self.project)
+        rosdep.resolve_dependencies(['foo'])
+        self.assertEqual(self.check_output_mock.call_count, 2)
+
     def test_run(self):
         rosdep = self.rosdep
         rosdep._run(['qux'])
@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import shutil
+import subprocess
 
 from unittest import mock
 
@@ -34,6 +36,11 @@ class GoPluginTestCase(tests.TestCase):
         self.run_mock = patcher.start()
         self.addCleanup(patcher.stop)
 
+        patcher = mock.patch('snapcraft.internal.common.run_output')
+        self.run_output_mock = patcher.start()
+        self.run_output_mock.return_value = ''
+        self.addCleanup(patcher.stop)
+
         patcher = mock.patch('sys.stdout')
         patcher.start()
         self.addCleanup(patcher.stop)
@@ -305,6 +312,7 @@ class GoPluginTestCase(tests.TestCase):
         os.makedirs(plugin.builddir)
 
         plugin.build()
+        os.makedirs(plugin._gopath_pkg)
 
         self.assertTrue(os.path.exists(plugin._gopath))
         self.assertTrue(os.path.exists(plugin._gopath_src))
@@ -315,6 +323,29 @@ class GoPluginTestCase(tests.TestCase):
         self.assertTrue(os.path.exists(plugin._gopath))
         self.assertTrue(os.path.exists(plugin._gopath_src))
         self.assertFalse(os.path.exists(plugin._gopath_bin))
+        # Compiled packages are kept for go to only rebuild what changed.
+        self.assertTrue(os.path.exists(plugin._gopath_pkg))
+
+        plugin.build()
+        self.assertTrue(os.path.exists(plugin._gopath_pkg))
+
+    def test_build_with_new_buildtags_discards_compiled_packages(self):
+        class Options:
+            source = 'dir'
+            go_packages = []
+            go_importpath = ''
+            go_buildtags = []
+
+        plugin = go.GoPlugin('test-part', Options(), self.project_options)
+        plugin.pull()
+        os.makedirs(plugin.builddir)
+        plugin.build()
+        os.makedirs(plugin._gopath_pkg)
+
+        plugin.options.go_buildtags = ['tag']
+        plugin.clean_build()
+        plugin.build()
+
         self.assertFalse(os.path.exists(plugin._gopath_pkg))
 
     def test_clean_pull(self):
@@ -385,11 +416,21 @@ class GoPluginTestCase(tests.TestCase):
         plugin.pull()
 
         self.assertEqual(1, self.run_mock.call_count)
+        # Dependencies are fetched into the shared GOPATH.
+        self.assertEqual(
+            self.run_mock.call_args[1]['env']['GOPATH'],
+            '{}:{}'.format(plugin._go_cache.gopath, plugin._gopath))
+
+        os.makedirs(plugin.builddir)
+        plugin.build()
+
+        self.assertEqual(2, self.run_mock.call_count)
+        self.assertEqual(
+            self.run_mock.call_args[1]['env']['GOPATH'], plugin._gopath)
         for call_args in self.run_mock.call_args_list:
             env = call_args[1]['env']
             self.assertTrue(
                 'GOPATH' in env, 'Expected environment to include GOPATH')
-            self.assertEqual(env['GOPATH'], plugin._gopath)
 
             self.assertTrue(
                 'CGO_LDFLAGS' in env,
@@ -430,3 +471,122 @@ class GoPluginTestCase(tests.TestCase):
             ['go', 'install',
              '-tags=testbuildtag1,testbuildtag2', './dir/...'],
             cwd=plugin._gopath_src, env=mock.ANY)
+
+    def test_pull_go_packages_concurrently(self):
+        class Options:
+            source = None
+            go_packages = ['github.com/gotools/vet', 'github.com/gotools/fmt']
+            go_importpath = ''
+
+        plugin = go.GoPlugin('test-part', Options(), self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        # Both packages depend on a repository, fetching it concurrently
+        # makes one of them fail.
+        failed = []
+
+        def run(cmd, **kwargs):
+            if cmd[-1] == 'github.com/gotools/fmt' and not failed:
+                failed.append(cmd)
+                raise subprocess.CalledProcessError(1, cmd)
+
+        with mock.patch('concurrent.futures.ThreadPoolExecutor',
+                        wraps=go.concurrent.futures.ThreadPoolExecutor) \
+                as mock_executor:
+            self.run_mock.side_effect = run
+            plugin.pull()
+
+        mock_executor.assert_called_once_with(max_workers=2)
+        # The failed fetch is given another go once the others are done.
+        self.assertEqual(3, self.run_mock.call_count)
+        self.assertEqual(self.run_mock.call_args_list[-1],
+                         mock.call(['go', 'get', '-t', '-d',
+                                    'github.com/gotools/fmt'],
+                                   cwd=plugin._gopath_src, env=mock.ANY))
+
+    def test_pull_links_shared_sources(self):
+        class Options:
+            source = 'dir'
+            go_packages = []
+            go_importpath = 'github.com/snapcore/launcher'
+
+        plugin = go.GoPlugin('test-part', Options(), self.project_options)
+        os.makedirs(plugin.sourcedir)
+        open(os.path.join(plugin.sourcedir, 'main.go'), 'w').close()
+
+        def fetch(cmd, **kwargs):
+            for repository in ('github.com/snapcore/dependency',
+                               'github.com/snapcore/launcher/vendored',
+                               'gopkg.in/yaml.v2'):
+                os.makedirs(os.path.join(
+                    plugin._go_cache.gopath_src, repository, '.git'),
+                    exist_ok=True)
+
+        self.run_mock.side_effect = fetch
+        self.run_output_mock.return_value = (
+            'github.com/snapcore/launcher github.com/snapcore/dependency/sub '
+            'github.com/snapcore/launcher/vendored fmt')
+        with mock.patch.object(plugin._go_cache, 'get_revision',
+                               return_value='rev1'):
+            plugin.pull()
+
+        # The shared sources the part resolves to are updated.
+        self.run_mock.assert_called_with(
+            ['go', 'get', '-u', '-d', 'github.com/snapcore/dependency/...',
+             'github.com/snapcore/launcher/vendored/...'],
+            cwd=plugin._gopath_src, env=mock.ANY)
+        self.assertEqual(
+            os.path.join(plugin._go_cache.snapshots_dir,
+                         'github.com', 'snapcore', 'dependency', 'rev1'),
+            os.readlink(os.path.join(plugin._gopath_src, 'github.com',
+                                     'snapcore', 'dependency')))
+        # Repositories the part does not resolve to are not linked.
+        self.assertFalse(os.path.lexists(
+            os.path.join(plugin._gopath_src, 'gopkg.in', 'yaml.v2')))
+        # The part's own sources are left alone.
+        self.assertFalse(os.path.exists(
+            os.path.join(plugin.sourcedir, 'vendored')))
+
+        # A new revision gets linked in on the next pull.
+        with mock.patch.object(plugin._go_cache, 'get_revision',
+                               return_value='rev2'):
+            plugin.pull()
+
+        self.assertEqual(
+            os.path.join(plugin._go_cache.snapshots_dir,
+                         'github.com', 'snapcore', 'dependency', 'rev2'),
+            os.readlink(os.path.join(plugin._gopath_src, 'github.com',
+                                     'snapcore', 'dependency')))
+
+    def test_build_relinks_pruned_snapshots(self):
+        class Options:
+            source = 'dir'
+            go_packages = []
+            go_importpath = 'github.com/snapcore/launcher'
+            go_buildtags = ''
+
+        plugin = go.GoPlugin('test-part', Options(), self.project_options)
+        os.makedirs(plugin.sourcedir)
+        open(os.path.join(plugin.sourcedir, 'main.go'), 'w').close()
+        os.makedirs(os.path.join(
+            plugin._go_cache.gopath_src, 'github.com', 'snapcore',
+            'dependency', '.git'))
+        self.run_output_mock.return_value = 'github.com/snapcore/dependency'
+        with mock.patch.object(plugin._go_cache, 'get_revision',
+                               return_value='rev1'):
+            plugin.pull()
+        link = os.path.join(
+            plugin._gopath_src, 'github.com', 'snapcore', 'dependency')
+        # Another part's pull pruned the snapshot.
+        shutil.rmtree(os.readlink(link))
+
+        os.makedirs(plugin.builddir, exist_ok=True)
+        with mock.patch.object(plugin._go_cache, 'get_revision',
+                               return_value='rev2'):
+            plugin.build()
+
+        self.assertEqual(
+            os.path.join(plugin._go_cache.snapshots_dir,
+                         'github.com', 'snapcore', 'dependency', 'rev2'),
+            os.readlink(link))
+        self.assertTrue(os.path.isdir(link))
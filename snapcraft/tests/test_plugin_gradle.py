@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import subprocess
 from unittest import mock
 
 import fixtures
@@ -43,6 +44,9 @@ class BaseGradlePluginTestCase(tests.TestCase):
         self.useFixture(fixtures.EnvironmentVariable('http_proxy', None))
         self.useFixture(fixtures.EnvironmentVariable('https_proxy', None))
 
+        self.gradle_user_home = os.path.join(
+            self.path, '.cache', 'snapcraft', 'java', 'gradle')
+
 
 class GradlePluginTestCase(BaseGradlePluginTestCase):
 
@@ -82,7 +86,7 @@ class GradlePluginTestCase(BaseGradlePluginTestCase):
         plugin = gradle.GradlePlugin('test-part', self.options,
                                      self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir,
                         'build', 'libs'))
             open(os.path.join(plugin.builddir,
@@ -94,7 +98,9 @@ class GradlePluginTestCase(BaseGradlePluginTestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['./gradlew', 'jar']),
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home, '--offline', 'jar'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
     @mock.patch.object(gradle.GradlePlugin, 'run')
@@ -102,7 +108,7 @@ class GradlePluginTestCase(BaseGradlePluginTestCase):
         plugin = gradle.GradlePlugin('test-part', self.options,
                                      self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir,
                         'build', 'libs'))
             open(os.path.join(plugin.builddir,
@@ -114,7 +120,9 @@ class GradlePluginTestCase(BaseGradlePluginTestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['./gradlew', 'jar']),
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home, '--offline', 'jar'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
     @mock.patch.object(gradle.GradlePlugin, 'run')
@@ -127,9 +135,70 @@ class GradlePluginTestCase(BaseGradlePluginTestCase):
             plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['./gradlew', 'jar']),
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home, '--offline', 'jar'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
+    @mock.patch.object(gradle.GradlePlugin, 'run')
+    def test_pull_fetches_dependencies(self, run_mock):
+        plugin = gradle.GradlePlugin('test-part', self.options,
+                                     self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        plugin.pull()
+
+        run_mock.assert_called_once_with(
+            ['./gradlew', '--gradle-user-home', self.gradle_user_home,
+             '--project-cache-dir', os.path.join(plugin.partdir, 'gradle'),
+             'dependencies'], cwd=plugin.sourcedir)
+
+    @mock.patch.object(gradle.GradlePlugin, 'run')
+    def test_build_retries_online(self, run_mock):
+        plugin = gradle.GradlePlugin('test-part', self.options,
+                                     self.project_options)
+
+        def side(cmd, **kwargs):
+            if '--offline' in cmd:
+                os.write(kwargs['stdout'],
+                         b'No cached version of foo:bar:1.0 available for '
+                         b'offline mode.\n')
+                raise subprocess.CalledProcessError(1, cmd)
+            os.makedirs(os.path.join(plugin.builddir, 'build', 'libs'))
+            open(os.path.join(plugin.builddir,
+                 'build', 'libs', 'dummy.jar'), 'w').close()
+
+        run_mock.side_effect = side
+        os.makedirs(plugin.sourcedir)
+
+        plugin.build()
+
+        run_mock.assert_has_calls([
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home, '--offline', 'jar'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home, 'jar']),
+        ])
+        self.assertTrue(os.path.exists(
+            os.path.join(plugin.installdir, 'jar', 'dummy.jar')))
+
+    @mock.patch.object(gradle.GradlePlugin, 'run')
+    def test_build_failure_is_not_retried_online(self, run_mock):
+        plugin = gradle.GradlePlugin('test-part', self.options,
+                                     self.project_options)
+
+        def side(cmd, **kwargs):
+            os.write(kwargs['stdout'], b'Compilation failed\n')
+            raise subprocess.CalledProcessError(1, cmd)
+
+        run_mock.side_effect = side
+        os.makedirs(plugin.sourcedir)
+
+        self.assertRaises(subprocess.CalledProcessError, plugin.build)
+
+        self.assertEqual(1, run_mock.call_count)
+
 
 class GradleProxyTestCase(BaseGradlePluginTestCase):
 
@@ -157,7 +226,7 @@ class GradleProxyTestCase(BaseGradlePluginTestCase):
         plugin = gradle.GradlePlugin('test-part', self.options,
                                      self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir,
                         'build', 'libs'))
             open(os.path.join(plugin.builddir,
@@ -169,5 +238,8 @@ class GradleProxyTestCase(BaseGradlePluginTestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['./gradlew'] + self.expected_args + ['jar'])
+            mock.call(['./gradlew', '--gradle-user-home',
+                       self.gradle_user_home] + self.expected_args +
+                      ['--offline', 'jar'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT)
         ])
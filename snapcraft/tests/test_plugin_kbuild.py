@@ -101,6 +101,41 @@ class KBuildPluginTestCase(tests.TestCase):
 
         self.assertEqual(config_contents, 'ACCEPT=y\n')
 
+    @mock.patch('subprocess.check_call')
+    @mock.patch.object(kbuild.KBuildPlugin, 'run')
+    def test_build_with_ccache(self, run_mock, check_call_mock):
+        self.options.kconfigfile = 'config'
+        with open(self.options.kconfigfile, 'w') as f:
+            f.write('ACCEPT=y\n')
+
+        plugin = kbuild.KBuildPlugin('test-part', self.options,
+                                     snapcraft.ProjectOptions(use_ccache=True))
+
+        os.makedirs(plugin.builddir)
+
+        plugin.build()
+
+        check_call_mock.assert_called_once_with(
+            'yes "" | make -j2 \'CC=ccache gcc\' oldconfig', shell=True,
+            cwd=plugin.builddir)
+        run_mock.assert_has_calls([
+            mock.call(['make', '-j2', 'CC=ccache gcc']),
+            mock.call(['make', '-j2', 'CC=ccache gcc',
+                       'CONFIG_PREFIX={}'.format(plugin.installdir),
+                       'install'])
+        ])
+
+    def test_ccache_for_target_without_cross_compiler_prefix(self):
+        with mock.patch('platform.machine', return_value='x86_64'):
+            project_options = snapcraft.ProjectOptions(
+                target_deb_arch='i386', use_ccache=True)
+
+        plugin = kbuild.KBuildPlugin('test-part', self.options,
+                                     project_options)
+
+        # The host compiler builds for targets without a prefix.
+        self.assertIn('CC=ccache gcc', plugin.make_cmd)
+
     @mock.patch('subprocess.check_call')
     @mock.patch.object(kbuild.KBuildPlugin, 'run')
     def test_build_verbose_with_kconfigfile(self, run_mock, check_call_mock):
@@ -15,8 +15,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import contextlib
+import gzip
 import logging
+import lzma
 import os
+import stat
 from unittest import mock
 
 import fixtures
@@ -26,9 +29,25 @@ from snapcraft import (
     storeapi,
     tests
 )
+from snapcraft.internal import cpio
 from snapcraft.plugins import kernel
 
 
+def _write_cpio(fileobj, entries):
+    writer = cpio.Writer(fileobj)
+    for entry in entries:
+        writer.add(entry)
+    writer.close()
+
+
+_BASE_INITRD_ENTRIES = [
+    cpio.Entry(name='.', mode=stat.S_IFDIR | 0o755),
+    cpio.Entry(name='./init', mode=stat.S_IFREG | 0o755,
+               data=b'#!/bin/sh\n'),
+    cpio.Entry(name='./lib', mode=stat.S_IFDIR | 0o755),
+]
+
+
 class KernelPluginTestCase(tests.TestCase):
 
     def setUp(self):
@@ -49,8 +68,19 @@ class KernelPluginTestCase(tests.TestCase):
         self.options = Options()
         self.project_options = snapcraft.ProjectOptions()
 
+        def fake_unsquashfs(cmd, cwd=None, **kwargs):
+            if cmd[0] != 'unsquashfs':
+                return
+            initrd_path = os.path.join(
+                cwd, 'squashfs-root', 'usr', 'lib',
+                'ubuntu-core-generic-initrd', 'initrd.img-core')
+            os.makedirs(os.path.dirname(initrd_path), exist_ok=True)
+            with gzip.open(initrd_path, 'wb') as f:
+                _write_cpio(f, _BASE_INITRD_ENTRIES)
+
         patcher = mock.patch('subprocess.check_call')
         self.check_call_mock = patcher.start()
+        self.check_call_mock.side_effect = fake_unsquashfs
         self.addCleanup(patcher.stop)
 
         patcher = mock.patch.object(kernel.KernelPlugin, 'run')
@@ -73,7 +103,7 @@ class KernelPluginTestCase(tests.TestCase):
         @contextlib.contextmanager
         def tempdir():
             self.tempdir = 'temporary-directory'
-            os.mkdir(self.tempdir)
+            os.makedirs(self.tempdir, exist_ok=True)
             yield self.tempdir
 
         patcher = mock.patch('tempfile.TemporaryDirectory')
@@ -129,25 +159,20 @@ class KernelPluginTestCase(tests.TestCase):
         self.assertTrue('kernel-device-trees' in build_properties)
         self.assertTrue('kernel-initrd-compression' in build_properties)
 
-    def _assert_generic_check_call(self, builddir, installdir, os_snap_path):
-        self.assertEqual(4, self.check_call_mock.call_count)
+    def _assert_generic_check_call(self, plugin):
+        self.assertEqual(2, self.check_call_mock.call_count)
         self.check_call_mock.assert_has_calls([
-            mock.call('yes "" | make -j2 oldconfig', shell=True,
-                      cwd=builddir),
-            mock.call(['unsquashfs', os_snap_path,
+            mock.call('yes "" | make -j2 O={} oldconfig'.format(
+                plugin.outdir), shell=True, cwd=plugin.builddir),
+            mock.call(['unsquashfs', plugin.os_snap,
                        'usr/lib/ubuntu-core-generic-initrd'],
                       cwd='temporary-directory'),
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'gzip -dc | cpio -i',
-                      cwd=os.path.join(builddir, 'initrd-staging'),
-                      shell=True),
-            mock.call('find . | cpio --create --format=newc | '
-                      'gzip > {}'.format(os.path.join(
-                          installdir, 'initrd-4.4.2.img')),
-                      cwd=os.path.join(builddir, 'initrd-staging'), shell=True)
         ])
 
+    def _read_initrd(self, initrd_path):
+        with gzip.open(initrd_path) as f:
+            return {entry.name: entry for entry in cpio.read(f)}
+
     def _assert_common_assets(self, installdir):
         for asset in ['initrd-4.4.2.img', 'initrd.img', 'kernel.img',
                       'bzImage-4.4.2', 'System.map-4.4.2']:
@@ -203,77 +228,83 @@ class KernelPluginTestCase(tests.TestCase):
 
         self.base_build_mock.side_effect = create_assets
 
-    def test_unpack_gzip_initrd(self):
+    def _make_initrd_file(self, opener):
+        initrd_path = 'initrd.img-core'
+        with opener(initrd_path, 'wb') as f:
+            _write_cpio(f, _BASE_INITRD_ENTRIES)
+        return initrd_path
+
+    def test_open_gzip_initrd(self):
         self.file_mock.return_value = 'application/gzip'
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        plugin._unpack_generic_initrd()
+        with plugin._open_initrd(self._make_initrd_file(gzip.open)) as f:
+            self.assertEqual(
+                ['.', './init', './lib'],
+                [entry.name for entry in cpio.read(f)])
 
-        self.check_call_mock.assert_has_calls([
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'gzip -dc | cpio -i',
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True)
-        ])
-
-    def test_unpack_xgzip_initrd(self):
+    def test_open_xgzip_initrd(self):
         self.file_mock.return_value = 'application/x-gzip'
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        plugin._unpack_generic_initrd()
+        with plugin._open_initrd(self._make_initrd_file(gzip.open)) as f:
+            self.assertEqual(
+                ['.', './init', './lib'],
+                [entry.name for entry in cpio.read(f)])
 
-        self.check_call_mock.assert_has_calls([
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'gzip -dc | cpio -i',
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True)
-        ])
-
-    def test_unpack_lzma_initrd(self):
+    def test_open_lzma_initrd(self):
         self.file_mock.return_value = 'application/x-lzma'
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        plugin._unpack_generic_initrd()
+        def lzma_open(path, mode):
+            return lzma.open(path, mode, format=lzma.FORMAT_ALONE)
 
-        self.check_call_mock.assert_has_calls([
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'xz -dc | cpio -i',
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True)
-        ])
+        with plugin._open_initrd(self._make_initrd_file(lzma_open)) as f:
+            self.assertEqual(
+                ['.', './init', './lib'],
+                [entry.name for entry in cpio.read(f)])
 
-    def test_unpack_xz_initrd(self):
+    def test_open_xz_initrd(self):
         self.file_mock.return_value = 'application/x-xz'
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        plugin._unpack_generic_initrd()
+        with plugin._open_initrd(self._make_initrd_file(lzma.open)) as f:
+            self.assertEqual(
+                ['.', './init', './lib'],
+                [entry.name for entry in cpio.read(f)])
 
-        self.check_call_mock.assert_has_calls([
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'xz -dc | cpio -i',
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True)
-        ])
-
-    def test_unpack_unsupported_initrd_type(self):
+    def test_open_unsupported_initrd_type(self):
         self.file_mock.return_value = 'application/foo'
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
         with self.assertRaises(RuntimeError) as raised:
-            plugin._unpack_generic_initrd()
+            plugin._open_initrd(self._make_initrd_file(gzip.open))
 
         self.assertEqual("initrd file type is unsupported: 'application/foo'",
                          str(raised.exception))
 
+    def _make_modules(self, plugin, modules_dep, modules_builtin=''):
+        plugin.kernel_release = '4.4'
+        modules_path = os.path.join(plugin.installdir, 'lib', 'modules', '4.4')
+        os.makedirs(modules_path)
+        with open(os.path.join(modules_path, 'modules.dep'), 'w') as f:
+            f.write(modules_dep)
+        with open(os.path.join(modules_path, 'modules.builtin'), 'w') as f:
+            f.write(modules_builtin)
+        open(os.path.join(modules_path, 'modules.dep.bin'), 'w').close()
+        for line in modules_dep.splitlines():
+            module = line.split(':')[0]
+            os.makedirs(os.path.dirname(os.path.join(modules_path, module)),
+                        exist_ok=True)
+            with open(os.path.join(modules_path, module), 'w') as f:
+                f.write(module)
+        return modules_path
+
     def test_pack_initrd_modules(self):
         self.options.kernel_initrd_modules = [
             'squashfs',
@@ -282,63 +313,132 @@ class KernelPluginTestCase(tests.TestCase):
 
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
+        self._make_modules(plugin, (
+            'kernel/fs/squashfs/squashfs.ko:\n'
+            'kernel/fs/fat/vfat.ko: kernel/fs/fat/fat.ko\n'
+            'kernel/fs/fat/fat.ko:\n'
+            'kernel/fs/ext4/ext4.ko: kernel/fs/jbd2/jbd2.ko\n'
+            'kernel/fs/jbd2/jbd2.ko:\n'))
+
+        plugin._make_initrd()
+
+        self.assertFalse(self.run_output_mock.called)
+        entries = self._read_initrd(
+            os.path.join(plugin.installdir, 'initrd-4.4.img'))
+        modules_path = os.path.join('lib', 'modules', '4.4')
+        for module in ['kernel/fs/squashfs/squashfs.ko',
+                       'kernel/fs/fat/vfat.ko', 'kernel/fs/fat/fat.ko',
+                       'modules.dep', 'modules.dep.bin']:
+            self.assertIn(os.path.join(modules_path, module), entries)
+        for module in ['kernel/fs/ext4/ext4.ko', 'kernel/fs/jbd2/jbd2.ko']:
+            self.assertNotIn(os.path.join(modules_path, module), entries)
+        self.assertEqual(
+            b'kernel/fs/fat/fat.ko',
+            entries[os.path.join(modules_path, 'kernel/fs/fat/fat.ko')].data)
 
-        # Fake some assets
-        plugin.kernel_release = '4.4'
-        modules_path = os.path.join(plugin.installdir, 'lib', 'modules', '4.4')
-        initrd_modules_staging_path = os.path.join(
-            'staging', 'lib', 'modules', '4.4')
-        os.makedirs(modules_path)
-        open(os.path.join(modules_path, 'modules.dep'), 'w').close()
-        open(os.path.join(modules_path, 'modules.dep.bin'), 'w').close()
-        os.makedirs(initrd_modules_staging_path)
-        open(os.path.join(plugin.installdir, 'initrd-4.4.img'), 'w').close()
-
-        with mock.patch.object(plugin, '_unpack_generic_initrd') as m_unpack:
-            m_unpack.return_value = 'staging'
-            plugin._make_initrd()
-
-        modprobe_cmd = ['modprobe', '-n', '--show-depends', '-d',
-                        plugin.installdir, '-S', '4.4', ]
-        self.run_output_mock.assert_has_calls([
-            mock.call(modprobe_cmd + ['squashfs'])])
-        self.run_output_mock.assert_has_calls([
-            mock.call(modprobe_cmd + ['vfat'])])
+        # The base initrd is kept and missing directories are created.
+        self.assertIn('./init', entries)
+        self.assertNotIn('lib', entries)
+        for directory in ['lib/modules', 'lib/modules/4.4/kernel/fs/fat']:
+            self.assertTrue(stat.S_ISDIR(entries[directory].mode))
+        self.assertTrue(os.path.exists(
+            os.path.join(plugin.installdir, 'initrd.img')))
 
     def test_pack_initrd_modules_return_same_deps(self):
         self.options.kernel_initrd_modules = [
-            'squashfs',
-            'vfat'
+            'serio-raw',
+            'serport'
         ]
 
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
+        self._make_modules(plugin, (
+            'kernel/drivers/input/serio/serio_raw.ko: '
+            'kernel/drivers/input/serio/serio.ko\n'
+            'kernel/drivers/input/serio/serport.ko: '
+            'kernel/drivers/input/serio/serio.ko\n'
+            'kernel/drivers/input/serio/serio.ko:\n'))
+
+        plugin._make_initrd()
+
+        with gzip.open(os.path.join(
+                plugin.installdir, 'initrd-4.4.img')) as f:
+            names = [entry.name for entry in cpio.read(f)]
+        self.assertEqual(1, names.count(
+            'lib/modules/4.4/kernel/drivers/input/serio/serio.ko'))
+        self.assertIn(
+            'lib/modules/4.4/kernel/drivers/input/serio/serio_raw.ko', names)
+
+    def test_pack_initrd_builtin_module(self):
+        self.options.kernel_initrd_modules = ['squashfs']
 
-        # Fake some assets
-        plugin.kernel_release = '4.4'
-        modules_path = os.path.join(plugin.installdir, 'lib', 'modules', '4.4')
-        initrd_modules_staging_path = os.path.join(
-            'staging', 'lib', 'modules', '4.4')
-        os.makedirs(modules_path)
-        open(os.path.join(modules_path, 'modules.dep'), 'w').close()
-        open(os.path.join(modules_path, 'modules.dep.bin'), 'w').close()
-        os.makedirs(initrd_modules_staging_path)
-        open(os.path.join(plugin.installdir, 'initrd-4.4.img'), 'w').close()
-        open(os.path.join(plugin.installdir, 'serport.ko'), 'w').close()
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+        self._make_modules(
+            plugin, 'kernel/fs/fat/vfat.ko:\n',
+            modules_builtin='kernel/fs/squashfs/squashfs.ko\n')
+
+        plugin._make_initrd()
+
+        entries = self._read_initrd(
+            os.path.join(plugin.installdir, 'initrd-4.4.img'))
+        self.assertEqual(['.', './init', './lib'], sorted(entries))
 
-        self.run_output_mock.return_value = 'insmod {}/serport.ko'.format(
-            plugin.installdir)
+    def test_pack_initrd_missing_module(self):
+        self.options.kernel_initrd_modules = ['not-a-module']
 
-        with mock.patch.object(plugin, '_unpack_generic_initrd') as m_unpack:
-            m_unpack.return_value = 'staging'
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+        self._make_modules(plugin, 'kernel/fs/fat/vfat.ko:\n')
+
+        with self.assertRaises(RuntimeError) as raised:
             plugin._make_initrd()
 
-        modprobe_cmd = ['modprobe', '-n', '--show-depends', '-d',
-                        plugin.installdir, '-S', '4.4', ]
-        self.run_output_mock.assert_has_calls([
-            mock.call(modprobe_cmd + ['squashfs'])])
-        self.run_output_mock.assert_has_calls([
-            mock.call(modprobe_cmd + ['vfat'])])
+        self.assertEqual(
+            "Cannot find module 'not-a-module' for kernel release 4.4",
+            str(raised.exception))
+
+    def test_pack_initrd_is_cached(self):
+        self.options.kernel_initrd_modules = ['vfat']
+
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+        modules_path = self._make_modules(
+            plugin, 'kernel/fs/fat/vfat.ko:\n')
+        initrd_path = os.path.join(plugin.installdir, 'initrd-4.4.img')
+
+        plugin._make_initrd()
+        with open(initrd_path, 'rb') as f:
+            initrd = f.read()
+        os.remove(os.path.join(plugin.installdir, 'initrd.img'))
+
+        with mock.patch.object(plugin, '_write_initrd') as mock_write:
+            plugin._make_initrd()
+        self.assertFalse(mock_write.called)
+        with open(initrd_path, 'rb') as f:
+            self.assertEqual(initrd, f.read())
+
+        # A rebuilt module means a new initrd.
+        os.remove(os.path.join(plugin.installdir, 'initrd.img'))
+        with open(os.path.join(modules_path, 'kernel/fs/fat/vfat.ko'),
+                  'w') as f:
+            f.write('rebuilt')
+        plugin._make_initrd()
+        entries = self._read_initrd(initrd_path)
+        self.assertEqual(
+            b'rebuilt', entries['lib/modules/4.4/kernel/fs/fat/vfat.ko'].data)
+
+    def test_build_twice_sets_output_dir_once(self):
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+
+        with mock.patch('snapcraft.plugins.kbuild.KBuildPlugin.build'):
+            plugin.build()
+            plugin.build()
+
+        self.assertEqual(
+            ['O={}'.format(plugin.outdir)],
+            [arg for arg in plugin.make_cmd if arg.startswith('O=')])
 
     def test_build_with_kconfigfile(self):
         self.options.kconfigfile = 'config'
@@ -349,17 +449,17 @@ class KernelPluginTestCase(tests.TestCase):
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
-            mock.call(['make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
+                       'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -368,7 +468,7 @@ class KernelPluginTestCase(tests.TestCase):
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -389,33 +489,24 @@ class KernelPluginTestCase(tests.TestCase):
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self.assertEqual(4, self.check_call_mock.call_count)
+        self.assertEqual(2, self.check_call_mock.call_count)
         self.check_call_mock.assert_has_calls([
-            mock.call('yes "" | make -j2 V=1 oldconfig', shell=True,
-                      cwd=plugin.builddir),
+            mock.call('yes "" | make -j2 V=1 O={} oldconfig'.format(
+                plugin.outdir), shell=True, cwd=plugin.builddir),
             mock.call(['unsquashfs', plugin.os_snap,
                        'usr/lib/ubuntu-core-generic-initrd'],
                       cwd='temporary-directory'),
-            mock.call('cat temporary-directory/squashfs-root/usr/lib/'
-                      'ubuntu-core-generic-initrd/initrd.img-core | '
-                      'gzip -dc | cpio -i',
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True),
-            mock.call('find . | cpio --create --format=newc | '
-                      'gzip > {}'.format(os.path.join(
-                          plugin.installdir, 'initrd-4.4.2.img')),
-                      cwd=os.path.join(plugin.builddir, 'initrd-staging'),
-                      shell=True)
         ])
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
-            mock.call(['make', '-j2', 'V=1', 'bzImage', 'modules']),
-            mock.call(['make', '-j2', 'V=1',
+            mock.call(['make', '-j2', 'V=1', 'O={}'.format(plugin.outdir),
+                       'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'V=1', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -424,7 +515,7 @@ class KernelPluginTestCase(tests.TestCase):
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -447,17 +538,17 @@ class KernelPluginTestCase(tests.TestCase):
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
-            mock.call(['make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
+                       'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -466,7 +557,7 @@ class KernelPluginTestCase(tests.TestCase):
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -493,7 +584,7 @@ ACCEPT=n
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
 
         def fake_defconfig(*args, **kwargs):
             if os.path.exists(config_file):
@@ -504,18 +595,19 @@ ACCEPT=n
         self.run_mock.side_effect = fake_defconfig
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(3, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
-            mock.call(['make', '-j1', 'defconfig']),
-            mock.call(['make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+            mock.call(['make', '-j1', 'O={}'.format(plugin.outdir),
+                       'defconfig']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
+                       'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -546,7 +638,7 @@ ACCEPT=n
         plugin = kernel.KernelPlugin('test-part', self.options,
                                      self.project_options)
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
 
         def fake_defconfig(*args, **kwargs):
             if os.path.exists(config_file):
@@ -557,18 +649,19 @@ ACCEPT=n
         self.run_mock.side_effect = fake_defconfig
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(3, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
-            mock.call(['make', '-j1', 'defconfig', 'defconfig2']),
-            mock.call(['make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+            mock.call(['make', '-j1', 'O={}'.format(plugin.outdir),
+                       'defconfig', 'defconfig2']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
+                       'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -590,18 +683,18 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir, do_dtbs=True)
+            plugin.sourcedir, plugin.outdir, plugin.installdir, do_dtbs=True)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
             mock.call([
-                'make', '-j2', 'bzImage', 'modules', 'fake-dtb.dtb']),
-            mock.call(['make', '-j2',
+                'make', '-j2', 'O={}'.format(plugin.outdir),
+                'bzImage', 'modules', 'fake-dtb.dtb']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -610,7 +703,7 @@ ACCEPT=n
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -631,7 +724,7 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         with self.assertRaises(RuntimeError) as raised:
             plugin.build()
@@ -649,35 +742,31 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
-        def fake_unpack(*args, **kwargs):
-            modules_dir = os.path.join(
-                plugin.builddir, 'initrd-staging', 'lib', 'modules', '4.4.2')
-            if os.path.exists(modules_dir):
-                return
-            os.makedirs(modules_dir)
-
-        self.check_call_mock.side_effect = fake_unpack
+        def fake_modules():
+            create_assets()
+            modules_path = os.path.join(
+                plugin.installdir, 'lib', 'modules', '4.4.2')
+            with open(os.path.join(modules_path, 'modules.dep'), 'w') as f:
+                f.write('kernel/my-fake-module.ko:\n')
+            os.mkdir(os.path.join(modules_path, 'kernel'))
+            open(os.path.join(
+                modules_path, 'kernel', 'my-fake-module.ko'), 'w').close()
 
-        def fake_modules(*args, **kwargs):
-            module_path = os.path.join(
-                plugin.installdir, 'lib', 'modules', '4.4.2', 'some-module.ko')
-            open(module_path, 'w').close()
-            return module_path
-
-        self.run_output_mock.side_effect = fake_modules
+        create_assets = self.base_build_mock.side_effect
+        self.base_build_mock.side_effect = fake_modules
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
             mock.call([
-                'make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+                'make', '-j2', 'O={}'.format(plugin.outdir),
+                'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -686,13 +775,12 @@ ACCEPT=n
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        self.assertEqual(1, self.run_output_mock.call_count)
-        self.run_output_mock.assert_has_calls([
-            mock.call([
-                'modprobe', '-n', '--show-depends', '-d',
-                plugin.installdir, '-S', '4.4.2', 'my-fake-module'])])
+        self.assertIn(
+            'lib/modules/4.4.2/kernel/my-fake-module.ko',
+            self._read_initrd(os.path.join(
+                plugin.installdir, 'initrd-4.4.2.img')))
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -712,27 +800,18 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir)
-
-        def fake_unpack(*args, **kwargs):
-            modules_dir = os.path.join(
-                plugin.builddir, 'initrd-staging', 'lib', 'modules', '4.4.2')
-            if os.path.exists(modules_dir):
-                return
-            os.makedirs(modules_dir)
-
-        self.check_call_mock.side_effect = fake_unpack
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
             mock.call([
-                'make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+                'make', '-j2', 'O={}'.format(plugin.outdir),
+                'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir),
@@ -741,7 +820,7 @@ ACCEPT=n
                            plugin.installdir, 'lib', 'firmware'))])
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
         with open(config_file) as f:
@@ -751,6 +830,12 @@ ACCEPT=n
         self._assert_common_assets(plugin.installdir)
         self.assertTrue(os.path.exists(os.path.join(
             plugin.installdir, 'lib', 'firmware', 'fake-fw-dir')))
+        entries = self._read_initrd(
+            os.path.join(plugin.installdir, 'initrd-4.4.2.img'))
+        self.assertTrue(stat.S_ISDIR(
+            entries['lib/firmware/fake-fw-dir'].mode))
+        self.assertTrue(stat.S_ISREG(
+            entries['lib/firmware/fake-fw.bin'].mode))
 
     def test_build_with_kconfigfile_and_no_firmware(self):
         self.options.kconfigfile = 'config'
@@ -762,24 +847,24 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir, do_dtbs=True)
+            plugin.sourcedir, plugin.outdir, plugin.installdir, do_dtbs=True)
 
         plugin.build()
 
-        self._assert_generic_check_call(plugin.builddir, plugin.installdir,
-                                        plugin.os_snap)
+        self._assert_generic_check_call(plugin)
 
         self.assertEqual(2, self.run_mock.call_count)
         self.run_mock.assert_has_calls([
             mock.call([
-                'make', '-j2', 'bzImage', 'modules']),
-            mock.call(['make', '-j2',
+                'make', '-j2', 'O={}'.format(plugin.outdir),
+                'bzImage', 'modules']),
+            mock.call(['make', '-j2', 'O={}'.format(plugin.outdir),
                        'CONFIG_PREFIX={}'.format(plugin.installdir),
                        'modules_install',
                        'INSTALL_MOD_PATH={}'.format(plugin.installdir)]),
         ])
 
-        config_file = os.path.join(plugin.builddir, '.config')
+        config_file = os.path.join(plugin.outdir, '.config')
         self.assertTrue(os.path.exists(config_file))
 
     def test_build_with_missing_kernel_fails(self):
@@ -792,7 +877,7 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir,
+            plugin.sourcedir, plugin.outdir, plugin.installdir,
             do_kernel=False)
 
         with self.assertRaises(ValueError) as raised:
@@ -801,7 +886,7 @@ ACCEPT=n
         self.assertEqual(
             'kernel build did not output a vmlinux binary in top level dir, '
             'expected {!r}'.format(os.path.join(
-                plugin.builddir, 'arch', self.project_options.kernel_arch,
+                plugin.outdir, 'arch', self.project_options.kernel_arch,
                 'boot', 'bzImage')),
             str(raised.exception))
 
@@ -815,7 +900,7 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir,
+            plugin.sourcedir, plugin.outdir, plugin.installdir,
             do_release=False)
 
         with self.assertRaises(ValueError) as raised:
@@ -823,7 +908,7 @@ ACCEPT=n
 
         self.assertEqual(
             'No kernel release version info found at {!r}'.format(os.path.join(
-                plugin.builddir, 'include', 'config', 'kernel.release')),
+                plugin.outdir, 'include', 'config', 'kernel.release')),
             str(raised.exception))
 
     def test_build_with_missing_system_map_fails(self):
@@ -836,7 +921,7 @@ ACCEPT=n
                                      self.project_options)
 
         self._simulate_build(
-            plugin.sourcedir, plugin.builddir, plugin.installdir,
+            plugin.sourcedir, plugin.outdir, plugin.installdir,
             do_system_map=False)
 
         with self.assertRaises(ValueError) as raised:
@@ -846,6 +931,72 @@ ACCEPT=n
             'kernel build did not output a System.map in top level dir',
             str(raised.exception))
 
+    def test_outdir_is_kept_outside_the_build_dir(self):
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+
+        self.assertFalse(plugin.outdir.startswith(plugin.build_basedir))
+        self.assertEqual(
+            os.path.join(plugin.partdir, 'kbuild', '{}-gcc'.format(
+                self.project_options.kernel_arch)),
+            plugin.outdir)
+
+    def test_outdir_is_keyed_by_arch_and_compiler(self):
+        project_options = snapcraft.ProjectOptions(target_deb_arch='arm64')
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     project_options)
+
+        self.assertEqual(
+            os.path.join(plugin.partdir, 'kbuild',
+                         'arm64-aarch64-linux-gnu-gcc'),
+            plugin.outdir)
+
+    def test_build_reports_config_changes(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        self.options.kconfigfile = 'config'
+        with open(self.options.kconfigfile, 'w') as f:
+            f.write('CONFIG_A=y\nCONFIG_B=y\nCONFIG_D="new"\n')
+
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+        self._simulate_build(
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
+        os.makedirs(plugin.outdir)
+        with open(os.path.join(plugin.outdir, '.config'), 'w') as f:
+            f.write('CONFIG_A=y\n# CONFIG_B is not set\nCONFIG_C=m\n'
+                    'CONFIG_D="old"\n')
+
+        plugin.build()
+
+        self.assertIn(
+            'Kernel config changes since the last build:\n'
+            'CONFIG_B: n -> y\n'
+            'CONFIG_C: m -> n\n'
+            'CONFIG_D: "old" -> "new"\n', fake_logger.output)
+
+    def test_build_reports_unchanged_config(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        self.options.kconfigfile = 'config'
+        with open(self.options.kconfigfile, 'w') as f:
+            f.write('CONFIG_A=y\n')
+
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     self.project_options)
+        self._simulate_build(
+            plugin.sourcedir, plugin.outdir, plugin.installdir)
+        os.makedirs(plugin.outdir)
+        with open(os.path.join(plugin.outdir, '.config'), 'w') as f:
+            f.write('CONFIG_A=y\n')
+
+        plugin.build()
+
+        self.assertIn('Kernel config unchanged since the last build\n',
+                      fake_logger.output)
+
     def test_enable_cross_compilation(self):
         project_options = snapcraft.ProjectOptions(target_deb_arch='arm64')
         plugin = kernel.KernelPlugin('test-part', self.options,
@@ -856,6 +1007,18 @@ ACCEPT=n
             plugin.make_cmd,
             ['make', '-j2', 'ARCH=arm64', 'CROSS_COMPILE=aarch64-linux-gnu-'])
 
+    def test_enable_cross_compilation_with_ccache(self):
+        project_options = snapcraft.ProjectOptions(
+            target_deb_arch='arm64', use_ccache=True)
+        plugin = kernel.KernelPlugin('test-part', self.options,
+                                     project_options)
+        plugin.enable_cross_compilation()
+
+        self.assertEqual(
+            plugin.make_cmd,
+            ['make', '-j2', 'CC=ccache aarch64-linux-gnu-gcc', 'ARCH=arm64',
+             'CROSS_COMPILE=aarch64-linux-gnu-'])
+
     def test_kernel_image_target_as_map(self):
         self.options.kernel_image_target = {'arm64': 'Image'}
         project_options = snapcraft.ProjectOptions(target_deb_arch='arm64')
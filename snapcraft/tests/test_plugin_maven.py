@@ -16,6 +16,7 @@
 
 import io
 import os
+import subprocess
 from unittest import mock
 from xml.etree import ElementTree
 
@@ -42,6 +43,9 @@ class MavenPluginTestCase(tests.TestCase):
         self.ubuntu_mock = patcher.start()
         self.addCleanup(patcher.stop)
 
+        self.maven_repository_arg = '-Dmaven.repo.local={}'.format(
+            os.path.join(self.path, '.cache', 'snapcraft', 'java', 'm2'))
+
     @staticmethod
     def _canonicalize_settings(settings):
         with io.StringIO(settings) as f:
@@ -135,7 +139,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -146,9 +150,89 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package']),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
+    @mock.patch.object(maven.MavenPlugin, 'run')
+    def test_pull_fetches_dependencies(self, run_mock):
+        self.useFixture(fixtures.EnvironmentVariable('http_proxy', None))
+        self.useFixture(fixtures.EnvironmentVariable('https_proxy', None))
+        self.options.maven_options = ['-Pprofile']
+        plugin = maven.MavenPlugin('test-part', self.options,
+                                   self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        plugin.pull()
+
+        run_mock.assert_called_once_with(
+            ['mvn', 'dependency:go-offline', self.maven_repository_arg,
+             '-Pprofile'], cwd=plugin.sourcedir)
+
+    @mock.patch.object(maven.MavenPlugin, 'run')
+    def test_build_retries_online(self, run_mock):
+        self.useFixture(fixtures.EnvironmentVariable('http_proxy', None))
+        self.useFixture(fixtures.EnvironmentVariable('https_proxy', None))
+        plugin = maven.MavenPlugin('test-part', self.options,
+                                   self.project_options)
+
+        def side(cmd, **kwargs):
+            if '--offline' in cmd:
+                os.write(kwargs['stdout'],
+                         b'Cannot access central in offline mode and the '
+                         b'artifact foo:bar:jar:1.0 has not been downloaded '
+                         b'from it before.\n')
+                raise subprocess.CalledProcessError(1, cmd)
+            os.makedirs(os.path.join(plugin.builddir, 'target'))
+            open(os.path.join(plugin.builddir,
+                 'target', 'dummy.jar'), 'w').close()
+
+        run_mock.side_effect = side
+        os.makedirs(plugin.sourcedir)
+
+        plugin.build()
+
+        run_mock.assert_has_calls([
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
+            mock.call(['mvn', 'package', self.maven_repository_arg]),
+        ])
+        self.assertTrue(os.path.exists(
+            os.path.join(plugin.installdir, 'jar', 'dummy.jar')))
+
+    @mock.patch.object(maven.MavenPlugin, 'run')
+    def test_build_failure_is_not_retried_online(self, run_mock):
+        self.useFixture(fixtures.EnvironmentVariable('http_proxy', None))
+        self.useFixture(fixtures.EnvironmentVariable('https_proxy', None))
+        plugin = maven.MavenPlugin('test-part', self.options,
+                                   self.project_options)
+
+        def side(cmd, **kwargs):
+            os.write(kwargs['stdout'], b'COMPILATION ERROR\n')
+            raise subprocess.CalledProcessError(1, cmd)
+
+        run_mock.side_effect = side
+        os.makedirs(plugin.sourcedir)
+
+        self.assertRaises(subprocess.CalledProcessError, plugin.build)
+
+        self.assertEqual(1, run_mock.call_count)
+
+    def test_build_offline_passes_output_through(self):
+        plugin = maven.MavenPlugin('test-part', self.options,
+                                   self.project_options)
+
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            resolved = plugin._build_offline(
+                ['sh', '-c', 'echo building; '
+                 'echo "artifact could not be resolved" >&2; exit 1'])
+
+        self.assertFalse(resolved)
+        self.assertIn('building\nartifact could not be resolved\n',
+                      stdout.getvalue())
+
     @mock.patch.object(maven.MavenPlugin, 'run')
     def test_build_fail(self, run_mock):
         env_vars = (
@@ -167,7 +251,9 @@ class MavenPluginTestCase(tests.TestCase):
             plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package']),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
     @mock.patch.object(maven.MavenPlugin, 'run')
@@ -182,7 +268,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.war'), 'w').close()
@@ -193,7 +279,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package']),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
     @mock.patch.object(maven.MavenPlugin, 'run')
@@ -210,7 +298,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', opts,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir,
                         'child1', 'target'))
             os.makedirs(os.path.join(plugin.builddir,
@@ -226,7 +314,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package']),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
     @mock.patch.object(maven.MavenPlugin, 'run')
@@ -242,7 +332,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -254,7 +344,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package', '-s', settings_path]),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '-s', settings_path, '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
         self.assertTrue(
@@ -296,7 +388,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -308,7 +400,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package', '-s', settings_path]),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '-s', settings_path, '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
         self.assertTrue(
@@ -350,7 +444,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -362,7 +456,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package', '-s', settings_path]),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '-s', settings_path, '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
         self.assertTrue(
@@ -404,7 +500,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -416,7 +512,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package', '-s', settings_path]),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '-s', settings_path, '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
         self.assertTrue(
@@ -466,7 +564,7 @@ class MavenPluginTestCase(tests.TestCase):
         plugin = maven.MavenPlugin('test-part', self.options,
                                    self.project_options)
 
-        def side(l):
+        def side(l, **kwargs):
             os.makedirs(os.path.join(plugin.builddir, 'target'))
             open(os.path.join(plugin.builddir,
                  'target', 'dummy.jar'), 'w').close()
@@ -478,7 +576,9 @@ class MavenPluginTestCase(tests.TestCase):
         plugin.build()
 
         run_mock.assert_has_calls([
-            mock.call(['mvn', 'package', '-s', settings_path]),
+            mock.call(['mvn', 'package', self.maven_repository_arg,
+                       '-s', settings_path, '--offline'],
+                      stdout=mock.ANY, stderr=subprocess.STDOUT),
         ])
 
         self.assertTrue(
@@ -20,6 +20,7 @@ from os import path
 from unittest import mock
 
 import snapcraft
+from snapcraft.internal import cache
 from snapcraft.plugins import nodejs
 from snapcraft import tests
 
@@ -62,7 +63,38 @@ class NodePluginTestCase(tests.TestCase):
             mock.call(
                 nodejs.get_nodejs_release(plugin.options.node_engine),
                 path.join(os.path.abspath('.'), 'parts', 'test-part', 'npm')),
-            mock.call().download()])
+            mock.call().download(),
+            mock.call().provision(
+                mock.ANY, clean_target=False, keep_tarball=True)])
+
+    def test_pull_fetches_into_npm_cache(self):
+        class Options:
+            source = '.'
+            node_packages = ['my-pkg']
+            node_engine = '4'
+            npm_run = []
+
+        plugin = nodejs.NodePlugin('test-part', Options(),
+                                   self.project_options)
+
+        os.makedirs(plugin.sourcedir)
+        open(os.path.join(plugin.sourcedir, 'package.json'), 'w').close()
+
+        plugin.pull()
+
+        npm = ['npm', '--cache={}'.format(
+            path.join(os.path.abspath('.'), 'parts', '.npm')),
+            '--cache-min=Infinity']
+        self.run_mock.assert_has_calls([
+            mock.call(npm + ['install', '--global', '--prefix',
+                             path.join(plugin._npm_dir, 'fetch'), 'my-pkg'],
+                      cwd=plugin._npm_dir, env=mock.ANY),
+            mock.call(npm + ['install'], cwd=plugin.sourcedir,
+                      env=mock.ANY)])
+        self.assertEqual(2, self.run_mock.call_count)
+
+        # Nothing is installed into the part yet.
+        self.assertFalse(os.path.exists(plugin.installdir))
 
     def test_build_local_sources(self):
         class Options:
@@ -79,17 +111,18 @@ class NodePluginTestCase(tests.TestCase):
 
         plugin.build()
 
+        npm = ['npm', '--cache={}'.format(plugin._npm_cache_dir),
+               '--cache-min=Infinity']
         self.run_mock.assert_has_calls([
-            mock.call(['npm', '--cache-min=Infinity', 'install'],
-                      cwd=plugin.builddir),
-            mock.call(['npm', '--cache-min=Infinity', 'install', '--global'],
-                      cwd=plugin.builddir)])
+            mock.call(npm + ['install'], cwd=plugin.builddir),
+            mock.call(npm + ['install', '--global'], cwd=plugin.builddir)])
         self.tar_mock.assert_has_calls([
             mock.call(
                 nodejs.get_nodejs_release(plugin.options.node_engine),
                 path.join(os.path.abspath('.'), 'parts', 'test-part', 'npm')),
+            mock.call().download(),
             mock.call().provision(
-                plugin.installdir, clean_target=False, keep_tarball=True)])
+                mock.ANY, clean_target=False, keep_tarball=True)])
 
     def test_pull_and_build_node_packages_sources(self):
         class Options:
@@ -106,16 +139,98 @@ class NodePluginTestCase(tests.TestCase):
         plugin.pull()
         plugin.build()
 
+        npm = ['npm', '--cache={}'.format(plugin._npm_cache_dir),
+               '--cache-min=Infinity']
         self.run_mock.assert_has_calls([
-            mock.call(['npm', '--cache-min=Infinity', 'install', '--global',
-                       'my-pkg'], cwd=plugin.builddir)])
+            mock.call(npm + ['install', '--global', 'my-pkg'],
+                      cwd=plugin.builddir)])
+
+        # The node toolchain is only fetched once.
         self.tar_mock.assert_has_calls([
             mock.call(
                 nodejs.get_nodejs_release(plugin.options.node_engine),
                 path.join(os.path.abspath('.'), 'parts', 'test-part', 'npm')),
             mock.call().download(),
             mock.call().provision(
-                plugin.installdir, clean_target=False, keep_tarball=True)])
+                mock.ANY, clean_target=False, keep_tarball=True)])
+        self.assertEqual(1, self.tar_mock().download.call_count)
+
+    def _make_cached_toolchains(self, *versions):
+        toolchain_cache_dir = cache.ToolchainCache().toolchain_cache_dir
+        for version in versions:
+            os.makedirs(os.path.join(
+                toolchain_cache_dir, nodejs._get_nodejs_base(version)))
+        return toolchain_cache_dir
+
+    def test_pull_prunes_superseded_node_toolchains(self):
+        class Options:
+            source = '.'
+            node_packages = []
+            node_engine = '6.10.0'
+            npm_run = []
+
+        toolchain_cache_dir = self._make_cached_toolchains('4.4.4', '6.9.1')
+        plugin = nodejs.NodePlugin('test-part', Options(),
+                                   self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        plugin.pull()
+
+        self.assertEqual(
+            sorted([nodejs._get_nodejs_base('4.4.4'),
+                    nodejs._get_nodejs_base('6.10.0')]),
+            sorted(os.listdir(toolchain_cache_dir)))
+
+    def test_pull_keeps_newer_node_toolchains(self):
+        class Options:
+            source = '.'
+            node_packages = []
+            node_engine = '6.9.1'
+            npm_run = []
+
+        toolchain_cache_dir = self._make_cached_toolchains('6.10.0')
+        plugin = nodejs.NodePlugin('test-part', Options(),
+                                   self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        plugin.pull()
+
+        self.assertEqual(
+            sorted([nodejs._get_nodejs_base('6.9.1'),
+                    nodejs._get_nodejs_base('6.10.0')]),
+            sorted(os.listdir(toolchain_cache_dir)))
+
+    def test_build_installs_cached_node_toolchain(self):
+        class Options:
+            source = '.'
+            node_packages = []
+            node_engine = '4'
+            npm_run = []
+
+        def provision(directory, **kwargs):
+            os.makedirs(os.path.join(directory, 'bin'))
+            open(os.path.join(directory, 'bin', 'node'), 'w').close()
+
+        self.tar_mock().provision.side_effect = provision
+
+        plugin = nodejs.NodePlugin('test-part', Options(),
+                                   self.project_options)
+        os.makedirs(plugin.sourcedir)
+        plugin.pull()
+        plugin.build()
+
+        other_plugin = nodejs.NodePlugin('other-part', Options(),
+                                         self.project_options)
+        os.makedirs(other_plugin.sourcedir)
+        other_plugin.pull()
+        other_plugin.build()
+
+        self.assertEqual(1, self.tar_mock().provision.call_count)
+        # Each part gets its own copy, npm must not write into the cache.
+        for p in (plugin, other_plugin):
+            node = os.path.join(p.installdir, 'bin', 'node')
+            self.assertTrue(os.path.exists(node))
+            self.assertEqual(1, os.stat(node).st_nlink)
 
     def test_build_executes_npm_run_commands(self):
         class Options:
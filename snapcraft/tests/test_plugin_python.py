@@ -14,10 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
 import os
+import subprocess
 import tempfile
 from unittest import mock
 
+import fixtures
+
 import snapcraft
 from snapcraft import tests
 from snapcraft.plugins import python
@@ -134,16 +138,11 @@ class PythonPluginTestCase(tests.TestCase):
                         '--dest', plugin._python_package_dir,
                         '--constraint', constraints_path]
 
-        calls = [
-            mock.call(pip_download + ['--requirement', requirements_path],
-                      env=mock.ANY),
-            mock.call(pip_download + ['test', 'packages'],
-                      env=mock.ANY),
-            mock.call(pip_download + ['.'], cwd=plugin.sourcedir,
-                      env=mock.ANY),
-        ]
         plugin.pull()
-        mock_run.assert_has_calls(calls)
+        mock_run.assert_called_once_with(
+            pip_download + ['--requirement', requirements_path,
+                            'test', 'packages', plugin.sourcedir],
+            env=mock.ANY)
 
     @mock.patch.object(python.PythonPlugin, 'run')
     def test_clean_pull(self, mock_run):
@@ -203,21 +202,15 @@ class PythonPluginTestCase(tests.TestCase):
                        '--constraint', constraints_path]
 
         calls = [
-            mock.call(pip_wheel + ['--requirement', requirements_path],
-                      env=mock.ANY),
-            mock.call(tests.ContainsList(pip_install + ['project.whl']),
-                      env=mock.ANY),
-            mock.call(pip_wheel + ['test', 'packages'],
-                      env=mock.ANY),
-            mock.call(tests.ContainsList(pip_install + ['project.whl']),
-                      env=mock.ANY),
-            mock.call(pip_wheel + ['.'], cwd=plugin.builddir,
+            mock.call(pip_wheel + ['--requirement', requirements_path,
+                                   'test', 'packages', plugin.builddir],
                       env=mock.ANY),
             mock.call(tests.ContainsList(pip_install + ['project.whl']),
                       env=mock.ANY),
         ]
         plugin.build()
         mock_run.assert_has_calls(calls)
+        self.assertEqual(2, mock_run.call_count)
 
     @mock.patch.object(python.PythonPlugin, 'run')
     def test_pip_with_url(self, mock_run):
@@ -233,15 +226,152 @@ class PythonPluginTestCase(tests.TestCase):
                         '--dest', plugin._python_package_dir,
                         '--constraint', 'http://test.com/constraints.txt']
 
-        calls = [
-            mock.call(pip_download + ['--requirement',
-                                      'https://test.com/requirements.txt'],
-                      env=mock.ANY),
-            mock.call(pip_download + ['.'], cwd=plugin.sourcedir,
-                      env=mock.ANY),
-        ]
         plugin.pull()
-        mock_run.assert_has_calls(calls)
+        mock_run.assert_called_once_with(
+            pip_download + ['--requirement',
+                            'https://test.com/requirements.txt',
+                            plugin.sourcedir],
+            env=mock.ANY)
+
+    @mock.patch.object(python.PythonPlugin, 'run_output', return_value='')
+    @mock.patch.object(python.PythonPlugin, 'run')
+    def test_build_caches_wheels_built_from_source(self, mock_run,
+                                                   mock_run_output):
+        self.options.python_packages = ['foo', 'bar']
+        plugin = python.PythonPlugin('test-part', self.options,
+                                     self.project_options)
+        os.makedirs(plugin._python_package_dir)
+        # foo was downloaded as a source distribution, bar as a wheel.
+        open(os.path.join(plugin._python_package_dir,
+                          'Foo-1.0.tar.gz'), 'w').close()
+        open(os.path.join(plugin._python_package_dir,
+                          'bar-2.0-py3-none-any.whl'), 'w').close()
+
+        def wheel(cmd, **kwargs):
+            if cmd[1] == 'wheel':
+                wheel_dir = cmd[cmd.index('--wheel-dir') + 1]
+                for name in ('Foo-1.0-cp35-cp35m-linux_x86_64.whl',
+                             'bar-2.0-py3-none-any.whl'):
+                    if '--no-deps' not in cmd or name.startswith('Foo'):
+                        open(os.path.join(wheel_dir, name), 'w').close()
+
+        mock_run.side_effect = wheel
+        plugin.build()
+
+        # Only foo had to be built from source, ahead of the wheel pass.
+        build_calls = [c[0][0] for c in mock_run.call_args_list
+                       if c[0][0][1] == 'wheel' and '--no-deps' in c[0][0]]
+        self.assertEqual(1, len(build_calls))
+        self.assertEqual(
+            os.path.join(plugin._python_package_dir, 'Foo-1.0.tar.gz'),
+            build_calls[0][-1])
+
+        wheel_build_dir = plugin._get_wheel_build_dir(
+            plugin._get_build_env())
+        self.assertEqual(['Foo-1.0-cp35-cp35m-linux_x86_64.whl'],
+                         os.listdir(wheel_build_dir))
+
+        # Another part built in the same environment finds it.
+        mock_run.reset_mock()
+        other_plugin = python.PythonPlugin('other-part', self.options,
+                                           self.project_options)
+        os.makedirs(other_plugin._python_package_dir)
+        open(os.path.join(other_plugin._python_package_dir,
+                          'Foo-1.0.tar.gz'), 'w').close()
+        other_plugin.build()
+        self.assertEqual(2, mock_run.call_count)
+        self.assertTrue(os.path.exists(os.path.join(
+            other_plugin._python_package_dir,
+            'Foo-1.0-cp35-cp35m-linux_x86_64.whl')))
+
+    @mock.patch.object(python.PythonPlugin, 'run_output', return_value='')
+    @mock.patch.object(python.PythonPlugin, 'run')
+    def test_build_ignores_cached_wheels_of_other_versions(
+            self, mock_run, mock_run_output):
+        self.options.python_packages = ['foo']
+        plugin = python.PythonPlugin('test-part', self.options,
+                                     self.project_options)
+        os.makedirs(plugin._python_package_dir)
+        open(os.path.join(plugin._python_package_dir,
+                          'Foo-1.0.tar.gz'), 'w').close()
+        wheel_build_dir = plugin._get_wheel_build_dir(
+            plugin._get_build_env())
+        os.makedirs(wheel_build_dir)
+        open(os.path.join(wheel_build_dir,
+                          'Foo-2.0-cp35-cp35m-linux_x86_64.whl'), 'w').close()
+
+        plugin.build()
+
+        self.assertEqual(['Foo-1.0.tar.gz'],
+                         os.listdir(plugin._python_package_dir))
+        # Foo 1.0 had to be built, pip was never shown the cache.
+        build_calls = [c[0][0] for c in mock_run.call_args_list
+                       if c[0][0][1] == 'wheel' and '--no-deps' in c[0][0]]
+        self.assertEqual(1, len(build_calls))
+        for c in mock_run.call_args_list:
+            self.assertNotIn(wheel_build_dir, c[0][0])
+
+    @mock.patch.object(python.PythonPlugin, 'run')
+    def test_build_wheels_concurrently(self, mock_run):
+        plugin = python.PythonPlugin('test-part', self.options,
+                                     self.project_options)
+        pip = python._Pip(exec_func=mock_run, runnable='pip',
+                          package_dir=plugin._python_package_dir, env={})
+
+        with mock.patch('concurrent.futures.ThreadPoolExecutor',
+                        wraps=python.concurrent.futures.ThreadPoolExecutor) \
+                as mock_executor:
+            pip.build_wheels(['foo-1.0.tar.gz', 'bar-1.0.tar.gz'],
+                             wheel_dir='wheels',
+                             jobs=plugin.parallel_build_count)
+
+        mock_executor.assert_called_once_with(max_workers=2)
+        self.assertEqual(2, mock_run.call_count)
+        self.assertEqual(
+            {'foo-1.0.tar.gz', 'bar-1.0.tar.gz'},
+            {c[0][0][-1] for c in mock_run.call_args_list})
+
+    @mock.patch.object(python.PythonPlugin, 'run')
+    def test_build_wheels_failure_is_left_for_later(self, mock_run):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        mock_run.side_effect = subprocess.CalledProcessError(1, 'pip')
+        pip = python._Pip(exec_func=mock_run, runnable='pip',
+                          package_dir='packages', env={})
+
+        pip.build_wheels(['foo-1.0.tar.gz'], wheel_dir='wheels')
+
+        self.assertEqual('Unable to build a wheel for foo-1.0.tar.gz.\n',
+                         fake_logger.output)
+
+    @mock.patch.object(python.PythonPlugin, 'run')
+    def test_pip_bootstrap_is_cached(self, mock_run):
+        plugin = python.PythonPlugin('test-part', self.options,
+                                     self.project_options)
+        os.makedirs(plugin.sourcedir)
+
+        def wheel(cmd, **kwargs):
+            if cmd[1] == 'wheel':
+                wheel_dir = cmd[cmd.index('--wheel-dir') + 1]
+                open(os.path.join(
+                    wheel_dir, 'pip-9.0.1-py2.py3-none-any.whl'), 'w').close()
+
+        self.mock_call.side_effect = wheel
+        plugin.pull()
+        self.assertEqual(
+            ['download', 'wheel', 'install'],
+            [c[0][0][1] for c in self.mock_call.call_args_list])
+
+        self.mock_call.reset_mock()
+        other_plugin = python.PythonPlugin('other-part', self.options,
+                                           self.project_options)
+        os.makedirs(other_plugin.sourcedir)
+        other_plugin.pull()
+        self.assertEqual(
+            ['install'], [c[0][0][1] for c in self.mock_call.call_args_list])
+        self.assertTrue(os.path.exists(os.path.join(
+            other_plugin._python_package_dir,
+            'pip-9.0.1-py2.py3-none-any.whl')))
 
     def test_fileset_ignores(self):
         plugin = python.PythonPlugin('test-part', self.options,
@@ -12,8 +12,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
 import os
-
 from unittest import mock
 
 import snapcraft
@@ -72,28 +72,151 @@ class RustPluginTestCase(tests.TestCase):
         run_mock.assert_has_calls([
             mock.call([plugin._cargo, 'install',
                        '-j{}'.format(plugin.project.parallel_build_count),
-                       '--root', plugin.installdir], env=plugin._build_env())
+                       '--root', plugin.installdir,
+                       '--path', plugin.builddir], env=plugin._build_env())
         ])
 
+    @mock.patch.object(rust.RustPlugin, 'run')
+    def test_build_with_lock_is_frozen(self, run_mock):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.builddir)
+        open(os.path.join(plugin.builddir, 'Cargo.lock'), 'w').close()
+
+        plugin.build()
+
+        run_mock.assert_called_once_with(
+            [plugin._cargo, 'install',
+             '-j{}'.format(plugin.project.parallel_build_count),
+             '--root', plugin.installdir, '--path', plugin.builddir,
+             '--frozen'], env=plugin._build_env())
+
+    def test_build_env(self):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+
+        env = plugin._build_env()
+
+        self.assertEqual(
+            os.path.join(self.path, '.cache', 'snapcraft', 'cargo'),
+            env['CARGO_HOME'])
+        self.assertEqual(
+            os.path.join(plugin.partdir, 'cargo-target'),
+            env['CARGO_TARGET_DIR'])
+
+    def _toolchain_path(self, name):
+        return os.path.join(
+            self.path, '.cache', 'snapcraft', 'toolchains', name)
+
     @mock.patch.object(rust.sources, 'Script')
     @mock.patch.object(rust.RustPlugin, 'run')
     def test_pull(self, run_mock, script_mock):
         plugin = rust.RustPlugin('test-part', self.options,
                                  self.project_options)
         os.makedirs(plugin.sourcedir)
-        plugin.options.rust_revision = []
+        plugin.options.rust_revision = '1.12.0'
         plugin.options.rust_channel = []
 
         plugin.pull()
 
         self.assertEqual(1, run_mock.call_count)
-        run_mock.assert_has_calls([
-            mock.call(["%s" % plugin._rustup,
-                       "--prefix=%s" % plugin._rustpath,
-                       "--disable-sudo", "--save"])
-        ])
-
-        rustdir = os.path.join(plugin.partdir, 'rust')
+        rustdir, = script_mock.call_args[0][1:]
         run_mock.assert_called_once_with([
             os.path.join(rustdir, 'rustup.sh'), '--prefix={}'.format(rustdir),
-            '--disable-sudo', '--save'])
+            '--disable-sudo', '--save', '--revision=1.12.0'])
+        self.assertEqual(
+            self._toolchain_path('rust-1.12.0'),
+            os.path.realpath(plugin._rustpath))
+
+    @mock.patch.object(rust.sources, 'Script')
+    @mock.patch.object(rust.RustPlugin, 'run')
+    def test_pull_reuses_cached_toolchain(self, run_mock, script_mock):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.sourcedir)
+        plugin.options.rust_revision = []
+        plugin.options.rust_channel = 'nightly'
+        toolchain_name = 'rust-nightly-{}'.format(
+            datetime.date.today().isoformat())
+        os.makedirs(self._toolchain_path(toolchain_name))
+
+        plugin.pull()
+
+        run_mock.assert_not_called()
+        self.assertEqual(
+            self._toolchain_path(toolchain_name),
+            os.path.realpath(plugin._rustpath))
+
+        plugin.clean_pull()
+
+        self.assertFalse(os.path.lexists(plugin._rustpath))
+        self.assertTrue(os.path.isdir(self._toolchain_path(toolchain_name)))
+
+    @mock.patch.object(rust.sources, 'Script')
+    @mock.patch.object(rust.RustPlugin, 'run')
+    def test_pull_prunes_older_toolchains_for_channel(self, run_mock,
+                                                      script_mock):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.sourcedir)
+        plugin.options.rust_revision = []
+        plugin.options.rust_channel = 'nightly'
+        for name in ('rust-nightly-2016-01-01', 'rust-stable-2016-01-01',
+                     'rust-1.12.0'):
+            os.makedirs(self._toolchain_path(name))
+
+        plugin.pull()
+
+        toolchain_name = 'rust-nightly-{}'.format(
+            datetime.date.today().isoformat())
+        self.assertEqual(
+            sorted([toolchain_name, 'rust-stable-2016-01-01', 'rust-1.12.0']),
+            sorted(os.listdir(self._toolchain_path(''))))
+
+    @mock.patch.object(rust.sources, 'Script')
+    @mock.patch.object(rust.RustPlugin, 'run')
+    def test_build_refetches_pruned_toolchain(self, run_mock, script_mock):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.sourcedir)
+        plugin.options.rust_revision = []
+        plugin.options.rust_channel = 'nightly'
+        os.symlink(self._toolchain_path('rust-nightly-2016-01-01'),
+                   plugin._rustpath)
+
+        plugin.build()
+
+        self.assertEqual(
+            self._toolchain_path('rust-nightly-{}'.format(
+                datetime.date.today().isoformat())),
+            os.path.realpath(plugin._rustpath))
+
+    @mock.patch.object(rust.sources, 'Script')
+    @mock.patch.object(rust.RustPlugin, 'run')
+    def test_pull_fetches_crates(self, run_mock, script_mock):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.sourcedir)
+        open(os.path.join(plugin.sourcedir, 'Cargo.toml'), 'w').close()
+        plugin.options.rust_revision = '1.12.0'
+        plugin.options.rust_channel = []
+        os.makedirs(self._toolchain_path('rust-1.12.0'))
+
+        plugin.pull()
+
+        run_mock.assert_called_once_with(
+            [plugin._cargo, 'fetch'], cwd=plugin.sourcedir,
+            env=plugin._build_env())
+
+    def test_pull_invalid_channel(self):
+        plugin = rust.RustPlugin('test-part', self.options,
+                                 self.project_options)
+        os.makedirs(plugin.sourcedir)
+        plugin.options.rust_revision = []
+        plugin.options.rust_channel = 'invalid'
+
+        with self.assertRaises(EnvironmentError) as raised:
+            plugin.pull()
+
+        self.assertEqual('invalid is not a valid rust channel',
+                         str(raised.exception))
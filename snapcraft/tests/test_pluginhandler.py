@@ -32,7 +32,10 @@ from unittest.mock import (
 import fixtures
 
 import snapcraft
-from snapcraft.internal.errors import SnapcraftPartConflictError
+from snapcraft.internal.errors import (
+    InvalidSourceChecksumError,
+    SnapcraftPartConflictError,
+)
 from snapcraft.internal import (
     common,
     lifecycle,
@@ -127,6 +130,32 @@ class PluginTestCase(tests.TestCase):
         self.assertEqual(raised.exception.__str__(),
                          'local source is not a directory')
 
+    def test_invalid_source_checksum_must_raise_exception(self):
+        with self.assertRaises(InvalidSourceChecksumError) as raised:
+            pluginhandler.load_plugin(
+                part_name='test-part',
+                plugin_name='nil',
+                part_properties={'source': 'http://localhost/test.tar',
+                                 'source-checksum': 'md6/digest'})
+
+        self.assertIn(
+            "Invalid source-checksum 'md6/digest' for part 'test-part'",
+            str(raised.exception))
+
+    def test_variable_length_source_checksum_must_raise_exception(self):
+        # The shake algorithms cannot make a digest without its length.
+        with self.assertRaises(InvalidSourceChecksumError) as raised:
+            pluginhandler.load_plugin(
+                part_name='test-part',
+                plugin_name='nil',
+                part_properties={'source': 'http://localhost/test.tar',
+                                 'source-checksum': 'shake_128/digest'})
+
+        self.assertIn(
+            "Invalid source-checksum 'shake_128/digest' for part "
+            "'test-part'", str(raised.exception))
+        self.assertNotIn('shake_256', str(raised.exception))
+
     def test_init_unknown_plugin_must_raise_exception(self):
         fake_logger = fixtures.FakeLogger(level=logging.ERROR)
         self.useFixture(fake_logger)
@@ -1036,7 +1065,8 @@ class StateTestCase(tests.TestCase):
         self.assertTrue(state, 'Expected pull to save state YAML')
         self.assertTrue(type(state) is states.PullState)
         self.assertTrue(type(state.properties) is OrderedDict)
-        self.assertEqual(7, len(state.properties))
+        self.assertEqual(8, len(state.properties))
+        self.assertTrue('source-checksum' in state.properties)
         self.assertTrue(type(state.project_options) is OrderedDict)
         self.assertTrue('deb_arch' in state.project_options)
 
@@ -25,10 +25,11 @@ import unittest.mock
 import fixtures
 
 import snapcraft
-from snapcraft.internal import dirs, parts
+from snapcraft.internal import dirs, parts, pluginhandler
 from snapcraft.internal import project_loader
 from snapcraft import tests
 from snapcraft.tests import fixture_setup
+from snapcraft import _schema
 from snapcraft._schema import SnapcraftSchemaError
 
 
@@ -1395,15 +1396,94 @@ parts:
             '{stage_dir}/lib:'
             '{stage_dir}/usr/lib:'
             '{stage_dir}/lib/{arch_triplet}:'
-            '{stage_dir}/usr/lib/{arch_triplet}:'
-            '{stage_dir}/lib:'
-            '{stage_dir}/usr/lib:'
-            '{stage_dir}/lib/{arch_triplet}:'
             '{stage_dir}/usr/lib/{arch_triplet}'.format(
                 parts_dir=self.parts_dir,
                 stage_dir=self.stage_dir,
                 arch_triplet=self.arch_triplet))
 
+    def test_parts_build_env_with_many_deps(self):
+        # Every part is built after the two before it.
+        parts_yaml = []
+        for i in range(40):
+            parts_yaml.append('  part{}:\n    plugin: nil\n'.format(i))
+            after = ['part{}'.format(j) for j in (i - 1, i - 2) if j >= 0]
+            if after:
+                parts_yaml.append('    after: [{}]\n'.format(
+                    ', '.join(after)))
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+confinement: strict
+grade: stable
+
+parts:
+""" + ''.join(parts_yaml))
+        for path in ('lib', os.path.join('usr', 'include')):
+            os.makedirs(os.path.join(self.stage_dir, path))
+
+        config = project_loader.Config()
+        part = [part for part in
+                config.parts.all_parts if part.name == 'part39'][0]
+        with unittest.mock.patch(
+                'snapcraft.internal.libraries.determine_ld_library_path',
+                return_value=[]) as mock_determine:
+            env = config.parts.build_env_for_part(part)
+
+        # Once for the part install directory and once for the stage one.
+        self.assertEqual(2, mock_determine.call_count)
+        self.assertEqual(len(set(env)), len(env))
+        self.assertEqual(1, len([
+            e for e in env if e.startswith('CFLAGS=')]))
+        self.assertEqual(2, len([
+            e for e in env if e.startswith('PATH=')]))
+
+    def test_dedup_env(self):
+        env = [
+            'PATH="/a:$PATH"',
+            'CFLAGS="$CFLAGS -I/a"',
+            'PATH="/a:$PATH"',
+            'FOO=$CFLAGS',
+            'CFLAGS="$CFLAGS -I/a"',
+            'FOO=$CFLAGS',
+            'PATH="/b:$PATH"',
+            'PATH="/a:$PATH"',
+            'echo FOO=BAR\n. setup.sh',
+            'PATH="/a:$PATH"',
+        ]
+
+        self.assertEqual([
+            'PATH="/a:$PATH"',
+            'CFLAGS="$CFLAGS -I/a"',
+            'FOO=$CFLAGS',
+            'FOO=$CFLAGS',
+            'PATH="/b:$PATH"',
+            'PATH="/a:$PATH"',
+            'echo FOO=BAR\n. setup.sh',
+            'PATH="/a:$PATH"',
+        ], project_loader._dedup_env(env))
+
+    def test_parts_build_env_with_ccache(self):
+        # snapcraft.ProjectOptions is patched for this test case.
+        config = project_loader.Config(
+            snapcraft._options.ProjectOptions(use_ccache=True))
+        part = config.parts.all_parts[0]
+        env = config.parts.build_env_for_part(part)
+
+        ccache_dir = os.path.join(
+            self.path, '.cache', 'snapcraft', 'ccache', self.arch)
+        self.assertIn('CCACHE_DIR={}'.format(ccache_dir), env)
+        self.assertIn('CC="ccache gcc"', env)
+        self.assertIn('CXX="ccache g++"', env)
+        self.assertIn('CCACHE_BASEDIR={}'.format(self.path), env)
+
+    def test_parts_build_env_without_ccache(self):
+        config = project_loader.Config()
+        part = config.parts.all_parts[0]
+        env = config.parts.build_env_for_part(part)
+
+        self.assertFalse([e for e in env if e.startswith('CC')])
+
 
 class TestValidation(tests.TestCase):
 
@@ -1599,13 +1679,11 @@ class TestValidation(tests.TestCase):
                          msg=self.data)
 
     def test_schema_file_not_found(self):
-        mock_the_open = unittest.mock.mock_open()
-        mock_the_open.side_effect = FileNotFoundError()
+        snapcraft.internal.common.set_schemadir(
+            self.useFixture(fixtures.TempDir()).path)
 
-        with unittest.mock.patch('snapcraft._schema.open',
-                                 mock_the_open, create=True):
-            with self.assertRaises(SnapcraftSchemaError) as raised:
-                project_loader.Validator(self.data).validate()
+        with self.assertRaises(SnapcraftSchemaError) as raised:
+            project_loader.Validator(self.data).validate()
 
         expected_message = ('snapcraft validation file is missing from '
                             'installation path')
@@ -1629,6 +1707,177 @@ class TestValidation(tests.TestCase):
                          msg=self.data)
 
 
+class LoadConfigSchemaTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        dirs.setup_dirs()
+
+        patcher = unittest.mock.patch(
+            'snapcraft.internal.project_loader._get_snapcraft_yaml')
+        self.mock_get_yaml = patcher.start()
+        self.mock_get_yaml.return_value = 'snapcraft.yaml'
+        self.addCleanup(patcher.stop)
+
+        # Start every test from a cold process wide cache.
+        for cache_dict in (_schema._schemas, _schema._validators,
+                           pluginhandler._plugin_schemas):
+            patcher = unittest.mock.patch.dict(cache_dict, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+confinement: strict
+grade: stable
+
+parts:
+""" + ''.join('  part{0}:\n    plugin: nil\n'.format(i) for i in range(50)))
+
+    def test_load_config_parses_and_compiles_schemas_once(self):
+        compile_validator = _schema.compile_validator
+        with unittest.mock.patch('yaml.load',
+                                 wraps=_schema.yaml.load) as mock_load, \
+                unittest.mock.patch(
+                    'snapcraft._schema.compile_validator',
+                    wraps=compile_validator) as mock_compile, \
+                unittest.mock.patch(
+                    'snapcraft.internal.pluginhandler.compile_validator',
+                    wraps=compile_validator) as mock_plugin_compile:
+            config = project_loader.load_config()
+
+        self.assertEqual(50, len(config.all_parts))
+        schema_loads = [c for c in mock_load.call_args_list
+                        if c[0][0].name.endswith('schema/snapcraft.yaml')]
+        self.assertEqual(1, len(schema_loads))
+        # One validator for snapcraft.yaml and one for the nil plugin.
+        self.assertEqual(1, mock_compile.call_count)
+        self.assertEqual(1, mock_plugin_compile.call_count)
+
+    def test_parsed_schema_is_reused_across_processes(self):
+        project_loader.load_config()
+        _schema._schemas.clear()
+
+        with unittest.mock.patch('yaml.load',
+                                 wraps=_schema.yaml.load) as mock_load:
+            project_loader.load_config()
+
+        self.assertFalse(
+            [c for c in mock_load.call_args_list
+             if c[0][0].name.endswith('schema/snapcraft.yaml')])
+
+    def test_modified_schema_is_parsed_again(self):
+        project_loader.load_config()
+        schema_file = os.path.join(
+            snapcraft.internal.common.get_schemadir(), 'snapcraft.yaml')
+        st = os.stat(schema_file)
+        self.addCleanup(os.utime, schema_file,
+                        ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.utime(schema_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+
+        with unittest.mock.patch('yaml.load',
+                                 wraps=_schema.yaml.load) as mock_load:
+            project_loader.load_config()
+
+        self.assertTrue(
+            [c for c in mock_load.call_args_list
+             if c[0][0].name.endswith('schema/snapcraft.yaml')])
+
+
+class ProjectSnapshotTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        dirs.setup_dirs()
+
+        patcher = unittest.mock.patch(
+            'snapcraft.internal.project_loader._get_snapcraft_yaml')
+        self.mock_get_yaml = patcher.start()
+        self.mock_get_yaml.return_value = 'snapcraft.yaml'
+        self.addCleanup(patcher.stop)
+
+        self.yaml = """name: test
+version: "1"
+summary: test
+description: test
+grade: stable
+
+parts:
+  part1:
+    plugin: nil
+"""
+        self.make_snapcraft_yaml(self.yaml)
+        os.mkdir('parts')
+
+    def _load_config(self):
+        with unittest.mock.patch(
+                'snapcraft.internal.project_loader._snapcraft_yaml_load',
+                wraps=project_loader._snapcraft_yaml_load) as mock_load:
+            config = project_loader.Config()
+        return config, mock_load.called
+
+    def test_snapshot_is_used_when_nothing_changed(self):
+        config, loaded = self._load_config()
+        self.assertTrue(loaded)
+
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        with unittest.mock.patch('snapcraft._schema.Validator.validate') as \
+                mock_validate:
+            cached_config, loaded = self._load_config()
+
+        self.assertFalse(loaded)
+        self.assertFalse(mock_validate.called)
+        self.assertEqual(config.data, cached_config.data)
+        self.assertEqual(config.part_names, cached_config.part_names)
+        # Defaults are still filled in, and warned about, on every run.
+        self.assertEqual('strict', cached_config.data['confinement'])
+        self.assertIn('"confinement" property not specified',
+                      fake_logger.output)
+
+    def test_snapshot_is_discarded_when_snapcraft_yaml_changes(self):
+        self._load_config()
+        self.make_snapcraft_yaml(self.yaml.replace('"1"', '"2"'))
+
+        config, loaded = self._load_config()
+
+        self.assertTrue(loaded)
+        self.assertEqual('2', config.data['version'])
+
+    def test_snapshot_is_discarded_when_local_plugins_change(self):
+        self._load_config()
+        os.makedirs(os.path.join('parts', 'plugins'))
+        open(os.path.join('parts', 'plugins', 'x_local.py'), 'w').close()
+
+        config, loaded = self._load_config()
+
+        self.assertTrue(loaded)
+
+    def test_unusable_snapshot_is_discarded(self):
+        self._load_config()
+        snapshot_path = project_loader._get_project_snapshot_path(
+            snapcraft.ProjectOptions())
+        # A snapshot referring to a class that no longer exists.
+        with open(snapshot_path, 'wb') as f:
+            f.write(b'\x80\x04cnot_a_module\nNotAClass\n.')
+
+        config, loaded = self._load_config()
+
+        self.assertTrue(loaded)
+        self.assertEqual('1', config.data['version'])
+        # A usable snapshot took its place.
+        self.assertFalse(self._load_config()[1])
+
+    def test_snapshot_is_not_taken_without_parts_directory(self):
+        os.rmdir('parts')
+
+        self._load_config()
+
+        self.assertFalse(os.path.exists('parts'))
+
+
 class TestPluginLoadingProperties(tests.TestCase):
 
     def setUp(self):
@@ -15,9 +15,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import copy
+import hashlib
 import os
 import http.server
 import shutil
+import subprocess
 import tarfile
 import threading
 import unittest.mock
@@ -25,7 +27,7 @@ import unittest.mock
 import fixtures
 import libarchive
 
-from snapcraft.internal import common, sources
+from snapcraft.internal import cache, common, errors, sources
 from snapcraft import tests
 
 
@@ -44,6 +46,100 @@ class FakeFileHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
         pass
 
 
+class FakeETagHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.headers.get('If-None-Match') == '"test-etag"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = 'Test fake compressed file'
+        self.send_response(200)
+        self.send_header('Content-Length', len(data))
+        self.send_header('ETag', '"test-etag"')
+        self.end_headers()
+        self.wfile.write(data.encode())
+
+    def log_message(self, *args):
+        # Overwritten so the test does not write to stderr.
+        pass
+
+
+class TestFileBaseCache(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.useFixture(fixtures.EnvironmentVariable(
+            'no_proxy', 'localhost,127.0.0.1'))
+        FakeETagHTTPRequestHandler.requests = []
+        self.server = http.server.HTTPServer(
+            ('127.0.0.1', 0), FakeETagHTTPRequestHandler)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        self.addCleanup(server_thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        server_thread.start()
+        self.source = 'http://{}:{}/test.tar'.format(
+            *self.server.server_address)
+        self.digest = hashlib.sha256(
+            b'Test fake compressed file').hexdigest()
+
+    def test_download_with_checksum_is_cached(self):
+        checksum = 'sha256/' + self.digest
+        for source_dir in ('src1', 'src2'):
+            os.mkdir(source_dir)
+            sources.Tar(self.source, source_dir,
+                        source_checksum=checksum).download()
+            with open(os.path.join(source_dir, 'test.tar')) as f:
+                self.assertEqual('Test fake compressed file', f.read())
+
+        # The second download was served from the cache.
+        self.assertEqual(1, len(FakeETagHTTPRequestHandler.requests))
+
+    def test_download_revalidates_with_etag(self):
+        for source_dir in ('src1', 'src2'):
+            os.mkdir(source_dir)
+            sources.Tar(self.source, source_dir).download()
+            with open(os.path.join(source_dir, 'test.tar')) as f:
+                self.assertEqual('Test fake compressed file', f.read())
+
+        # The second request got a 304.
+        self.assertEqual(2, len(FakeETagHTTPRequestHandler.requests))
+
+    def test_download_with_wrong_checksum_raises(self):
+        os.mkdir('src')
+        tar_source = sources.Tar(self.source, 'src',
+                                 source_checksum='sha256/wrong')
+
+        with self.assertRaises(errors.DigestMismatchError) as raised:
+            tar_source.download()
+
+        self.assertEqual(
+            "Expected the sha256 digest for {!r} to be wrong, but it "
+            "was {}".format(self.source, self.digest),
+            str(raised.exception))
+
+    def test_script_download_does_not_modify_cache(self):
+        checksum = 'sha256/' + self.digest
+        os.mkdir('src')
+        sources.Script(self.source, 'src', source_checksum=checksum).download()
+
+        cached_file = cache.FileCache().get(
+            algorithm='sha256', hash=self.digest)
+        self.assertTrue(os.access(os.path.join('src', 'test.tar'), os.X_OK))
+        self.assertFalse(os.access(cached_file, os.X_OK))
+
+    def test_invalid_checksum_raises(self):
+        os.mkdir('src')
+        tar_source = sources.Tar(self.source, 'src',
+                                 source_checksum='md6/digest')
+
+        self.assertRaises(ValueError, tar_source.download)
+
+
 class TestTar(tests.TestCase):
 
     scenarios = [
@@ -154,6 +250,121 @@ class TestTar(tests.TestCase):
         # The 'test_prefix' part of the path should have been removed
         self.assertTrue(os.path.exists(os.path.join('dst', 'test.txt')))
         self.assertTrue(os.path.exists(os.path.join('dst', 'link.txt')))
+        self.assertEqual(
+            os.stat(os.path.join('dst', 'test.txt')).st_ino,
+            os.stat(os.path.join('dst', 'link.txt')).st_ino)
+
+    def test_no_common_prefix_keeps_paths(self):
+        os.makedirs(os.path.join('src', 'dir1'))
+        os.makedirs(os.path.join('src', 'dir2'))
+        open(os.path.join('src', 'dir1', 'test1.txt'), 'w').close()
+        open(os.path.join('src', 'dir2', 'test2.txt'), 'w').close()
+        with tarfile.open(os.path.join('src', 'test.tar'), 'w') as tar:
+            tar.add(os.path.join('src', 'dir1'), arcname='dir1')
+            tar.add(os.path.join('src', 'dir2'), arcname='dir2')
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar'), 'dst')
+        os.mkdir('dst')
+        tar_source.pull()
+
+        self.assertTrue(
+            os.path.exists(os.path.join('dst', 'dir1', 'test1.txt')))
+        self.assertTrue(
+            os.path.exists(os.path.join('dst', 'dir2', 'test2.txt')))
+
+    def test_common_prefix_narrowed_while_extracting(self):
+        for path in ('a/b/c/test1.txt', 'a/b/d/test2.txt', 'a/e/test3.txt'):
+            os.makedirs(os.path.join('src', os.path.dirname(path)),
+                        exist_ok=True)
+            open(os.path.join('src', path), 'w').close()
+        with tarfile.open(os.path.join('src', 'test.tar'), 'w') as tar:
+            # Files only, the first ones suggest a deeper prefix.
+            for path in ('a/b/c/test1.txt', 'a/b/d/test2.txt',
+                         'a/e/test3.txt'):
+                tar.add(os.path.join('src', path), arcname=path)
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar'), 'dst')
+        os.mkdir('dst')
+        tar_source.pull()
+
+        self.assertCountEqual(['b', 'e'], os.listdir('dst'))
+        self.assertTrue(
+            os.path.exists(os.path.join('dst', 'b', 'c', 'test1.txt')))
+        self.assertTrue(
+            os.path.exists(os.path.join('dst', 'b', 'd', 'test2.txt')))
+        self.assertTrue(
+            os.path.exists(os.path.join('dst', 'e', 'test3.txt')))
+
+    def test_tarball_is_read_once(self):
+        os.makedirs(os.path.join('src', 'test_prefix'))
+        open(os.path.join('src', 'test_prefix', 'test.txt'), 'w').close()
+        with tarfile.open(os.path.join('src', 'test.tar'), 'w') as tar:
+            tar.add(os.path.join('src', 'test_prefix'), arcname='test_prefix')
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar'), 'dst')
+        os.mkdir('dst')
+        with unittest.mock.patch(
+                'snapcraft.internal.sources._open_tarball',
+                wraps=sources._open_tarball) as mock_open:
+            tar_source.pull()
+
+        self.assertEqual(1, mock_open.call_count)
+        self.assertEqual(['test.txt'], os.listdir('dst'))
+
+    def test_extracted_files_are_writable(self):
+        os.makedirs(os.path.join('src', 'test_prefix'))
+        file_to_tar = os.path.join('src', 'test_prefix', 'test.txt')
+        open(file_to_tar, 'w').close()
+        os.chmod(file_to_tar, 0o444)
+        with tarfile.open(os.path.join('src', 'test.tar'), 'w') as tar:
+            tar.add(file_to_tar)
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar'), 'dst')
+        os.mkdir('dst')
+        tar_source.pull()
+
+        mode = os.stat(os.path.join('dst', 'test.txt')).st_mode
+        self.assertEqual(0o644, mode & 0o777)
+
+    def test_clean_target_keeps_tarball_and_removes_stale_files(self):
+        os.makedirs(os.path.join('src', 'test_prefix'))
+        open(os.path.join('src', 'test_prefix', 'test.txt'), 'w').close()
+        with tarfile.open(os.path.join('src', 'test.tar'), 'w') as tar:
+            tar.add(os.path.join('src', 'test_prefix'))
+        os.makedirs(os.path.join('dst', 'stale'))
+        open(os.path.join('dst', 'stale.txt'), 'w').close()
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar'), 'dst')
+        shutil.copy2(tar_source.source, tar_source.source_dir)
+        tar_source.provision('dst', keep_tarball=True)
+
+        self.assertCountEqual(['test.txt', 'test.tar'], os.listdir('dst'))
+
+    @unittest.mock.patch(
+        'snapcraft.internal.sources._PARALLEL_DECOMPRESS_THRESHOLD', new=0)
+    def test_extract_with_parallel_decompressor(self):
+        # Stand in for pigz with a script recording its use.
+        bin_dir = os.path.join(self.path, 'bin')
+        os.mkdir(bin_dir)
+        fake_pigz = os.path.join(bin_dir, 'pigz')
+        with open(fake_pigz, 'w') as f:
+            f.write('#!/bin/sh\ntouch {}\nexec gzip "$@"\n'.format(
+                os.path.join(self.path, 'pigz-used')))
+        os.chmod(fake_pigz, 0o755)
+        self.useFixture(fixtures.EnvironmentVariable(
+            'PATH', '{}:{}'.format(bin_dir, os.environ['PATH'])))
+
+        os.makedirs(os.path.join('src', 'test_prefix'))
+        open(os.path.join('src', 'test_prefix', 'test.txt'), 'w').close()
+        with tarfile.open(os.path.join('src', 'test.tar.gz'), 'w:gz') as tar:
+            tar.add(os.path.join('src', 'test_prefix'))
+
+        tar_source = sources.Tar(os.path.join('src', 'test.tar.gz'), 'dst')
+        os.mkdir('dst')
+        tar_source.pull()
+
+        self.assertTrue(os.path.exists(os.path.join(self.path, 'pigz-used')))
+        self.assertTrue(os.path.exists(os.path.join('dst', 'test.txt')))
 
 
 class TestZip(tests.TestCase):
@@ -389,25 +600,58 @@ class TestBazaar(SourceTestCase):
             'a bzr source')
         self.assertEqual(raised.exception.message, expected_message)
 
+    def test_init_with_source_checksum_raises_exception(self):
+        with self.assertRaises(sources.IncompatibleOptionsError) as raised:
+            sources.Bazaar('lp://mysource', 'source_dir',
+                           source_checksum='sha256/digest')
+
+        expected_message = (
+            'can\'t specify a source-checksum for a bzr source')
+        self.assertEqual(raised.exception.message, expected_message)
+
 
 class TestGit(SourceTestCase):
 
+    def setUp(self):
+        super().setUp()
+        self.mirror = cache.GitCache().mirror_path('git://my-source')
+
+    def assert_mirror_updated(self):
+        self.assertEqual(
+            ['git', 'clone', '--mirror', '--quiet', 'git://my-source'],
+            self.mock_run.call_args_list[0][0][0][:-1])
+
+    def assert_cloned_from_mirror(self, clone_command, commit=None):
+        calls = [
+            unittest.mock.call(clone_command),
+            unittest.mock.call(['git', '-C', 'source_dir', 'remote',
+                                'set-url', 'origin', 'git://my-source']),
+        ]
+        if commit:
+            calls.append(unittest.mock.call(
+                ['git', '-C', 'source_dir', 'checkout', commit]))
+        calls.append(unittest.mock.call(
+            ['git', '-C', 'source_dir', '-c', 'submodule.fetchJobs=0',
+             'submodule', 'update', '--init', '--recursive']))
+        self.mock_run.assert_has_calls(calls)
+
     def test_pull(self):
         git = sources.Git('git://my-source', 'source_dir')
 
         git.pull()
 
-        self.mock_run.assert_called_once_with(
-            ['git', 'clone', '--recursive', 'git://my-source',
-             'source_dir'])
+        self.assert_mirror_updated()
+        self.assert_cloned_from_mirror(
+            ['git', 'clone', self.mirror, 'source_dir'])
 
     def test_pull_with_depth(self):
         git = sources.Git('git://my-source', 'source_dir', source_depth=2)
 
         git.pull()
 
-        self.mock_run.assert_called_once_with(
-            ['git', 'clone', '--recursive', '--depth', '2', 'git://my-source',
+        self.assert_mirror_updated()
+        self.assert_cloned_from_mirror(
+            ['git', 'clone', '--depth', '2', 'file://' + self.mirror,
              'source_dir'])
 
     def test_pull_branch(self):
@@ -415,17 +659,18 @@ class TestGit(SourceTestCase):
                           source_branch='my-branch')
         git.pull()
 
-        self.mock_run.assert_called_once_with(
-            ['git', 'clone', '--recursive', '--branch',
-             'my-branch', 'git://my-source', 'source_dir'])
+        self.assert_mirror_updated()
+        self.assert_cloned_from_mirror(
+            ['git', 'clone', '--branch', 'my-branch', self.mirror,
+             'source_dir'])
 
     def test_pull_tag(self):
         git = sources.Git('git://my-source', 'source_dir', source_tag='tag')
         git.pull()
 
-        self.mock_run.assert_called_once_with(
-            ['git', 'clone', '--recursive', '--branch', 'tag',
-             'git://my-source', 'source_dir'])
+        self.assert_mirror_updated()
+        self.assert_cloned_from_mirror(
+            ['git', 'clone', '--branch', 'tag', self.mirror, 'source_dir'])
 
     def test_pull_commit(self):
         git = sources.Git(
@@ -433,12 +678,26 @@ class TestGit(SourceTestCase):
             source_commit='2514f9533ec9b45d07883e10a561b248497a8e3c')
         git.pull()
 
+        self.assert_mirror_updated()
+        self.assert_cloned_from_mirror(
+            ['git', 'clone', self.mirror, 'source_dir'],
+            commit='2514f9533ec9b45d07883e10a561b248497a8e3c')
+
+    @unittest.mock.patch('os.path.isdir')
+    def test_pull_local_repository_does_not_use_mirror(self, mock_isdir):
+        mock_isdir.return_value = True
+        git = sources.Git(
+            'my-source', 'source_dir',
+            source_commit='2514f9533ec9b45d07883e10a561b248497a8e3c')
+        git.pull()
+
         self.mock_run.assert_has_calls([
             unittest.mock.call(['git', 'clone', '--recursive',
-                                'git://my-source', 'source_dir']),
+                                'my-source', 'source_dir']),
             unittest.mock.call(['git', '-C', 'source_dir', 'checkout',
                                 '2514f9533ec9b45d07883e10a561b248497a8e3c'])
         ])
+        self.assertEqual(2, self.mock_run.call_count)
 
     def test_pull_existing(self):
         self.mock_path_exists.return_value = True
@@ -533,6 +792,90 @@ class TestGit(SourceTestCase):
         self.assertEqual(raised.exception.message, expected_message)
 
 
+class TestGitMirror(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # A local bare repository stands in for the remote one.
+        self.useFixture(fixtures.EnvironmentVariable(
+            'GIT_CONFIG_NOSYSTEM', '1'))
+        self.useFixture(fixtures.EnvironmentVariable('HOME', self.path))
+        subprocess.check_call(['git', 'init', '--quiet', 'work'])
+        for content in ('1', '2'):
+            with open(os.path.join('work', 'file'), 'w') as f:
+                f.write(content)
+            self._git_work('add', 'file')
+            self._git_work('commit', '--quiet', '-m', content)
+        self._git_work('tag', 'v1', 'HEAD~1')
+        subprocess.check_call(
+            ['git', 'clone', '--quiet', '--bare', 'work', 'remote.git'])
+        self.source = 'file://' + os.path.join(self.path, 'remote.git')
+
+    def _git_work(self, *args):
+        subprocess.check_call(
+            ['git', '-C', 'work', '-c', 'user.name=test',
+             '-c', 'user.email=test@example.com'] + list(args))
+
+    def _read(self, source_dir):
+        with open(os.path.join(source_dir, 'file')) as f:
+            return f.read()
+
+    def test_clones_through_mirror(self):
+        sources.Git(self.source, 'src1').pull()
+
+        mirror = cache.GitCache().mirror_path(self.source)
+        self.assertTrue(os.path.isdir(mirror))
+        self.assertEqual('2', self._read('src1'))
+        # The part clone points at the real origin, not the mirror.
+        self.assertEqual(self.source, subprocess.check_output(
+            ['git', '-C', 'src1', 'remote', 'get-url', 'origin']
+        ).decode().strip())
+
+    def test_pinned_tag_in_mirror_does_not_fetch(self):
+        sources.Git(self.source, 'src1').pull()
+        # Make the remote unreachable, the tag is already mirrored.
+        os.rename('remote.git', 'gone.git')
+
+        sources.Git(self.source, 'src2', source_tag='v1').pull()
+
+        self.assertEqual('1', self._read('src2'))
+
+    def test_mirror_follows_non_master_default_branch(self):
+        self._git_work('branch', '--quiet', '-m', 'master', 'trunk')
+        shutil.rmtree('remote.git')
+        subprocess.check_call(
+            ['git', 'clone', '--quiet', '--bare', 'work', 'remote.git'])
+
+        sources.Git(self.source, 'src1').pull()
+
+        self.assertEqual('2', self._read('src1'))
+
+    def test_mirror_follows_changed_default_branch(self):
+        sources.Git(self.source, 'src1').pull()
+        self._git_work('checkout', '--quiet', '-b', 'trunk')
+        with open(os.path.join('work', 'file'), 'w') as f:
+            f.write('3')
+        self._git_work('commit', '--quiet', '-am', '3')
+        self._git_work('push', '--quiet', '../remote.git', 'trunk')
+        subprocess.check_call(['git', '-C', 'remote.git', 'symbolic-ref',
+                               'HEAD', 'refs/heads/trunk'])
+
+        sources.Git(self.source, 'src2').pull()
+
+        self.assertEqual('3', self._read('src2'))
+
+    def test_mirror_is_fetched_incrementally(self):
+        sources.Git(self.source, 'src1').pull()
+        with open(os.path.join('work', 'file'), 'w') as f:
+            f.write('3')
+        self._git_work('commit', '--quiet', '-am', '3')
+        self._git_work('push', '--quiet', '../remote.git', 'HEAD')
+
+        sources.Git(self.source, 'src2').pull()
+
+        self.assertEqual('3', self._read('src2'))
+
+
 class TestMercurial(SourceTestCase):
 
     def test_pull(self):
@@ -847,6 +1190,92 @@ class TestLocal(tests.TestCase):
         self.assertGreater(
             os.stat(os.path.join('destination', 'dir', 'file')).st_nlink, 1)
 
+    def test_pulling_twice_only_relinks_changed_files(self):
+        os.makedirs(os.path.join('src', 'dir'))
+        open(os.path.join('src', 'dir', 'file'), 'w').close()
+        open(os.path.join('src', 'unchanged'), 'w').close()
+
+        local = sources.Local('src', 'destination')
+        local.pull()
+
+        # Replace the file, as an editor would when saving it.
+        os.remove(os.path.join('src', 'dir', 'file'))
+        with open(os.path.join('src', 'dir', 'file'), 'w') as f:
+            f.write('new content')
+
+        with unittest.mock.patch('snapcraft.file_utils.link_or_copy',
+                                 wraps=sources.file_utils.link_or_copy) as \
+                mock_link_or_copy:
+            local.pull()
+
+        mock_link_or_copy.assert_called_once_with(
+            os.path.abspath(os.path.join('src', 'dir', 'file')),
+            os.path.join('destination', 'dir', 'file'))
+        with open(os.path.join('destination', 'dir', 'file')) as f:
+            self.assertEqual('new content', f.read())
+
+    def test_pulling_twice_removes_deleted_files(self):
+        os.makedirs(os.path.join('src', 'dir'))
+        open(os.path.join('src', 'dir', 'file'), 'w').close()
+        open(os.path.join('src', 'file'), 'w').close()
+
+        local = sources.Local('src', 'destination')
+        local.pull()
+
+        shutil.rmtree(os.path.join('src', 'dir'))
+        os.remove(os.path.join('src', 'file'))
+        local.pull()
+
+        self.assertEqual([], os.listdir('destination'))
+
+    def test_pull_without_manifest_wipes_source_dir(self):
+        os.makedirs('src')
+        open(os.path.join('src', 'file'), 'w').close()
+        os.makedirs('destination')
+        open(os.path.join('destination', 'stale'), 'w').close()
+
+        local = sources.Local('src', 'destination')
+        local.pull()
+
+        self.assertEqual(['file'], os.listdir('destination'))
+
+    def test_pull_honours_snapcraftignore(self):
+        os.makedirs(os.path.join('src', 'build'))
+        os.makedirs(os.path.join('src', 'dir', 'build'))
+        os.makedirs(os.path.join('src', 'logs'))
+        open(os.path.join('src', 'dir', 'file.o'), 'w').close()
+        open(os.path.join('src', 'dir', 'file.c'), 'w').close()
+        open(os.path.join('src', 'logs', 'log'), 'w').close()
+        open(os.path.join('src', 'logs.txt'), 'w').close()
+        with open(os.path.join('src', '.snapcraftignore'), 'w') as f:
+            f.write('# build artifacts\n'
+                    '*.o\n'
+                    '/build\n'
+                    'logs/\n')
+
+        local = sources.Local('src', 'destination')
+        local.pull()
+
+        self.assertFalse(os.path.exists(os.path.join('destination', 'build')))
+        self.assertTrue(
+            os.path.isdir(os.path.join('destination', 'dir', 'build')))
+        self.assertFalse(
+            os.path.exists(os.path.join('destination', 'dir', 'file.o')))
+        self.assertTrue(
+            os.path.exists(os.path.join('destination', 'dir', 'file.c')))
+        self.assertFalse(os.path.exists(os.path.join('destination', 'logs')))
+        self.assertTrue(
+            os.path.exists(os.path.join('destination', 'logs.txt')))
+
+    def test_pull_into_source_dir_inside_source(self):
+        open('file', 'w').close()
+
+        local = sources.Local('.', 'destination')
+        local.pull()
+        local.pull()
+
+        self.assertEqual(['file'], os.listdir('destination'))
+
 
 class TestUri(tests.TestCase):
 